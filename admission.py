@@ -0,0 +1,170 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+import metrics
+
+# === ADMISSION CONTROL ===
+# Conversation endpoints each cost at least one Gemini call, so requests are
+# admitted in front of the handler: token buckets per session and per client
+# IP, then a global cap on in-flight turns with a short, bounded wait queue.
+# Anything over a limit is rejected right away with 429 + Retry-After rather
+# than queueing until it times out. Limits are per process (per gunicorn worker).
+
+RATE_LIMIT_SESSION_PER_MIN = float(os.getenv("RATE_LIMIT_SESSION_PER_MIN", "20"))
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+RATE_LIMIT_IP_PER_MIN = float(os.getenv("RATE_LIMIT_IP_PER_MIN", "60"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+# Buckets kept per limiter; the least recently used are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "5"))
+ADMISSION_RETRY_AFTER_S = float(os.getenv("ADMISSION_RETRY_AFTER_S", "2"))
+
+# Behind a proxy (Railway) the peer address is the proxy, so the client comes from
+# X-Forwarded-For. Only the entries our own proxies append can be trusted: count
+# TRUSTED_PROXY_HOPS from the right. Leave off unless every request passes a proxy.
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+TRUSTED_PROXY_HOPS = max(1, int(os.getenv("TRUSTED_PROXY_HOPS", "1")))
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Rejected ({reason}); retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket per key: `rate_per_min` sustained, up to `burst` at once."""
+
+    def __init__(self, rate_per_min: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated_at)
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, updated_at = self.buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def wait(self, key: str, cost: float = 1.0) -> float:
+        """Seconds until `key` could spend `cost` (0 if it can now); spends nothing."""
+        if self.rate <= 0:
+            return 0.0
+        # A charge bigger than the bucket (a large batch) needs a full bucket, then leaves it in debt
+        needed = min(cost, self.burst)
+        tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= needed else (needed - tokens) / self.rate
+
+    def spend(self, key: str, cost: float = 1.0) -> None:
+        """Charge `cost` to `key`; the balance may go negative, delaying its next request."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens = self._tokens(key, now) - cost
+        self.buckets.pop(key, None)
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+class AdmissionGate:
+    """At most `max_inflight` admitted requests; up to `max_queue` more wait up to `queue_timeout_s`."""
+
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout_s: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.inflight = 0
+        self.queued = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                metrics.incr("admission.rejected.queue_full")
+                raise AdmissionRejected("queue_full", ADMISSION_RETRY_AFTER_S)
+            self.queued += 1
+            self._export()
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                metrics.incr("admission.rejected.queue_timeout")
+                raise AdmissionRejected("queue_timeout", ADMISSION_RETRY_AFTER_S)
+            finally:
+                self.queued -= 1
+                metrics.observe("admission.wait_ms", (time.perf_counter() - start) * 1000)
+        else:
+            await self._semaphore.acquire()
+        self.inflight += 1
+        self._export()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+            self._export()
+
+    def _export(self) -> None:
+        metrics.set_gauge("admission.inflight", self.inflight)
+        metrics.set_gauge("admission.queued", self.queued)
+
+    def snapshot(self):
+        return {
+            "inflight": self.inflight, "queued": self.queued,
+            "max_inflight": self.max_inflight, "max_queue": self.max_queue,
+        }
+
+session_limiter = RateLimiter(RATE_LIMIT_SESSION_PER_MIN, RATE_LIMIT_SESSION_BURST)
+ip_limiter = RateLimiter(RATE_LIMIT_IP_PER_MIN, RATE_LIMIT_IP_BURST)
+gate = AdmissionGate(ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_S)
+
+def client_ip(request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        # The leftmost entries are whatever the client sent; the proxy appends the address it saw
+        hops = [hop.strip() for hop in forwarded.split(",")] if forwarded else []
+        if len(hops) >= TRUSTED_PROXY_HOPS and hops[-TRUSTED_PROXY_HOPS]:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def check_rate_limits(ip: str, session_ids=(), cost: float = 1.0) -> None:
+    """Charge the client IP `cost` and each session one turn per entry; raises AdmissionRejected when over."""
+    # Check every limit before charging any, so a rejected request costs nothing
+    wait = ip_limiter.wait(ip, cost)
+    if wait:
+        _reject("ip", wait)
+    turns = Counter(session_ids)
+    for session_id, count in turns.items():
+        wait = session_limiter.wait(session_id, count)
+        if wait:
+            _reject("session", wait)
+    ip_limiter.spend(ip, cost)
+    for session_id, count in turns.items():
+        session_limiter.spend(session_id, count)
+    metrics.incr("admission.admitted")
+
+def _reject(reason: str, retry_after: float) -> None:
+    metrics.incr(f"admission.rejected.{reason}")
+    logging.info(f"[check_rate_limits] Rejected ({reason}); retry after {retry_after:.1f}s")
+    raise AdmissionRejected(reason, retry_after)
+
+def retry_after_header(retry_after: float) -> str:
+    return str(max(1, math.ceil(retry_after)))
+
+def snapshot():
+    return {
+        **gate.snapshot(),
+        "limits": {
+            "session_per_min": RATE_LIMIT_SESSION_PER_MIN, "session_burst": RATE_LIMIT_SESSION_BURST,
+            "ip_per_min": RATE_LIMIT_IP_PER_MIN, "ip_burst": RATE_LIMIT_IP_BURST,
+        },
+    }
@@ -0,0 +1,61 @@
+"""
+Benchmark the in-memory geo index at scale.
+
+Builds an index of N random quests spread over the continental US (denser
+around a handful of metro areas, like real traffic) and times radius queries
+with and without category filters.
+
+Usage: python -m benchmarks.bench_geo_index [n_quests]
+"""
+import sys
+import time
+import random
+from geo_index import GeoIndex, to_km
+
+CATEGORIES = ["for_sale", "housing", "jobs", "services", "community", "gigs"]
+METROS = [
+    (37.77, -122.42), (34.05, -118.24), (40.71, -74.01), (41.88, -87.63),
+    (29.76, -95.37), (47.61, -122.33), (39.74, -104.99), (25.76, -80.19),
+]
+
+def random_point(rng: random.Random):
+    if rng.random() < 0.6:
+        lat, lng = rng.choice(METROS)
+        return lat + rng.gauss(0, 0.3), lng + rng.gauss(0, 0.3)
+    return rng.uniform(25.0, 49.0), rng.uniform(-124.0, -67.0)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+def main(n: int = 1_000_000, queries: int = 2000) -> None:
+    rng = random.Random(42)
+    index = GeoIndex()
+    start = time.perf_counter()
+    for i in range(n):
+        lat, lng = random_point(rng)
+        index.upsert(str(i), lat, lng, rng.choice(CATEGORIES), None)
+    build_s = time.perf_counter() - start
+    print(f"quests: {n:,}  build: {build_s:.1f}s ({build_s / n * 1e6:.1f} us/insert)")
+
+    print(f"{'radius':>8} {'category':>10} {'p50 ms':>8} {'p99 ms':>8} {'avg hits':>9}")
+    for radius_mi in (5, 10, 20):
+        for category in (None, "for_sale"):
+            timings = []
+            total_hits = 0
+            for _ in range(queries):
+                lat, lng = random_point(rng)
+                t0 = time.perf_counter()
+                hits = index.query(lat, lng, to_km(radius_mi, "mi"), category, limit=50)
+                timings.append((time.perf_counter() - t0) * 1000)
+                total_hits += len(hits)
+            print(f"{radius_mi:>6}mi {category or '-':>10} {percentile(timings, 0.5):>8.3f} {percentile(timings, 0.99):>8.3f} {total_hits / queries:>9.1f}")
+
+    t0 = time.perf_counter()
+    for i in range(10000):
+        lat, lng = random_point(rng)
+        index.upsert(str(i), lat, lng, "for_sale", None)
+    print(f"incremental update: {(time.perf_counter() - t0) / 10000 * 1e6:.1f} us/upsert")
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,68 @@
+"""
+Benchmark the photo rendition pipeline over a directory of sample images.
+
+Each image is copied into a scratch upload dir under its content hash (as the
+upload endpoint does) and processed with 1..N worker processes; the report
+shows per-job timing and overall throughput for each pool size.
+
+Usage: python -m benchmarks.bench_image_pipeline <image_dir> [max_workers]
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from image_pipeline import process_image, IMAGE_WORKERS, Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+def _stage_images(image_dir: str, upload_dir: str):
+    names = []
+    for entry in sorted(os.listdir(image_dir)):
+        if not entry.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        src = os.path.join(image_dir, entry)
+        with open(src, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        name = f"{digest}.{entry.rsplit('.', 1)[-1].lower()}"
+        shutil.copyfile(src, os.path.join(upload_dir, name))
+        names.append(name)
+    return names
+
+def run(names, upload_dir: str, workers: int):
+    # Fresh output each round so cached renditions don't skew timings
+    for entry in os.listdir(upload_dir):
+        if "_" in entry:
+            os.remove(os.path.join(upload_dir, entry))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_image, [os.path.join(upload_dir, n) for n in names], [upload_dir] * len(names)))
+    wall = time.perf_counter() - start
+    job_ms = [r["elapsed_ms"] for r in results]
+    return wall, job_ms
+
+def main(image_dir: str, max_workers: int = IMAGE_WORKERS) -> None:
+    if Image is None:
+        sys.exit("Pillow is not installed")
+    upload_dir = tempfile.mkdtemp(prefix="bench-images-")
+    try:
+        names = _stage_images(image_dir, upload_dir)
+        if not names:
+            sys.exit(f"No images found in {image_dir}")
+        print(f"images: {len(names)}  renditions/image: 3")
+        print(f"{'workers':>7} {'wall s':>8} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for workers in sorted({1, *range(2, max_workers + 1, 2), max_workers}):
+            wall, job_ms = run(names, upload_dir, workers)
+            job_ms.sort()
+            p95 = job_ms[min(len(job_ms) - 1, int(len(job_ms) * 0.95))]
+            print(f"{workers:>7} {wall:>8.2f} {len(names) / wall:>8.1f} {statistics.median(job_ms):>8.1f} {p95:>8.1f} {job_ms[-1]:>8.1f}")
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1], *(int(a) for a in sys.argv[2:3]))
@@ -0,0 +1,80 @@
+"""
+Benchmark the Gemini call scheduler under overload.
+
+Simulates Gemini as a fixed-concurrency service (calls take 80-120 ms) while a
+background batch floods it, new sessions arrive, and ongoing conversations
+send turns (one of them greedy, sending bursts). Compares queue wait per class
+with a plain FIFO semaphore against LLMScheduler.
+
+Usage: python -m benchmarks.bench_llm_scheduler [concurrency] [duration_s]
+"""
+import sys
+import time
+import random
+import asyncio
+from llm_scheduler import LLMScheduler, INTERACTIVE, NEW, BACKGROUND
+
+class FifoScheduler:
+    """Baseline: the asyncio.Semaphore vertex_client used before."""
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self, priority, session_id):
+        await self.semaphore.acquire()
+
+    def release(self):
+        self.semaphore.release()
+
+async def call(scheduler, priority: str, session_id: str, waits: dict, rng: random.Random):
+    start = time.perf_counter()
+    await scheduler.acquire(priority, session_id)
+    waits.setdefault(priority, []).append((time.perf_counter() - start) * 1000)
+    if session_id == "greedy":
+        waits.setdefault("greedy", []).append(waits[priority][-1])
+    elif priority == INTERACTIVE:
+        waits.setdefault("other interactive", []).append(waits[priority][-1])
+    try:
+        await asyncio.sleep(rng.uniform(0.08, 0.12))
+    finally:
+        scheduler.release()
+
+async def load(scheduler, duration_s: float, seed: int = 3) -> dict:
+    rng = random.Random(seed)
+    waits: dict = {}
+    tasks = []
+    stop_at = time.monotonic() + duration_s
+    # Batch job: 400 calls queued up front
+    tasks += [asyncio.create_task(call(scheduler, BACKGROUND, f"batch{i % 40}", waits, rng)) for i in range(400)]
+    tick = 0
+    while time.monotonic() < stop_at:
+        tick += 1
+        # ~20 conversation turns/s across 30 sessions, a new session ~5/s,
+        # and every second a burst of 8 turns from one greedy session
+        for _ in range(2):
+            tasks.append(asyncio.create_task(call(scheduler, INTERACTIVE, f"s{rng.randrange(30)}", waits, rng)))
+        if tick % 2 == 0:
+            tasks.append(asyncio.create_task(call(scheduler, NEW, f"n{tick}", waits, rng)))
+        if tick % 10 == 0:
+            tasks += [asyncio.create_task(call(scheduler, INTERACTIVE, "greedy", waits, rng)) for _ in range(8)]
+        await asyncio.sleep(0.1)
+    await asyncio.gather(*tasks)
+    return waits
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return f"n={n:4d}  p50 {samples[n // 2]:7.0f}  p95 {samples[int(n * 0.95)]:7.0f}  max {samples[-1]:7.0f}"
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration_s = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"concurrency {concurrency}, {duration_s:.0f}s of load, queue wait in ms")
+    for name, scheduler in (("fifo", FifoScheduler(concurrency)), ("scheduler", LLMScheduler(concurrency, aging_s=30))):
+        waits = asyncio.run(load(scheduler, duration_s))
+        print(f"  {name}")
+        for label in (INTERACTIVE, "other interactive", "greedy", NEW, BACKGROUND):
+            if label in waits:
+                print(f"    {label:18s} {summarize(waits[label])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Throughput benchmark for the want/have matching engine.
+
+Loads N synthetic quests (the matched categories, clustered around metros) into the
+column store, then measures single-quest match latency and batched matching
+throughput.
+
+Usage: python -m benchmarks.bench_match_engine [n_quests]
+"""
+import sys
+import time
+import random
+from match_engine import MatchEngine
+
+# Only these categories carry a side (match_engine.MATCH_CATEGORIES)
+CATEGORIES = ["for_sale", "housing"]
+SIDES = {"for_sale": ["want", "have"], "housing": ["rent", "rent out", "buy", "sell", "sublet"]}
+METROS = [(37.77, -122.42), (34.05, -118.24), (40.71, -74.01), (41.88, -87.63), (29.76, -95.37)]
+
+def make_quest(rng: random.Random):
+    lat, lng = rng.choice(METROS)
+    return {
+        "general_category": (category := rng.choices(CATEGORIES, weights=[5, 2])[0]),
+        "sub_category": f"sub{rng.randrange(20)}",
+        "want_or_have": rng.choice(SIDES[category]),
+        "lat": lat + rng.gauss(0, 0.4),
+        "lng": lng + rng.gauss(0, 0.4),
+        "distance": rng.choice([5, 10, 20, None]),
+        "distance_unit": "mi",
+        "price": rng.choice([None, rng.uniform(10, 2000)]),
+        "budget": rng.choice([None, rng.uniform(500, 4000)]),
+    }
+
+def main(n: int = 200_000) -> None:
+    rng = random.Random(7)
+    engine = MatchEngine()
+    start = time.perf_counter()
+    for i in range(n):
+        engine.upsert(str(i), make_quest(rng))
+    print(f"quests: {n:,}  load: {time.perf_counter() - start:.1f}s")
+    for category, table in engine.tables.items():
+        print(f"  {category:<10} {table.size:>9,} rows")
+
+    keys = [str(rng.randrange(n)) for _ in range(200)]
+    timings = []
+    for key in keys[:50]:
+        t0 = time.perf_counter()
+        engine.match(key, 20)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    print(f"single match: p50 {timings[len(timings) // 2]:.2f} ms  max {timings[-1]:.2f} ms")
+
+    for batch in (16, 64, 200):
+        t0 = time.perf_counter()
+        results = engine.match_batch(keys[:batch], 20)
+        elapsed = time.perf_counter() - t0
+        found = sum(len(m) for m in results.values())
+        print(f"batch {batch:>4}: {batch / elapsed:>8.0f} quests/s  ({found / batch:.1f} matches/quest)")
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
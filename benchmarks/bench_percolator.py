@@ -0,0 +1,76 @@
+"""
+Benchmark the saved-search percolator.
+
+Registers N synthetic subscriptions (want quests and saved searches spread
+over US metros) and percolates new quests through the reverse index, against
+a baseline that checks every subscription.
+
+Usage: python -m benchmarks.bench_percolator [n_subscriptions]
+"""
+import sys
+import time
+import random
+from match_engine import MATCH_CATEGORIES
+from percolator import Percolator, quest_subscription, saved_search_subscription
+from benchmarks.bench_semantic_index import make_text, ITEMS
+
+METROS = [(40.71, -74.0), (34.05, -118.24), (41.88, -87.63), (29.76, -95.37), (33.45, -112.07),
+          (39.95, -75.17), (29.42, -98.49), (32.72, -117.16), (32.78, -96.8), (37.34, -121.89)]
+CATEGORIES = ["for_sale", "housing", "services", "community", "gigs"]
+
+class ScanAll(Percolator):
+    """Baseline: every subscription is a candidate."""
+    def candidates(self, record):
+        return set(self.subscriptions)
+
+def make_location(rng: random.Random):
+    lat, lng = rng.choice(METROS)
+    return lat + rng.gauss(0, 0.3), lng + rng.gauss(0, 0.3)
+
+def make_subscription(i: int, rng: random.Random) -> dict:
+    lat, lng = make_location(rng)
+    if rng.random() < 0.7:
+        return quest_subscription(str(i), {
+            "quest_id": f"s{i}", "want_or_have": "want", "general_category": rng.choice(sorted(MATCH_CATEGORIES)),
+            "sub_category": rng.choice(ITEMS).split()[-1], "lat": lat, "lng": lng,
+            "distance": rng.choice([5, 10, 25, 50]), "price": rng.choice([None, 50, 200, 1000, 5000]),
+        })
+    return saved_search_subscription({
+        "id": i, "session_id": f"s{i}", "query": rng.choice(ITEMS), "general_category": rng.choice(CATEGORIES + [None]),
+        "lat": lat, "lng": lng, "radius": rng.choice([10, 25, 100]), "max_price": rng.choice([None, 100, 500]),
+    })
+
+def make_quest(i: int, rng: random.Random) -> dict:
+    lat, lng = make_location(rng)
+    return {
+        "id": f"q{i}", "quest_id": f"new{i}", "want_or_have": "have", "general_category": rng.choice(CATEGORIES),
+        "sub_category": rng.choice(ITEMS).split()[-1], "description": make_text(rng),
+        "lat": lat, "lng": lng, "price": rng.choice([None, 20, 150, 800]),
+    }
+
+def run(percolator: Percolator, quests) -> tuple:
+    start = time.perf_counter()
+    matches = sum(len(percolator.percolate(q["id"], q)) for q in quests)
+    return (time.perf_counter() - start) * 1000 / len(quests), matches
+
+def main(n: int = 100_000, quests: int = 500) -> None:
+    rng = random.Random(11)
+    subs = [make_subscription(i, rng) for i in range(n)]
+    new_quests = [make_quest(i, rng) for i in range(quests)]
+    indexed, baseline = Percolator(), ScanAll()
+    start = time.perf_counter()
+    for sub in subs:
+        indexed.upsert(sub)
+        baseline.upsert(sub)
+    print(f"subscriptions: {n:,}  (indexed both: {time.perf_counter() - start:.1f}s)")
+    avg_candidates = sum(len(indexed.candidates(q)) for q in new_quests) / quests
+    print(f"avg candidates per quest: {avg_candidates:,.0f}")
+    ms, matches = run(indexed, new_quests)
+    base_ms, base_matches = run(baseline, new_quests[:50])
+    print(f"reverse index: {ms:.3f} ms/quest ({matches} matches over {quests} quests)")
+    print(f"full scan:     {base_ms:.3f} ms/quest")
+    # Same answers on the quests both ran
+    assert sum(len(indexed.percolate(q["id"], q)) for q in new_quests[:50]) == base_matches
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,136 @@
+"""
+Replay scripted conversations through the server-side quest flow.
+
+Each persona (benchmarks/data/quest_personas.jsonl) opens with a first
+message and answers whatever it is asked: free-text answers carry the field
+values a perfect extractor would return, button questions are answered with
+the button. Gemini is simulated, so the numbers are turns, Gemini calls and
+estimated tokens (chars / 4) per completed quest, not latency.
+
+  llm-driven   the previous design: quick replies only for distance, location,
+               photos and ready; every other turn sends the conversation
+               prompt plus the full chat history, and the model answers with
+               the whole state. The model is idealised (it asks exactly what
+               quest_flow would); --reask adds the chance that it re-asks a
+               field it already has.
+  server-flow  quest_flow picks every question; Gemini only sees the
+               extraction prompt, the state and the last question, and
+               answers with the extracted fields.
+
+Usage: python -m benchmarks.bench_quest_flow [path/to/personas.jsonl] [--reask P]
+"""
+import os
+import sys
+import json
+import random
+import serialization
+from quest_flow import apply_extracted, next_step, field_for_action, field_question
+from quest_prompts import PROMPTS, EXTRACT_PROMPTS, prompt_tokens
+from quick_replies import apply_quick_reply
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "data", "quest_personas.jsonl")
+LEGACY_QUICK_REPLY_ACTIONS = {"ask_for_distance", "validate_location", "offer_photos", "ready"}
+MAX_TURNS = 30
+
+def user_reply(persona: dict, state: dict):
+    """What the persona says to the current question, and the fields it states."""
+    action, category = state["action"], persona["general_category"]
+    if action == "ask_for_distance":
+        return "10 mi", {"distance": 10, "distance_unit": "mi"}
+    if action in ("offer_photos", "ready"):
+        return ("Yes" if action == "ready" else "No"), {}
+    if action == "validate_location" and state.get("ui"):
+        return "Yes", {}
+    field = "general_location" if action == "validate_location" else field_for_action(category, action)
+    text, fields = persona["answers"][field]
+    return text, fields
+
+def tokens(messages) -> int:
+    return sum(prompt_tokens(m["content"]) for m in messages)
+
+def llm_driven_turn(persona, state, message, fields, history, stats, rng, reask: float):
+    category = persona["general_category"]
+    messages = [
+        {"role": "user", "content": f"Category: {serialization.dumps({'general_category': category})}"},
+        {"role": "user", "content": f"Current quest state: {serialization.dumps(state)}"},
+        {"role": "user", "content": PROMPTS[category]},
+        *history,
+        {"role": "user", "content": f"Respond to the user's message: {message}"},
+    ]
+    result = next_step(apply_extracted(state, fields, category), category, extracted=True)
+    collected = [f for f in fields if f not in ("lat", "lng", "distance_unit")]
+    if collected and rng.random() < reask:
+        # The failure mode: asking again for something the user just gave
+        field = rng.choice(collected)
+        action, text, ui, _ = field_question(category, field)
+        result = {**result, "action": action, "text": text, "ui": ui, "reask": field}
+    stats["calls"] += 1
+    stats["tokens_in"] += tokens(messages)
+    stats["tokens_out"] += prompt_tokens(serialization.dumps(result))
+    return result
+
+def server_flow_turn(persona, state, message, fields, history, stats):
+    category = persona["general_category"]
+    known = {k: v for k, v in state.items() if k not in ("action", "text", "ui")}
+    messages = [
+        {"role": "user", "content": EXTRACT_PROMPTS[category]},
+        {"role": "user", "content": f"Current quest state: {serialization.dumps(known)}"},
+    ]
+    if state.get("text"):
+        messages.append({"role": "user", "content": f"Last question: {state['text']}"})
+    messages.append({"role": "user", "content": f"User message: {message}"})
+    stats["calls"] += 1
+    stats["tokens_in"] += tokens(messages)
+    stats["tokens_out"] += prompt_tokens(serialization.dumps(fields))
+    return next_step(apply_extracted(state, fields, category), category, extracted=True)
+
+def replay(persona: dict, mode: str, rng: random.Random, reask: float) -> dict:
+    category = persona["general_category"]
+    stats = {"turns": 0, "calls": 0, "tokens_in": 0, "tokens_out": 0, "completed": False}
+    state = {"general_category": category}
+    history = []
+    message, fields = persona["message"], persona["fields"]
+    while stats["turns"] < MAX_TURNS:
+        stats["turns"] += 1
+        result = None
+        if mode == "server-flow" or state.get("action") in LEGACY_QUICK_REPLY_ACTIONS:
+            result = apply_quick_reply(state, message, category)
+        if result is None:
+            if mode == "server-flow":
+                result = server_flow_turn(persona, state, message, fields, history, stats)
+            else:
+                result = llm_driven_turn(persona, state, message, fields, history, stats, rng, reask)
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": serialization.dumps(result["text"])}]
+        if result["action"] == "ready" and state.get("action") == "ready":
+            stats["completed"] = True
+            break
+        state = result
+        if "reask" in state:
+            # The user repeats the answer
+            field = state.pop("reask")
+            message, fields = field.replace("_", " ") + ": " + str(state.get(field)), {field: state.get(field)}
+            continue
+        message, fields = user_reply(persona, state)
+    return stats
+
+def main(argv):
+    reask = 0.0
+    if "--reask" in argv:
+        i = argv.index("--reask")
+        reask = float(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    path = argv[0] if argv else DEFAULT_DATA
+    with open(path) as f:
+        personas = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(personas)} personas, re-ask probability for the llm-driven baseline: {reask}")
+    for mode in ("llm-driven", "server-flow"):
+        rng = random.Random(5)
+        runs = [replay(persona, mode, rng, reask) for persona in personas for _ in range(20 if reask else 1)]
+        done = [r for r in runs if r["completed"]]
+        n = len(done) or 1
+        print(f"  {mode:11s} completed {len(done)}/{len(runs)}  per quest: turns {sum(r['turns'] for r in done) / n:5.1f}  "
+              f"gemini calls {sum(r['calls'] for r in done) / n:4.1f}  tokens in {sum(r['tokens_in'] for r in done) / n:6.0f}  "
+              f"out {sum(r['tokens_out'] for r in done) / n:5.0f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
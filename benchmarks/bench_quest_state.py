@@ -0,0 +1,97 @@
+"""
+Benchmark sparse, category-specific quest state.
+
+Replays synthetic conversations where the model echoes its whole field
+template every turn (unset fields as null, as the prompts show) and compares
+the old session state (raw merge of every echoed key) with `compact_state`:
+stored JSON size, in-memory size, prompt-state size and per-turn time.
+
+Usage: python -m benchmarks.bench_quest_state [n_sessions] [turns]
+"""
+import sys
+import json
+import time
+import random
+from quest_schema import CATEGORY_FIELDS, COMMON_FIELDS, ALL_FIELDS, compact_state, state_model
+
+# Values the model fills in, one slot per turn
+SAMPLE_VALUES = {
+    "want_or_have": "have", "description": "Gently used road bike, 56cm frame", "general_location": "Austin, TX",
+    "location_confirmed": True, "lat": 30.2672, "lng": -97.7431, "distance": "10 miles", "distance_unit": "mi",
+    "title": "Road bike", "price": "$450", "condition": "like new", "property_type": "apartment", "budget": "1,800",
+    "move_in_date": "2026-11-01", "job_role": "barista", "employment_type": "Part-time", "industry": "food service",
+    "experience_level": "entry", "work_location": "On-site", "resume_uploaded": False, "service_type": "plumbing",
+    "timeframe": "this week", "qualifications": "licensed", "activity": "pickup soccer", "date_time": "Saturday 10am",
+    "meetup_location": "Zilker Park", "group_size": "10 people", "cost": 0, "gig_type": "moving help",
+    "duration": "3 hours", "pay_rate": "$25/hr", "portfolio": [],
+}
+
+def deep_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_size(v) for v in obj)
+    return size
+
+def model_echo(category: str, filled: dict, rng: random.Random) -> dict:
+    """What the model returns for a turn: every template field, nulls included, plus stray keys."""
+    echo = {field: filled.get(field) for field in {**COMMON_FIELDS, **CATEGORY_FIELDS[category]}}
+    echo.update({"location": filled.get("general_location"), "text": "Got it! What else?", "action": "collect"})
+    if rng.random() < 0.3:
+        # Fields from another category's template leak in now and then
+        echo.update({field: None for field in CATEGORY_FIELDS[rng.choice(list(CATEGORY_FIELDS))]})
+    return echo
+
+def replay(n_sessions: int, turns: int, compact: bool):
+    rng = random.Random(7)
+    states, prompt_bytes, elapsed = [], 0, 0.0
+    for _ in range(n_sessions):
+        category = rng.choice(list(CATEGORY_FIELDS))
+        slots = [f for f in {**COMMON_FIELDS, **CATEGORY_FIELDS[category]} if f in SAMPLE_VALUES]
+        filled, state = {"general_category": category}, {}
+        for turn in range(turns):
+            if turn < len(slots):
+                filled[slots[turn]] = SAMPLE_VALUES[slots[turn]]
+            echo = model_echo(category, filled, rng)
+            start = time.perf_counter()
+            merged = {**state, **echo}
+            state = compact_state(merged, category) if compact else merged
+            prompt = json.dumps(state)
+            elapsed += time.perf_counter() - start
+            prompt_bytes += len(prompt)
+        states.append(state)
+    return states, prompt_bytes, elapsed
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print(f"{n_sessions} sessions x {turns} turns, {len(ALL_FIELDS)} schema fields")
+
+    results = {}
+    for label, compact in (("full", False), ("sparse", True)):
+        states, prompt_bytes, elapsed = replay(n_sessions, turns, compact)
+        stored = sum(len(json.dumps(s)) for s in states)
+        memory = sum(deep_size(s) for s in states)
+        keys = sum(len(s) for s in states) / len(states)
+        results[label] = (stored, memory, prompt_bytes)
+        print(f"  {label:6s}: {keys:5.1f} keys/session  stored {stored / n_sessions:6.0f} B  "
+              f"memory {memory / n_sessions:6.0f} B  prompt state {prompt_bytes / (n_sessions * turns):5.0f} B/turn  "
+              f"{elapsed / (n_sessions * turns) * 1e6:6.1f} us/turn")
+    full, sparse = results["full"], results["sparse"]
+    print(f"  saved : stored {1 - sparse[0] / full[0]:.0%}, memory {1 - sparse[1] / full[1]:.0%}, "
+          f"prompt state {1 - sparse[2] / full[2]:.0%}")
+
+    # Validators are built once per category; building one per call would cost this much
+    start = time.perf_counter()
+    for _ in range(200):
+        state_model.__wrapped__("for_sale")
+    uncached = (time.perf_counter() - start) / 200
+    start = time.perf_counter()
+    for _ in range(200):
+        state_model("for_sale")
+    cached = (time.perf_counter() - start) / 200
+    print(f"  model lookup: cached {cached * 1e6:.2f} us vs create_model {uncached * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark the Vertex quota governor against a simulated quota.
+
+Simulates two regions that each enforce an RPM and TPM limit over a sliding
+window and answer 429 when a call doesn't fit. A steady stream of calls
+(random prompt sizes) is offered above what the primary region allows, first
+straight to the primary region with the usual retry/backoff, then through
+QuotaGovernor. Time is compressed: the quota window is 1 s instead of 60 s.
+
+Usage: python -m benchmarks.bench_quota_governor [calls_per_s] [duration_s]
+"""
+import sys
+import time
+import random
+import asyncio
+from collections import deque
+import quota_governor as qg
+
+REGIONS = ["us-central1", "us-east4"]
+MODEL = "gemini-2.5-flash"
+RPM, TPM = 40, 40000  # per 1 s window after compression
+MAX_TOKENS = 1024
+
+class SimulatedVertex:
+    """Sliding-window RPM/TPM limits per region; returns False for a 429."""
+    def __init__(self):
+        self.windows = {region: deque() for region in REGIONS}
+
+    def call(self, region: str, tokens: int) -> bool:
+        now = time.monotonic()
+        window = self.windows[region]
+        while window and window[0][0] <= now - qg.QUOTA_WINDOW_S:
+            window.popleft()
+        if len(window) + 1 > RPM or sum(t for _, t in window) + tokens > TPM:
+            return False
+        window.append((now, tokens))
+        return True
+
+async def direct(vertex: SimulatedVertex, messages, stats: dict) -> None:
+    """Before: primary region only, exponential backoff on 429, 3 attempts."""
+    tokens = qg.estimate_tokens(messages, MAX_TOKENS)
+    start = time.perf_counter()
+    for attempt in range(3):
+        if vertex.call(REGIONS[0], tokens):
+            stats["latency"].append((time.perf_counter() - start) * 1000)
+            return
+        stats["429"] += 1
+        await asyncio.sleep(0.05 * 2 ** attempt)
+    stats["failed"] += 1
+
+async def governed(vertex: SimulatedVertex, governor: qg.QuotaGovernor, messages, stats: dict) -> None:
+    tokens = qg.estimate_tokens(messages, MAX_TOKENS)
+    start = time.perf_counter()
+    for _ in range(3):
+        try:
+            region, _ = await governor.acquire(MODEL, REGIONS[0], tokens, 0.5, REGIONS)
+        except qg.QuotaWaitTimeout:
+            stats["failed"] += 1
+            return
+        if vertex.call(region, tokens):
+            stats["latency"].append((time.perf_counter() - start) * 1000)
+            return
+        stats["429"] += 1
+        governor.throttled(MODEL, region)
+    stats["failed"] += 1
+
+async def load(mode: str, rate: float, duration_s: float) -> dict:
+    rng = random.Random(11)
+    vertex = SimulatedVertex()
+    governor = qg.QuotaGovernor()
+    stats = {"429": 0, "failed": 0, "latency": []}
+    tasks = []
+    stop_at = time.monotonic() + duration_s
+    while time.monotonic() < stop_at:
+        messages = [{"role": "user", "content": "x" * rng.randint(400, 6000)}]
+        if mode == "direct":
+            tasks.append(asyncio.create_task(direct(vertex, messages, stats)))
+        else:
+            tasks.append(asyncio.create_task(governed(vertex, governor, messages, stats)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    stats["offered"] = len(tasks)
+    return stats
+
+def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    duration_s = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    qg.QUOTA_WINDOW_S = 1.0
+    qg.QUOTA_THROTTLE_COOLDOWN_S = 0.1
+    qg.VERTEX_QUOTAS.clear()
+    qg.VERTEX_QUOTAS[MODEL] = {"rpm": RPM, "tpm": TPM}
+    print(f"{rate:.0f} calls/s for {duration_s:.0f}s; each region allows {RPM} req and {TPM} tokens per 1s window")
+    for mode in ("direct", "governed"):
+        stats = asyncio.run(load(mode, rate, duration_s))
+        latency = sorted(stats["latency"])
+        n = len(latency)
+        p50 = f"{latency[n // 2]:.0f}" if n else "-"
+        p95 = f"{latency[int(n * 0.95)]:.0f}" if n else "-"
+        print(f"  {mode:9s} offered {stats['offered']:4d}  ok {n:4d}  failed {stats['failed']:4d}  "
+              f"429s {stats['429']:4d}  latency ms p50 {p50}  p95 {p95}")
+
+if __name__ == "__main__":
+    main()
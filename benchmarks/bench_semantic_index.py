@@ -0,0 +1,75 @@
+"""
+Recall/latency benchmark for the local semantic index.
+
+Indexes N synthetic quest descriptions, then compares LSH search against an
+exact scan: recall@k of the approximate results and per-query latency.
+
+Usage: python -m benchmarks.bench_semantic_index [n_quests]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from semantic_index import SemanticIndex, embed
+
+ITEMS = [
+    "road bike", "mountain bike", "bicycle", "standing desk", "office chair", "leather couch",
+    "sectional sofa", "iphone 13", "android phone", "gaming laptop", "macbook pro", "guitar lessons",
+    "piano teacher", "dog walker", "cat sitter", "house cleaning", "movers needed", "studio apartment",
+    "2 bedroom apartment", "room for rent", "honda civic", "pickup truck", "kayak", "camping tent",
+    "tv stand", "4k television", "baby stroller", "kids toys", "power drill", "lawn mower",
+]
+ADJECTIVES = ["used", "new", "like new", "vintage", "cheap", "large", "small", "black", "red", "electric"]
+VERBS = ["selling", "looking for", "need", "offering", "want", "have a"]
+
+def make_text(rng: random.Random) -> str:
+    return f"{rng.choice(VERBS)} {rng.choice(ADJECTIVES)} {rng.choice(ITEMS)} {rng.choice(['', 'in great shape', 'asap', 'pickup only', 'must go'])}"
+
+def main(n: int = 100_000, queries: int = 200, k: int = 10) -> None:
+    rng = random.Random(3)
+    tmp = tempfile.mkdtemp(prefix="bench-semantic-")
+    try:
+        index = SemanticIndex(os.path.join(tmp, "index.f32"))
+        t0 = time.perf_counter()
+        for i in range(n):
+            index.upsert(str(i), make_text(rng))
+        index.flush()
+        build = time.perf_counter() - t0
+        print(f"quests: {n:,}  build: {build:.1f}s ({build / n * 1e6:.0f} us/quest)")
+
+        index.close()
+        t0 = time.perf_counter()
+        index = SemanticIndex(os.path.join(tmp, "index.f32"))
+        print(f"reload from mmap: {time.perf_counter() - t0:.2f}s ({len(index):,} vectors)")
+
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            embed(make_text(rng))
+        print(f"embed: {(time.perf_counter() - t0) * 1000:.0f} us/text")
+
+        recall = 0.0
+        ann_ms, exact_ms = [], []
+        for _ in range(queries):
+            text = f"{rng.choice(ADJECTIVES)} {rng.choice(ITEMS)}"
+            t0 = time.perf_counter()
+            approx = index.search(text, k)
+            ann_ms.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            exact = index.search(text, k, exact=True)
+            exact_ms.append((time.perf_counter() - t0) * 1000)
+            # Count by similarity so ties among equal descriptions don't penalise recall
+            if exact:
+                threshold = exact[-1][1] - 1e-6
+                recall += sum(1 for _, sim in approx if sim >= threshold) / len(exact)
+        ann_ms.sort()
+        exact_ms.sort()
+        print(f"recall@{k}: {recall / queries:.3f}")
+        print(f"ann   p50 {ann_ms[len(ann_ms) // 2]:.2f} ms  p95 {ann_ms[int(len(ann_ms) * 0.95)]:.2f} ms")
+        print(f"exact p50 {exact_ms[len(exact_ms) // 2]:.2f} ms  p95 {exact_ms[int(len(exact_ms) * 0.95)]:.2f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
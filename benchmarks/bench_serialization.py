@@ -0,0 +1,77 @@
+"""
+Benchmark the serialization layer and response compression.
+
+Compares stdlib json with `serialization` (orjson when installed) on the
+payloads the app actually moves: search responses, session upsert bodies,
+prompt state and the quest table load, then shows what gzip (and brotli, if
+installed) does to response sizes around RESPONSE_COMPRESS_MIN_BYTES.
+
+Usage: python -m benchmarks.bench_serialization [iterations]
+"""
+import sys
+import gzip
+import json
+import time
+import random
+import serialization
+from benchmarks.bench_session_codec import make_session
+from benchmarks.bench_semantic_index import make_text
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def make_quest(i: int, rng: random.Random) -> dict:
+    return {
+        "id": i, "quest_id": f"{rng.getrandbits(64):016x}", "want_or_have": rng.choice(["want", "have"]),
+        "description": make_text(rng), "general_category": "for_sale", "sub_category": "bikes",
+        "general_location": "Austin, TX", "lat": rng.uniform(25, 48), "lng": rng.uniform(-122, -71),
+        "distance": 10.0, "price": float(rng.randint(5, 2000)), "condition": "like new",
+        "photos": [f"/uploads/{rng.getrandbits(32):08x}.jpg"], "created_at": "2026-10-01T12:00:00+00:00",
+    }
+
+def timed(fn, payload, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    rng = random.Random(5)
+    backend = "orjson" if serialization.orjson else "stdlib"
+    print(f"serialization backend: {backend}")
+
+    payloads = {
+        "search response (20 quests)": {"count": 20, "results": [make_quest(i, rng) for i in range(20)]},
+        "session upsert (8 turns)": make_session(rng, 8),
+        "prompt state": make_session(rng, 1)["quest_state"],
+        "index page (1000 quests)": [make_quest(i, rng) for i in range(1000)],
+    }
+    print("  payload                        size    json.dumps   dumps   json.loads   loads  (us)")
+    for name, payload in payloads.items():
+        n = max(1, iterations // (50 if "1000" in name else 1))
+        encoded = json.dumps(payload)
+        raw = encoded.encode()
+        print(f"  {name:28s} {len(raw):7d} B  {timed(json.dumps, payload, n):9.1f} {timed(serialization.dumps_bytes, payload, n):7.1f}"
+              f"  {timed(json.loads, encoded, n):10.1f} {timed(serialization.loads, raw, n):7.1f}")
+
+    print(f"\nresponse compression (threshold {serialization.RESPONSE_COMPRESS_MIN_BYTES} B, gzip level {serialization.RESPONSE_COMPRESS_LEVEL})")
+    for count in (1, 5, 20, 100):
+        body = serialization.dumps_bytes({"count": count, "results": [make_quest(i, rng) for i in range(count)]})
+        if len(body) < serialization.RESPONSE_COMPRESS_MIN_BYTES:
+            print(f"  {count:3d} quests: {len(body):6d} B  (below threshold, sent as is)")
+            continue
+        start = time.perf_counter()
+        gz = gzip.compress(body, serialization.RESPONSE_COMPRESS_LEVEL)
+        gz_us = (time.perf_counter() - start) * 1e6
+        line = f"  {count:3d} quests: {len(body):6d} B -> gzip {len(gz):6d} B ({len(gz) / len(body):4.0%}, {gz_us:6.0f} us)"
+        if brotli:
+            start = time.perf_counter()
+            br = brotli.compress(body, quality=4)
+            line += f"  brotli {len(br):6d} B ({len(br) / len(body):4.0%}, {(time.perf_counter() - start) * 1e6:6.0f} us)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
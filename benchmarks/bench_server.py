@@ -0,0 +1,63 @@
+"""
+Load-test a running server to compare launch configurations.
+
+Keeps `concurrency` requests in flight against one endpoint for `duration`
+seconds and reports throughput and latency percentiles. Run it once against
+`uvicorn main:app` and once against `gunicorn -c gunicorn.conf.py main:app`
+on the same instance (see README, "Running in production").
+
+Usage: python -m benchmarks.bench_server URL [concurrency] [duration_s] [json_body]
+  e.g. python -m benchmarks.bench_server "http://localhost:8000/api/quests/search?q=bike" 64 30
+"""
+import sys
+import json
+import time
+import asyncio
+import httpx
+
+async def worker(client: httpx.AsyncClient, url: str, body, stop_at: float, latencies: list, errors: list):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            if body is None:
+                response = await client.get(url)
+            else:
+                response = await client.post(url, json=body)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def run(url: str, concurrency: int, duration_s: float, body) -> None:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        stop_at = time.monotonic() + duration_s
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, url, body, stop_at, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    n = len(latencies)
+    print(f"{url}  concurrency={concurrency}  {elapsed:.1f}s")
+    if not n:
+        print(f"  no successful requests ({len(errors)} errors: {errors[:5]})")
+        return
+    print(f"  {n / elapsed:8.1f} req/s  ok={n} errors={len(errors)}")
+    print(f"  latency ms: p50 {latencies[n // 2]:.1f}  p95 {latencies[int(n * 0.95)]:.1f}  "
+          f"p99 {latencies[min(n - 1, int(n * 0.99))]:.1f}  max {latencies[-1]:.1f}")
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    url = sys.argv[1]
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    duration_s = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    body = json.loads(sys.argv[4]) if len(sys.argv) > 4 else None
+    asyncio.run(run(url, concurrency, duration_s, body))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark compact session encoding.
+
+Builds synthetic conversations the way run_quest_turn does (user messages plus
+json.dumps-encoded assistant replies, sparse quest_state) and measures, per
+turn, the bytes of the quest_sessions row sent and received and the time to
+encode/decode it, for plain JSON columns vs the compressed `session_blob`.
+
+Usage: python -m benchmarks.bench_session_codec [n_sessions] [turns]
+"""
+import sys
+import json
+import time
+import random
+import session_codec
+from session_codec import encode_row, decode_row
+from benchmarks.bench_semantic_index import make_text
+
+REPLIES = [
+    "Great! Could you tell me a bit more about the condition of your {}?",
+    "Got it. Is your location {}?",
+    "How far are you willing to travel to meet a buyer? You can pick one of the options below.",
+    "Thanks! Would you like to add a photo of the {} so people can see what you're offering?",
+    "Perfect, your quest for the {} is ready. Would you like to post it now?",
+]
+CITIES = ["Austin, TX", "Portland, OR", "Denver, CO", "Chicago, IL", "Brooklyn, NY"]
+
+def make_session(rng: random.Random, turns: int) -> dict:
+    item = make_text(rng)
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": item if turn == 0 else rng.choice(["Yes", "10 mi", "like new", rng.choice(CITIES)])})
+        reply = rng.choice(REPLIES).format(rng.choice([item, rng.choice(CITIES)]))
+        history.append({"role": "assistant", "content": json.dumps(reply)})
+    state = {
+        "want_or_have": "have", "description": item, "general_location": rng.choice(CITIES), "location_confirmed": True,
+        "lat": round(rng.uniform(25, 48), 6), "lng": round(rng.uniform(-122, -71), 6), "distance": 10.0,
+        "price": float(rng.randint(20, 900)), "action": "ask_photo", "text": history[-1]["content"],
+    }
+    return {"quest_id": f"{rng.getrandbits(64):016x}", "quest_state": state, "chat_history": history,
+            "general_category": "for_sale", "sub_category": "bikes", "last_updated": "now()"}
+
+def measure(sessions, encoding: str):
+    session_codec.SESSION_ENCODING = encoding
+    wire, encode_s, decode_s = 0, 0.0, 0.0
+    for row in sessions:
+        start = time.perf_counter()
+        body = json.dumps(encode_row(row))  # what requests sends for the upsert
+        encode_s += time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = decode_row(json.loads(body))  # what load_session gets back
+        decode_s += time.perf_counter() - start
+        assert decoded["chat_history"] == row["chat_history"]
+        wire += len(body)
+    n = len(sessions)
+    return wire / n, encode_s / n * 1e6, decode_s / n * 1e6
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rng = random.Random(11)
+    encodings = ["json", "zlib"] + (["zstd"] if session_codec.zstandard else [])
+    print(f"{n_sessions} sessions, sizes at turns 1..{turns} (each turn reads and rewrites the whole row)")
+    for turn in sorted({1, turns // 2, turns}):
+        sessions = [make_session(rng, turn) for _ in range(n_sessions)]
+        baseline = None
+        for encoding in encodings:
+            wire, enc_us, dec_us = measure(sessions, encoding)
+            baseline = baseline or wire
+            print(f"  turn {turn:2d} {encoding:5s}: {wire:7.0f} B/row ({wire / baseline:4.0%})  "
+                  f"encode {enc_us:6.1f} us  decode {dec_us:6.1f} us")
+
+if __name__ == "__main__":
+    main()
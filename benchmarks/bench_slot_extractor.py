@@ -0,0 +1,48 @@
+"""
+Benchmark rule-based slot pre-extraction over logged first messages.
+
+Reports extraction latency and how many required fields each first message
+pre-fills; every pre-filled required field is one turn (and one Gemini call)
+the LLM no longer has to spend asking for it.
+
+Usage: python -m benchmarks.bench_slot_extractor [path/to/first_messages.jsonl]
+"""
+import os
+import sys
+import json
+import time
+from slot_extractor import extract_slots
+from quest_flow import REQUIRED_FIELDS
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "data", "first_messages.jsonl")
+
+def main(path: str = DEFAULT_DATA, rounds: int = 2000) -> None:
+    with open(path) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sample in samples:
+            extract_slots(sample["message"], sample["general_category"])
+    elapsed = time.perf_counter() - start
+    per_message_us = elapsed / (rounds * len(samples)) * 1e6
+
+    turns_saved = 0
+    turns_needed = 0
+    for sample in samples:
+        required = REQUIRED_FIELDS[sample["general_category"]]
+        slots = extract_slots(sample["message"], sample["general_category"])
+        hits = [f for f in required if f in slots]
+        turns_needed += len(required)
+        turns_saved += len(hits)
+        print(f"{sample['general_category']:<10} {len(hits)}/{len(required)} {sorted(slots)}")
+
+    print()
+    print(f"messages:            {len(samples)}")
+    print(f"extract time:        {per_message_us:.1f} us/message")
+    print(f"required fields:     {turns_needed}")
+    print(f"pre-filled:          {turns_saved} ({turns_saved / turns_needed:.0%})")
+    print(f"turns saved/session: {turns_saved / len(samples):.2f}")
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
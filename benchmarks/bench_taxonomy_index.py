@@ -0,0 +1,54 @@
+"""
+Benchmark classifier category normalization against the taxonomy.
+
+Replays sample classifier outputs (benchmarks/data/taxonomy_samples.jsonl,
+each with the sub_category it should snap to) through three strategies and
+reports accuracy and lookup time per sample:
+
+  exact    the previous behaviour: keep the value only if it is in taxonomy.json
+  difflib  difflib.get_close_matches over the category's sub-categories
+  index    taxonomy_index.normalize (normalized keys, aliases, trigram fuzzy)
+
+Usage: python -m benchmarks.bench_taxonomy_index [path/to/samples.jsonl]
+"""
+import os
+import sys
+import json
+import time
+import difflib
+from taxonomy_index import taxonomy_index
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "data", "taxonomy_samples.jsonl")
+ROUNDS = 200
+
+def exact(taxonomy, sample):
+    subs = taxonomy.get(sample["general_category"], [])
+    return sample["sub_category"] if sample["sub_category"] in subs else None
+
+def close_match(taxonomy, sample):
+    subs = taxonomy.get(sample["general_category"], [])
+    matches = difflib.get_close_matches(sample["sub_category"], subs, n=1, cutoff=0.6)
+    return matches[0] if matches else None
+
+def index(taxonomy, sample):
+    return taxonomy_index.normalize(sample)["sub_category"]
+
+def main(argv):
+    path = argv[0] if argv else DEFAULT_DATA
+    with open(path) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    taxonomy = taxonomy_index.taxonomy
+    print(f"{len(samples)} samples, {sum(len(v) for v in taxonomy.values())} sub-categories")
+    for name, fn in (("exact", exact), ("difflib", close_match), ("index", index)):
+        misses = [s for s in samples if fn(taxonomy, s) != s["expected"]]
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for sample in samples:
+                fn(taxonomy, sample)
+        us = (time.perf_counter() - start) / (ROUNDS * len(samples)) * 1e6
+        print(f"  {name:8s} correct {len(samples) - len(misses):3d}/{len(samples)}  {us:7.1f} us/lookup")
+        for sample in misses[:5]:
+            print(f"           miss {sample['general_category']}/{sample['sub_category']!r} -> {fn(taxonomy, sample)!r}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
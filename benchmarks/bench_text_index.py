@@ -0,0 +1,78 @@
+"""
+Benchmark the BM25 quest search index.
+
+Indexes N synthetic quests, then reports query latency with and without a
+category filter, and compares a snapshot reload against a full rebuild.
+
+Usage: python -m benchmarks.bench_text_index [n_quests]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from text_index import TextIndex
+from benchmarks.bench_semantic_index import make_text, ITEMS
+
+CATEGORIES = ["for_sale", "housing", "services", "community", "gigs", "jobs"]
+
+def make_record(i: int, rng: random.Random) -> dict:
+    return {
+        "general_category": rng.choice(CATEGORIES),
+        "sub_category": rng.choice(ITEMS).split()[-1],
+        "description": make_text(rng),
+        "service_type": rng.choice(ITEMS) if rng.random() < 0.2 else None,
+    }
+
+def percentiles(ms):
+    ms = sorted(ms)
+    return ms[len(ms) // 2], ms[int(len(ms) * 0.95)]
+
+def main(n: int = 200_000, queries: int = 500) -> None:
+    rng = random.Random(5)
+    records = [make_record(i, rng) for i in range(n)]
+    tmp = tempfile.mkdtemp(prefix="bench-text-")
+    try:
+        path = os.path.join(tmp, "text_index.pkl")
+        index = TextIndex(path)
+        t0 = time.perf_counter()
+        for i, record in enumerate(records):
+            index.upsert(str(i), record)
+        build = time.perf_counter() - t0
+        print(f"quests: {n:,}  terms: {len(index.postings):,}  build: {build:.2f}s ({build / n * 1e6:.0f} us/quest)")
+
+        for label, category in (("no filter", None), ("category", "services")):
+            ms = []
+            for _ in range(queries):
+                q = f"{rng.choice(ITEMS)} {rng.choice(['', 'cheap', 'like new'])}"
+                t0 = time.perf_counter()
+                index.search(q, 20, category)
+                ms.append((time.perf_counter() - t0) * 1000)
+            p50, p95 = percentiles(ms)
+            print(f"search ({label}): p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+        ms = []
+        candidates = {str(i) for i in rng.sample(range(n), 500)}
+        for _ in range(queries):
+            t0 = time.perf_counter()
+            index.search(rng.choice(ITEMS), 20, candidates=candidates)
+            ms.append((time.perf_counter() - t0) * 1000)
+        p50, p95 = percentiles(ms)
+        print(f"search (500 geo candidates): p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+        t0 = time.perf_counter()
+        index.save()
+        print(f"snapshot save: {time.perf_counter() - t0:.2f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+        t0 = time.perf_counter()
+        reloaded = TextIndex(path)
+        load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i, record in enumerate(records):
+            reloaded.upsert(str(i), record)
+        print(f"snapshot load: {load:.2f}s  + unchanged re-upsert: {time.perf_counter() - t0:.2f}s  (vs {build:.2f}s rebuild)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,170 @@
+import math
+import heapq
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# === IN-PROCESS SPATIAL INDEX ===
+# Uniform lat/lng grid; each cell holds one bucket per general_category so
+# category filters only touch matching points. Queries walk rings of cells
+# outward from the query point and stop as soon as the `limit` nearest hits
+# are guaranteed, so dense metros cost about as much as sparse areas.
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_MILE = 1.609344
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+def to_km(distance: float, unit: Optional[str] = "mi") -> float:
+    return distance * KM_PER_MILE if (unit or "mi").lower().startswith("mi") else distance
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+Cell = Tuple[int, int]
+
+class GeoIndex:
+    """Grid index of quest points; safe to update from request handlers."""
+
+    def __init__(self, cell_degrees: float = 0.02):
+        self.cell_degrees = cell_degrees
+        # Longitude cells around the globe; column indexes wrap at the antimeridian
+        self.lng_cells = int(round(360.0 / cell_degrees))
+        # quest key -> (lat, lng, general_category, sub_category, cell)
+        self.points: Dict[str, Tuple[float, float, Optional[str], Optional[str], Cell]] = {}
+        # cell -> general_category -> {quest key}
+        self.cells: Dict[Cell, Dict[Optional[str], set]] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return int(math.floor(lat / self.cell_degrees)), self._wrap_lng(int(math.floor(lng / self.cell_degrees)))
+
+    def _wrap_lng(self, x: int) -> int:
+        half = self.lng_cells // 2
+        return (x + half) % self.lng_cells - half
+
+    def upsert(self, key: str, lat: float, lng: float, general_category: Optional[str] = None, sub_category: Optional[str] = None) -> None:
+        cell = self._cell(lat, lng)
+        with self.lock:
+            self._remove_locked(key)
+            self.points[key] = (lat, lng, general_category, sub_category, cell)
+            self.cells.setdefault(cell, {}).setdefault(general_category, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        with self.lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: str) -> None:
+        old = self.points.pop(key, None)
+        if old is None:
+            return
+        buckets = self.cells.get(old[4])
+        if buckets is None:
+            return
+        bucket = buckets.get(old[2])
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del buckets[old[2]]
+        if not buckets:
+            del self.cells[old[4]]
+
+    @staticmethod
+    def _ring(cx: int, cy: int, r: int):
+        if r == 0:
+            yield cx, cy
+            return
+        for y in range(cy - r, cy + r + 1):
+            yield cx - r, y
+            yield cx + r, y
+        for x in range(cx - r + 1, cx + r):
+            yield x, cy - r
+            yield x, cy + r
+
+    def query(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        general_category: Optional[str] = None,
+        sub_category: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return [(quest key, distance_km)] within radius_km, nearest first. With
+        `limit`, the nearest `limit` of those; searches across the antimeridian.
+        """
+        cell_deg = self.cell_degrees
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        lat_edge = min(abs(lat) + dlat, 89.9)
+        cos_edge = max(math.cos(math.radians(lat_edge)), 1e-6)
+        # Narrowest cell width inside the search area bounds the ring distance
+        min_cell_km = cell_deg * KM_PER_DEGREE_LAT * cos_edge
+        dlng = min(radius_km / (KM_PER_DEGREE_LAT * cos_edge), 180.0)
+        cx, cy = self._cell(lat, lng)  # (lat row, lng column)
+        max_ring = int(math.ceil(max(dlat, dlng) / cell_deg)) + 1
+        min_x = int(math.floor((lat - dlat) / cell_deg))
+        max_x = int(math.floor((lat + dlat) / cell_deg))
+        # Ring columns are offsets from cy, wrapped onto the globe at lookup;
+        # a search wider than the globe visits each column once.
+        y_span = int(math.ceil(dlng / cell_deg)) + 1
+        y_low, y_high = -y_span, y_span
+        if 2 * y_span + 1 > self.lng_cells:
+            y_low, y_high = -(self.lng_cells // 2), self.lng_cells - self.lng_cells // 2 - 1
+
+        # Cheap equirectangular pre-filter, using the narrowest longitude degree
+        # in the search area so it never drops a real hit; candidates that pass
+        # get the exact haversine before they count toward `limit`.
+        km_per_deg_lng = KM_PER_DEGREE_LAT * cos_edge
+        slack_km = radius_km * 1.05
+        heap: List[Tuple[float, str]] = []  # max-heap on distance (negated)
+        hits: List[Tuple[str, float]] = []
+        with self.lock:
+            cells = self.cells
+            points = self.points
+            for r in range(max_ring + 1):
+                for x, y in self._ring(cx, 0, r):
+                    if not (min_x <= x <= max_x and y_low <= y <= y_high):
+                        continue
+                    buckets = cells.get((x, self._wrap_lng(cy + y)))
+                    if not buckets:
+                        continue
+                    if general_category:
+                        bucket = buckets.get(general_category)
+                        groups = (bucket,) if bucket else ()
+                    else:
+                        groups = buckets.values()
+                    for bucket in groups:
+                        for key in bucket:
+                            p_lat, p_lng, _, p_sub, _ = points[key]
+                            if sub_category and p_sub != sub_category:
+                                continue
+                            dy = (p_lat - lat) * KM_PER_DEGREE_LAT
+                            dx = ((p_lng - lng + 180.0) % 360.0 - 180.0) * km_per_deg_lng
+                            if dx * dx + dy * dy > slack_km * slack_km:
+                                continue
+                            d = haversine_km(lat, lng, p_lat, p_lng)
+                            if d > radius_km:
+                                continue
+                            if limit:
+                                if len(heap) < limit:
+                                    heapq.heappush(heap, (-d, key))
+                                elif d < -heap[0][0]:
+                                    heapq.heapreplace(heap, (-d, key))
+                            else:
+                                hits.append((key, d))
+                # Everything not yet scanned is at least r cells away
+                covered_km = r * min_cell_km
+                if covered_km > radius_km:
+                    break
+                if limit and len(heap) >= limit and -heap[0][0] <= covered_km:
+                    break
+        results = [(key, -neg_d) for neg_d, key in heap] if limit else hits
+        results.sort(key=lambda hit: hit[1])
+        return results
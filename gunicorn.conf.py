@@ -0,0 +1,90 @@
+import os
+import sys
+import asyncio
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+
+# === PRODUCTION SERVER ===
+# gunicorn -c gunicorn.conf.py main:app
+#
+# A single uvicorn worker by default. The quest indexes, the percolator's
+# notification queue and buffered session writes (PENDING_SESSION_WRITES) are
+# in-process state: with several workers each holds its own copy, sees only
+# its own writes, and the copies drift apart. Only one process may write the
+# semantic index file; a second worker keeps its semantic index in memory.
+# WEB_CONCURRENCY > 1 is only safe once that state moves out of the process.
+#
+# The app is preloaded in the master so taxonomy, prompts and module setup are
+# imported once. Per-process state (Gemini clients, the LLM cache's SQLite
+# connection) is recreated after fork; the quest indexes are opened and
+# loaded in the worker's startup, never in the master. Workers are recycled
+# after WORKER_MAX_REQUESTS requests or when RSS passes WORKER_MAX_RSS_MB
+# (checked in main), and on SIGTERM get GRACEFUL_TIMEOUT_S to finish
+# in-flight requests and Gemini calls (see DrainingUvicornWorker).
+
+# Kept back from GRACEFUL_TIMEOUT_S for the app's own shutdown (snapshotting
+# the quest indexes) once requests have finished or been cancelled
+SHUTDOWN_RESERVE_S = float(os.getenv("SHUTDOWN_RESERVE_S", "10"))
+
+class DrainingServer(Server):
+    async def shutdown(self, sockets=None) -> None:
+        from vertex_client import drain_llm_calls
+        # Start waiting for Gemini calls when the signal arrives, alongside the
+        # requests, not after them; both share timeout_graceful_shutdown
+        drain = asyncio.ensure_future(drain_llm_calls(self.config.timeout_graceful_shutdown))
+        await super().shutdown(sockets)
+        if self.force_exit:
+            drain.cancel()  # a second signal means stop now
+        await asyncio.gather(drain, return_exceptions=True)
+
+class DrainingUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker whose graceful shutdown fits in gunicorn's graceful_timeout.
+    Without a bound, uvicorn waits on requests until gunicorn SIGKILLs the
+    worker, and the app's shutdown never runs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(1, int(self.cfg.graceful_timeout - SHUTDOWN_RESERVE_S))
+
+    async def _serve(self) -> None:
+        # UvicornWorker._serve with DrainingServer in place of Server
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = DrainingUvicornWorker
+workers = int(os.getenv("WEB_CONCURRENCY") or 1)
+preload_app = True
+
+# Recycle workers to bound slow leaks; jitter keeps them from restarting together
+max_requests = int(os.getenv("WORKER_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "500"))
+os.environ.setdefault("WORKER_MAX_RSS_MB", "1024")
+
+# Long enough for a Gemini call at its full retry deadline to finish, plus SHUTDOWN_RESERVE_S
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT_S", str(int(float(os.getenv("LLM_DEADLINE_S", "60")) + SHUTDOWN_RESERVE_S))))
+timeout = int(os.getenv("WORKER_TIMEOUT_S", "120"))
+keepalive = 5
+
+accesslog = "-"
+
+def post_fork(server, worker):
+    from vertex_client import reset_clients
+    from llm_cache import llm_cache
+    reset_clients()
+    llm_cache.reopen()
+
+def on_starting(server):
+    server.log.info(f"Starting {workers} workers")
+    if workers > 1:
+        server.log.warning(
+            "WEB_CONCURRENCY > 1: quest indexes, notifications and buffered session writes are per worker "
+            "and will diverge; only the first worker writes the semantic index file"
+        )
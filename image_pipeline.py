@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it photos are served as uploaded
+    Image = None
+    ImageOps = None
+
+# === QUEST PHOTO PIPELINE ===
+# Resizing and re-encoding is CPU-bound, so it runs in a process pool fed by a
+# bounded queue instead of inside the async upload handler.
+
+# Rendition name -> longest edge in pixels
+RENDITIONS: Dict[str, int] = {
+    "thumb": 256,
+    "medium": 800,
+    "large": 1600,
+}
+RENDITION_FORMAT = "JPEG"
+RENDITION_EXT = "jpg"
+RENDITION_QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", "256"))
+
+def rendition_name(file_name: str, rendition: str) -> str:
+    """`<sha256>.png` -> `<sha256>_thumb.jpg`; renditions are derivable from the original name."""
+    return f"{file_name.rsplit('.', 1)[0]}_{rendition}.{RENDITION_EXT}"
+
+def process_image(src_path: str, out_dir: str) -> Dict[str, Any]:
+    """
+    Build all renditions for one photo. Runs in a worker process.
+    EXIF (including GPS) is dropped because renditions are re-encoded without it;
+    orientation is applied to the pixels first so photos aren't sideways.
+    """
+    start = time.perf_counter()
+    file_name = os.path.basename(src_path)
+    renditions: Dict[str, str] = {}
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            # Flatten transparency onto white for JPEG output
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.split()[-1])
+            img = background
+        width, height = img.size
+        for name, size in RENDITIONS.items():
+            out_name = rendition_name(file_name, name)
+            out_path = os.path.join(out_dir, out_name)
+            if not os.path.exists(out_path):
+                copy = img.copy()
+                copy.thumbnail((size, size), Image.LANCZOS)
+                tmp_path = f"{out_path}.tmp"
+                copy.save(tmp_path, RENDITION_FORMAT, quality=RENDITION_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp_path, out_path)
+            renditions[name] = out_name
+    return {
+        "file_name": file_name,
+        "width": width,
+        "height": height,
+        "renditions": renditions,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+class ImagePipeline:
+    """Bounded queue of photo jobs drained by async workers that dispatch to a process pool."""
+
+    def __init__(self, upload_dir: str, workers: int = IMAGE_WORKERS, queue_size: int = IMAGE_QUEUE_SIZE):
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.tasks = []
+        self.stats = {"queued": 0, "processed": 0, "failed": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def start(self) -> None:
+        if not self.enabled:
+            logging.warning("[ImagePipeline] Pillow not installed; photo renditions disabled")
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"[ImagePipeline] Started {self.workers} workers (queue size {self.queue_size})")
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def enqueue(self, file_name: str, session_id: Optional[str] = None) -> bool:
+        """Queue a photo for processing. Returns False when the pipeline is off or full."""
+        if self.queue is None:
+            return False
+        try:
+            self.queue.put_nowait((file_name, session_id, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            logging.warning(f"[ImagePipeline] Queue full, skipping renditions for {file_name}")
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            file_name, session_id, queued_at = await self.queue.get()
+            try:
+                src_path = os.path.join(self.upload_dir, file_name)
+                result = await loop.run_in_executor(self.executor, process_image, src_path, self.upload_dir)
+                wait_ms = (time.perf_counter() - queued_at) * 1000 - result["elapsed_ms"]
+                self.stats["processed"] += 1
+                self.stats["total_ms"] += result["elapsed_ms"]
+                self.stats["max_ms"] = max(self.stats["max_ms"], result["elapsed_ms"])
+                logging.info(f"[ImagePipeline] {file_name}: {result['elapsed_ms']}ms processing, {wait_ms:.1f}ms queued")
+                if session_id:
+                    await record_renditions(session_id, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"[ImagePipeline] Failed to process {file_name}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def snapshot(self) -> Dict[str, Any]:
+        processed = self.stats["processed"]
+        return {
+            **self.stats,
+            "avg_ms": round(self.stats["total_ms"] / processed, 2) if processed else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "enabled": self.enabled,
+        }
+
+async def record_renditions(session_id: str, result: Dict[str, Any]) -> None:
+    """Store rendition URLs under quest_state.photo_renditions, keyed by the original photo URL."""
+    from quest_tools import update_server_fields
+    def add(quest_state):
+        renditions = dict(quest_state.get("photo_renditions") or {})
+        renditions[f"/uploads/{result['file_name']}"] = {
+            "width": result["width"],
+            "height": result["height"],
+            **{name: f"/uploads/{out_name}" for name, out_name in result["renditions"].items()},
+        }
+        quest_state["photo_renditions"] = renditions
+    await update_server_fields(session_id, add)
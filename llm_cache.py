@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import metrics
+
+# === LLM RESPONSE CACHE ===
+# Opt-in memoization for deterministic Gemini call sites. Keys are a SHA-256
+# of (model id, temperature, max tokens, messages); entries live in an
+# in-memory LRU with an optional SQLite tier on disk shared across restarts.
+# Call sites not listed in LLM_CACHE_TTLS (e.g. conversation turns) bypass it.
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+# Disk tier; empty disables it
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+# Call site -> TTL in seconds
+LLM_CACHE_TTLS: Dict[str, float] = {
+    "classify": float(os.getenv("LLM_CACHE_TTL_CLASSIFY", str(24 * 3600))),
+    "confirm_location": float(os.getenv("LLM_CACHE_TTL_CONFIRM_LOCATION", str(7 * 24 * 3600))),
+}
+
+def cache_key(model_id: str, temperature: float, max_tokens: int, messages: List[Dict[str, str]]) -> str:
+    payload = json.dumps(
+        {"model": model_id, "temperature": temperature, "max_tokens": max_tokens, "messages": messages},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Two-tier TTL cache: LRU dict in memory, optional SQLite file behind it."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, path: str = LLM_CACHE_PATH):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+            self.db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self.db.commit()
+
+    def reopen(self) -> None:
+        """Open a fresh SQLite connection; called in forked workers, which can't share the parent's."""
+        if self.db is not None:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+
+    def get(self, key: str, call_site: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self._count("hit", "memory", call_site)
+                    return entry[1]
+                del self.entries[key]
+            if self.db is not None:
+                row = self.db.execute("SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and row[0] > now:
+                    self._remember(key, row[0], row[1])
+                    self._count("hit", "disk", call_site)
+                    return row[1]
+        self._count("miss", None, call_site)
+        return None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        expires_at = time.time() + ttl
+        with self.lock:
+            self._remember(key, expires_at, value)
+            if self.db is not None:
+                try:
+                    self.db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, expires_at, value))
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    logging.error(f"[LLMCache] Disk write failed: {e}")
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _count(outcome: str, tier: Optional[str], call_site: str) -> None:
+        metrics.incr("llm_cache.lookups")
+        metrics.incr(f"llm_cache.{outcome}")
+        metrics.incr(f"llm_cache.{outcome}.{call_site}")
+        if tier:
+            metrics.incr(f"llm_cache.{outcome}.{tier}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": len(self.entries),
+            "disk": self.db is not None,
+            "hit_rate": metrics.ratio("llm_cache.hit", "llm_cache.lookups"),
+        }
+
+llm_cache = LLMCache()
+
+def cache_ttl(call_site: Optional[str]) -> Optional[float]:
+    """TTL for a call site, or None if its responses must not be cached."""
+    if not LLM_CACHE_ENABLED or not call_site:
+        return None
+    ttl = LLM_CACHE_TTLS.get(call_site)
+    if not ttl:
+        metrics.incr(f"llm_cache.bypass.{call_site}")
+    return ttl or None
@@ -0,0 +1,179 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import metrics
+
+# === GEMINI CALL SCHEDULER ===
+# Replaces a plain semaphore in front of Gemini: LLM_CONCURRENCY calls run at
+# once, and waiting calls are served by priority class:
+#   interactive  - turns of conversations already in progress
+#   new          - first turn of a new session (classification etc.)
+#   background   - batch jobs and anything that didn't declare a class
+# Classes are served strictly in that order, except that a call waiting longer
+# than LLM_SCHED_AGING_S is served next regardless of class (no starvation).
+# Within a class, calls are ordered by weighted fair queuing over sessions
+# (virtual finish tags), so one session with many queued calls takes turns
+# with the others instead of draining first.
+#
+# The class and session are taken from a context variable set around a turn
+# (`llm_priority`), so they reach the Gemini call without threading arguments
+# through every layer. A caller with a deadline passes `timeout_s`; a call
+# still queued when it runs out gives up its place (SchedulerWaitTimeout).
+
+INTERACTIVE, NEW, BACKGROUND = "interactive", "new", "background"
+PRIORITY_CLASSES = (INTERACTIVE, NEW, BACKGROUND)
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_SCHED_AGING_S = float(os.getenv("LLM_SCHED_AGING_S", "10"))
+
+_current: ContextVar[Tuple[str, Optional[str]]] = ContextVar("llm_priority", default=(BACKGROUND, None))
+
+@contextmanager
+def llm_priority(priority: str, session_id: Optional[str] = None):
+    """Gemini calls made inside this block (including tasks it spawns) use `priority` for `session_id`."""
+    token = _current.set((priority if priority in PRIORITY_CLASSES else BACKGROUND, session_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def current_priority() -> Tuple[str, Optional[str]]:
+    return _current.get()
+
+class SchedulerWaitTimeout(TimeoutError):
+    """No Gemini call slot became free within the caller's timeout."""
+
+class _Waiter:
+    __slots__ = ("future", "priority", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: str):
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+class LLMScheduler:
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, aging_s: float = LLM_SCHED_AGING_S):
+        self.concurrency = concurrency
+        self.aging_s = aging_s
+        self.running = 0
+        self.seq = itertools.count()
+        # Per class: heap of (finish_tag, seq, waiter), the class's virtual time,
+        # and each session's last finish tag
+        self.queues: Dict[str, List[Tuple[float, int, _Waiter]]] = {c: [] for c in PRIORITY_CLASSES}
+        self.virtual_time: Dict[str, float] = {c: 0.0 for c in PRIORITY_CLASSES}
+        self.session_finish: Dict[str, Dict[str, float]] = {c: {} for c in PRIORITY_CLASSES}
+        self.queued: Dict[str, int] = {c: 0 for c in PRIORITY_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, session_id: Optional[str] = None, timeout_s: Optional[float] = None):
+        """Hold one of the concurrency slots; class/session default to the current `llm_priority`."""
+        if priority is None:
+            priority, session_id = current_priority()
+        await self.acquire(priority, session_id, timeout_s)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: str, session_id: Optional[str], timeout_s: Optional[float] = None) -> None:
+        if self.running < self.concurrency and not any(self.queued.values()):
+            self.running += 1
+            metrics.observe(f"llm.sched.wait_ms.{priority}", 0.0)
+            self._export()
+            return
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority)
+        self._enqueue(waiter, session_id)
+        # The queue may only hold cancelled waiters; let free slots go out now
+        self._dispatch()
+        try:
+            # asyncio.wait leaves the future alone on timeout, so a slot granted
+            # at the last moment is seen below rather than lost
+            await asyncio.wait({waiter.future}, timeout=max(timeout_s, 0.0) if timeout_s is not None else None)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            metrics.incr(f"llm.sched.timeouts.{priority}")
+            raise SchedulerWaitTimeout(f"No Gemini call slot within {timeout_s:.1f}s")
+        metrics.observe(f"llm.sched.wait_ms.{priority}", (time.monotonic() - waiter.enqueued_at) * 1000)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done() and not waiter.future.cancelled():
+            # Granted a slot just as we gave up; hand it on
+            self.release()
+        else:
+            # Skipped (and uncounted) when it reaches the head of its queue
+            waiter.future.cancel()
+
+    def release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+        self._export()
+
+    def _enqueue(self, waiter: _Waiter, session_id: Optional[str]) -> None:
+        priority = waiter.priority
+        # Each call costs one unit; sessions are weighted equally. Calls without
+        # a session share one anonymous flow per class.
+        flow = session_id or ""
+        finishes = self.session_finish[priority]
+        finish = max(self.virtual_time[priority], finishes.get(flow, 0.0)) + 1.0
+        finishes[flow] = finish
+        heapq.heappush(self.queues[priority], (finish, next(self.seq), waiter))
+        self.queued[priority] += 1
+        self._export()
+
+    def _pop(self, priority: str) -> Optional[_Waiter]:
+        queue = self.queues[priority]
+        while queue:
+            finish, _, waiter = heapq.heappop(queue)
+            self.queued[priority] -= 1
+            if waiter.future.cancelled():
+                continue
+            self.virtual_time[priority] = finish
+            if not queue:
+                # Idle class: forget finish tags so they don't grow without bound
+                self.session_finish[priority].clear()
+            return waiter
+        return None
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        # Aged calls first, oldest of the class heads
+        aged = [
+            (queue[0][2].enqueued_at, priority) for priority, queue in self.queues.items()
+            if queue and now - queue[0][2].enqueued_at >= self.aging_s
+        ]
+        if aged:
+            waiter = self._pop(min(aged)[1])
+            if waiter is not None:
+                metrics.incr("llm.sched.aged")
+                return waiter
+        for priority in PRIORITY_CLASSES:
+            waiter = self._pop(priority)
+            if waiter is not None:
+                return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while self.running < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def _export(self) -> None:
+        metrics.set_gauge("llm.sched.running", self.running)
+        for priority, count in self.queued.items():
+            metrics.set_gauge(f"llm.sched.queued.{priority}", count)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"running": self.running, "concurrency": self.concurrency, **{f"queued_{p}": n for p, n in self.queued.items()}}
+
+llm_scheduler = LLMScheduler()
@@ -40,28 +40,103 @@ if os.path.exists("service-account.json"):
     with open("service-account.json") as f:
         #logging.info(f"service-account.json contents:", f.read())
         pass
-import json
+import asyncio
+import signal
 import uvicorn
 from uuid import uuid4
-from fastapi import FastAPI, Request, UploadFile, File
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from routes.quests import router as quests_router
+from routes.photos import router as photos_router, image_pipeline
+from routes.subscriptions import router as subscriptions_router
 
 from quest_tools import (
     load_session,
-    save_session,
+    load_sessions,
+    session_writes,
+    save_turn,
+    save_turns,
     update_quest_state,
     process_quest,
     classify_quest
 )
+from quick_replies import apply_quick_reply
+from quest_schema import compact_state
+from quest_indexes import open_quest_indexes, load_quest_indexes, save_quest_indexes, notifier
+from llm_cache import llm_cache
+from vertex_client import LLMUnavailableError
+from llm_scheduler import llm_priority, llm_scheduler, INTERACTIVE, NEW, BACKGROUND
+from quota_governor import quota_governor
+from supabase_client import supabase_breaker
+from admission import AdmissionRejected, check_rate_limits, client_ip, retry_after_header, gate as admission_gate
+from admission import snapshot as admission_snapshot
+import metrics
+import serialization
+from serialization import FastJSONResponse, add_compression
+
+# Seconds clients should wait after a 503 caused by Gemini being unavailable
+LLM_RETRY_AFTER = os.getenv("LLM_RETRY_AFTER", "5")
+
+# Worker lifecycle (see gunicorn.conf.py): the RSS at which a worker asks to
+# be replaced (0 = off)
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "0"))
+WORKER_RSS_CHECK_S = float(os.getenv("WORKER_RSS_CHECK_S", "30"))
 
 # === FASTAPI SETUP ===
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+add_compression(app)
 app.include_router(quests_router)
+app.include_router(photos_router)
+app.include_router(subscriptions_router)
 #app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return FastJSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests", "reason": exc.reason},
+        headers={"Retry-After": retry_after_header(exc.retry_after)}
+    )
+
+@app.on_event("startup")
+async def startup():
+    image_pipeline.start()
+    notifier.start()
+    open_quest_indexes()
+    # Large tables take a while; serve requests while the indexes fill in
+    app.state.index_loader = asyncio.create_task(asyncio.to_thread(load_quest_indexes))
+    if WORKER_MAX_RSS_MB:
+        app.state.rss_watchdog = asyncio.create_task(rss_watchdog())
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+async def rss_watchdog():
+    """SIGTERM ourselves once RSS passes WORKER_MAX_RSS_MB; gunicorn drains this worker and forks a fresh one."""
+    while True:
+        await asyncio.sleep(WORKER_RSS_CHECK_S)
+        try:
+            rss = rss_mb()
+        except OSError:
+            return  # no /proc (not Linux); nothing to watch
+        metrics.set_gauge("worker.rss_mb", round(rss, 1))
+        if rss > WORKER_MAX_RSS_MB:
+            logging.warning(f"[rss_watchdog] RSS {rss:.0f} MB > {WORKER_MAX_RSS_MB} MB; recycling worker {os.getpid()}")
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+
+@app.on_event("shutdown")
+async def shutdown():
+    await image_pipeline.stop()
+    await notifier.stop()
+    # A half-loaded index would be snapshotted as if it were complete
+    if app.state.index_loader.done():
+        await asyncio.to_thread(save_quest_indexes)
+
 class QuestRequest(BaseModel):
     session_id: Optional[str] = None
     message: str
@@ -71,63 +146,182 @@ class QuestResponse(BaseModel):
     session_id: str
     quest_state: Dict[str, Any]
 
-@app.post("/start-quest", response_model=QuestResponse)
-async def start_quest(request: QuestRequest):
-    try:
-        logging.info("/start-quest endpoint called with: %s", request)
-        # Generate or use provided session ID
-        session_id = request.session_id or str(uuid4())
-        logging.info(f"Using session_id: {session_id}")
-        
-        # Load previous session
-        session = await load_session(session_id)
-        logging.info(f"Loaded session: {session}")
-        chat_history = session.get("chat_history", [])
-        quest_state = session.get("quest_state", {})
-        logging.info(f"Initial chat_history: {chat_history}")
-        logging.info(f"Initial quest_state: {quest_state}")
-        
-        # Always process a new user message
-        general_category = session.get("general_category")
-        sub_category = session.get("sub_category")
+async def run_quest_turn(session_id: str, message: str, session: Dict[str, Any], persist: bool = True) -> Dict[str, Any]:
+    """
+    Run one conversation turn against an already loaded session.
+    Updates `session` in place (chat_history, quest_state, categories) and returns
+    the result for the frontend (including 'ui'). The caller saves the session.
+    """
+    chat_history = session.get("chat_history", [])
+    quest_state = session.get("quest_state", {})
+    logging.info(f"Initial chat_history: {chat_history}")
+    logging.info(f"Initial quest_state: {quest_state}")
+
+    # Always process a new user message
+    general_category = session.get("general_category")
+    sub_category = session.get("sub_category")
+    # Always append user message to chat_history
+    chat_history.append({"role": "user", "content": message})
+    logging.info(f"Appended user message. chat_history now: {chat_history}")
+    # Quick-reply buttons are handled locally; free text goes to the LLM
+    result = apply_quick_reply(quest_state, message, general_category)
+    if result is None:
         classification = None
         # Only classify if categories are missing
         if not (general_category and sub_category):
             logging.info("Calling classify_quest for category detection...")
-            classification = await classify_quest(request.message)
+            classification = await classify_quest(message)
             logging.info(f"Classification result: {classification}")
             general_category = classification.get("general_category")
             sub_category = classification.get("sub_category")
-        # Always append user message to chat_history
-        chat_history.append({"role": "user", "content": request.message})
-        logging.info(f"Appended user message. chat_history now: {chat_history}")
         # Process quest
         logging.info("Calling process_quest...")
         result = await process_quest(
-            quest_text=request.message,
+            quest_text=message,
             session_id=session_id,
-            chat_history=chat_history
+            chat_history=chat_history,
+            session={**session, "general_category": general_category, "sub_category": sub_category},
+            persist=persist
         )
-        logging.info(f"process_quest result: {result}")
-        # Update chat history with assistant response
-        chat_history.append({"role": "assistant", "content": json.dumps(result.get("text"))})
-        logging.info(f"Appended assistant response. chat_history now: {chat_history}")
-        # Remove 'ui' before saving to Supabase
-        quest_state_to_save = {k: v for k, v in result.items() if k != "ui"}
-        # Use the most up-to-date categories
-        general_category = result.get("general_category") or general_category
-        sub_category = result.get("sub_category") or sub_category
-        await save_session(session_id, quest_state_to_save, chat_history, general_category, sub_category)
-        logging.info(f"Session saved for session_id: {session_id}")
-        # Return the full result (including 'ui') to the frontend
-        return QuestResponse(
-            status="ok",
-            session_id=session_id,
-            quest_state=result
+    logging.info(f"process_quest result: {result}")
+    # Update chat history with assistant response
+    chat_history.append({"role": "assistant", "content": serialization.dumps(result.get("text"))})
+    logging.info(f"Appended assistant response. chat_history now: {chat_history}")
+    # Remove 'ui' before saving to Supabase; keep server-side fields (photos,
+    # photo_renditions) the model didn't echo back
+    # Use the most up-to-date categories
+    session["general_category"] = result.get("general_category") or general_category
+    session["sub_category"] = result.get("sub_category") or sub_category
+    # Only the category's fields, without nulls, are kept in the session
+    session["quest_state"] = compact_state(
+        {**quest_state, **{k: v for k, v in result.items() if k != "ui"}},
+        session["general_category"]
+    )
+    session["chat_history"] = chat_history
+    return result
+
+@app.post("/start-quest", response_model=QuestResponse)
+async def start_quest(request: QuestRequest, http_request: Request):
+    # Over-limit requests get a 429 here (see admission_rejected), before any Gemini call
+    check_rate_limits(client_ip(http_request), [request.session_id] if request.session_id else ())
+    async with admission_gate.slot():
+        try:
+            logging.info("/start-quest endpoint called with: %s", request)
+            # Generate or use provided session ID
+            session_id = request.session_id or str(uuid4())
+            logging.info(f"Using session_id: {session_id}")
+        
+            # Load previous session; photo uploads may write it while the turn runs
+            writes = session_writes(session_id)
+            seen = writes.photo_writes
+            session = await load_session(session_id)
+            logging.info(f"Loaded session: {session}")
+            # Ongoing conversations get Gemini ahead of new sessions when calls queue up
+            with llm_priority(INTERACTIVE if session.get("chat_history") else NEW, session_id):
+                result = await run_quest_turn(session_id, request.message, session)
+            await save_turn(session_id, session, writes, seen)
+            logging.info(f"Session saved for session_id: {session_id}")
+            # Return the full result (including 'ui') to the frontend
+            return QuestResponse(
+                status="ok",
+                session_id=session_id,
+                quest_state=result
+            )
+        except LLMUnavailableError as e:
+            # Retries/hedges already spent the deadline; tell the client to come back
+            logging.error(f"[start_quest] {e}")
+            raise HTTPException(status_code=503, detail="Assistant temporarily unavailable", headers={"Retry-After": LLM_RETRY_AFTER})
+        except Exception as e:
+            logging.exception("Error in /start-quest endpoint")
+            raise
+
+# === BATCH CONVERSATIONS ===
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+class BatchQuestRequest(BaseModel):
+    items: List[QuestRequest]
+
+class BatchQuestItemResult(BaseModel):
+    index: int
+    status: str
+    session_id: str
+    quest_state: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class BatchQuestResponse(BaseModel):
+    status: str
+    results: List[BatchQuestItemResult]
+
+@app.post("/start-quest/batch", response_model=BatchQuestResponse)
+async def start_quest_batch(request: BatchQuestRequest, http_request: Request):
+    """
+    Process many {session_id, message} pairs in one request.
+    Sessions run concurrently (Gemini calls share the LLM_CONCURRENCY limit at background priority);
+    messages for the same session run in order. Sessions are saved with bulk upserts.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ITEMS} items)")
+    logging.info(f"/start-quest/batch called with {len(request.items)} items")
+    # The client is charged per item, each session per message it sends
+    check_rate_limits(
+        client_ip(http_request),
+        [item.session_id for item in request.items if item.session_id],
+        cost=len(request.items)
+    )
+
+    # Group items by session, preserving message order within each session
+    by_session: Dict[str, List[int]] = {}
+    for index, item in enumerate(request.items):
+        session_id = item.session_id or str(uuid4())
+        by_session.setdefault(session_id, []).append(index)
+
+    async with admission_gate.slot():
+        writes = {session_id: session_writes(session_id) for session_id in by_session}
+        seen = {session_id: w.photo_writes for session_id, w in writes.items()}
+        sessions = await load_sessions(list(by_session))
+        results: List[Optional[BatchQuestItemResult]] = [None] * len(request.items)
+        touched: Dict[str, Dict[str, Any]] = {}
+
+        async def run_session(session_id: str, indexes: List[int]) -> None:
+            session = sessions[session_id]
+            # Bulk work yields to live conversations
+            with llm_priority(BACKGROUND, session_id):
+                for index in indexes:
+                    history_len = len(session.get("chat_history", []))
+                    try:
+                        result = await run_quest_turn(session_id, request.items[index].message, session, persist=False)
+                        touched[session_id] = session
+                        results[index] = BatchQuestItemResult(
+                            index=index, status="ok", session_id=session_id, quest_state=result
+                        )
+                    except Exception as e:
+                        logging.exception(f"Error in batch item {index} for session {session_id}")
+                        # Drop the failed turn so later messages see a consistent history
+                        del session.get("chat_history", [])[history_len:]
+                        results[index] = BatchQuestItemResult(
+                            index=index, status="error", session_id=session_id, error=str(e)
+                        )
+
+        await asyncio.gather(*(run_session(session_id, indexes) for session_id, indexes in by_session.items()))
+        if touched:
+            await save_turns(touched, writes, seen)
+        failed = sum(1 for r in results if r.status != "ok")
+        return BatchQuestResponse(
+            status="ok" if not failed else ("error" if failed == len(results) else "partial"),
+            results=results
         )
-    except Exception as e:
-        logging.exception("Error in /start-quest endpoint")
-        raise
+
+@app.get("/metrics")
+async def get_metrics():
+    """Process counters and recent latency percentiles."""
+    return {
+        **metrics.snapshot(),
+        "llm_cache": llm_cache.stats(),
+        "supabase": supabase_breaker.snapshot(),
+        "admission": admission_snapshot(),
+        "llm_scheduler": llm_scheduler.snapshot(),
+        "llm_quota": quota_governor.snapshot()
+    }
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
@@ -0,0 +1,265 @@
+import os
+import math
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from geo_index import EARTH_RADIUS_KM, to_km
+
+# === WANT/HAVE MATCHING ENGINE ===
+# Quests are stored column-wise in NumPy arrays, one table per general_category.
+# Matching a quest scores every opposite-side quest in its category at once:
+# haversine distance, mutual travel-radius eligibility and price compatibility
+# are all computed as array operations, in chunks to bound memory.
+
+# Travel radius assumed when a quest didn't set `distance`
+DEFAULT_RADIUS_KM = to_km(float(os.getenv("MATCH_DEFAULT_RADIUS_MI", "20")), "mi")
+# Pairs scored per array operation, and query quests scored together
+MATCH_CHUNK = int(os.getenv("MATCH_CHUNK", "262144"))
+MATCH_BATCH = int(os.getenv("MATCH_BATCH", "64"))
+
+# Categories whose quests say which side they're on (quest_prompts.CATEGORY_SPECS
+# asks want_or_have only for these), and the money field compared between a
+# "want" and a "have". Jobs, services, community and gigs quests carry no side
+# and are not matched.
+PRICE_FIELDS = {
+    "for_sale": "price",
+    "housing": "budget",
+}
+MATCH_CATEGORIES = frozenset(PRICE_FIELDS)
+
+# Score weights; distance and price scores are in [0, 1]
+DISTANCE_WEIGHT = 0.5
+PRICE_WEIGHT = 0.3
+SUB_CATEGORY_WEIGHT = 0.2
+
+HAVE, WANT, UNKNOWN = 1, 0, -1
+ANY_MARKET, RENTAL, SALE = 0, 1, 2
+
+# want_or_have values -> (side, market). Housing stores the intent itself
+# (quest_flow's housing buttons), and only the same market pairs up: rent and
+# sublet with rent out, buy with sell.
+SIDE_VALUES = {
+    "have": (HAVE, ANY_MARKET), "want": (WANT, ANY_MARKET),
+    "rent": (WANT, RENTAL), "sublet": (WANT, RENTAL), "rent out": (HAVE, RENTAL),
+    "buy": (WANT, SALE), "sell": (HAVE, SALE),
+}
+
+def _side(value: Optional[str]) -> Tuple[int, int]:
+    return SIDE_VALUES.get((value or "").strip().lower(), (UNKNOWN, ANY_MARKET))
+
+def quest_side(value: Optional[str]) -> Optional[str]:
+    """"want", "have" or None for a want_or_have value."""
+    side = _side(value)[0]
+    return "have" if side == HAVE else "want" if side == WANT else None
+
+def quest_market(value: Optional[str]) -> int:
+    """Which market a want_or_have value trades in; quests only match within one."""
+    return _side(value)[1]
+
+def _float(value: Any) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+def price_scores(want_price: np.ndarray, have_price: np.ndarray) -> np.ndarray:
+    """
+    1.0 when the asking price fits the budget, decaying linearly to 0 at twice
+    the budget; 0.5 (neutral) when either side didn't state a price.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        over = (have_price - want_price) / np.where(want_price > 0, want_price, np.nan)
+        score = np.clip(1.0 - over, 0.0, 1.0)
+    # A zero budget only matches free items
+    score = np.where(np.isnan(score), 0.0, score)
+    score = np.where(have_price <= want_price, 1.0, score)
+    return np.where(np.isnan(want_price) | np.isnan(have_price), 0.5, score)
+
+class CategoryTable:
+    """Growable column store for the quests of one general_category."""
+
+    def __init__(self, capacity: int = 1024):
+        self.keys: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.sub_codes: Dict[Optional[str], int] = {}
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        # Unit vectors on the sphere: great-circle distance comes from a dot
+        # product, so a batch of queries is a single matrix multiply
+        self.xyz = np.zeros((capacity, 3), dtype=np.float64)
+        self.radius_km = np.zeros(capacity, dtype=np.float64)
+        self.cos_reach = np.ones(capacity, dtype=np.float64)  # cos(radius / earth radius)
+        self.price = np.full(capacity, np.nan, dtype=np.float64)
+        self.side = np.full(capacity, UNKNOWN, dtype=np.int8)
+        self.market = np.zeros(capacity, dtype=np.int8)
+        self.sub = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _grow(self) -> None:
+        old = {name: getattr(self, name)[:self.size] for name in ("xyz", "radius_km", "cos_reach", "price", "side", "market", "sub", "alive")}
+        self._allocate(self.capacity * 2)
+        for name, values in old.items():
+            getattr(self, name)[:self.size] = values
+
+    def sub_code(self, sub_category: Optional[str]) -> int:
+        return self.sub_codes.setdefault(sub_category, len(self.sub_codes))
+
+    def upsert(
+        self, key: str, lat: float, lng: float, radius_km: float, price: float, side: int, market: int, sub_category: Optional[str]
+    ) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[key] = row
+            self.keys.append(key)
+        lat_r, lng_r = math.radians(lat), math.radians(lng)
+        self.xyz[row] = (math.cos(lat_r) * math.cos(lng_r), math.cos(lat_r) * math.sin(lng_r), math.sin(lat_r))
+        self.radius_km[row] = radius_km
+        self.cos_reach[row] = math.cos(min(radius_km / EARTH_RADIUS_KM, math.pi))
+        self.price[row] = price
+        self.side[row] = side
+        self.market[row] = market
+        self.sub[row] = self.sub_code(sub_category)
+        self.alive[row] = True
+
+    def remove(self, key: str) -> None:
+        row = self.rows.get(key)
+        if row is not None:
+            # Rows are tombstoned; a re-upsert of the same key revives the slot
+            self.alive[row] = False
+
+    def score(
+        self,
+        xyz: np.ndarray,
+        cos_reach: np.ndarray,
+        radius_km: np.ndarray,
+        price: np.ndarray,
+        side: np.ndarray,
+        market: np.ndarray,
+        sub: np.ndarray,
+        start: int,
+        stop: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score a batch of B query quests against rows [start, stop).
+        Returns the eligible pairs only, as flat arrays:
+        (query index, row index, score, distance_km).
+        """
+        # dot >= cos(reach / R)  <=>  great-circle distance <= reach, and
+        # cos(min(r1, r2)) == max(cos(r1), cos(r2)); no trig on the B x N matrix
+        dot = xyz @ self.xyz[start:stop].T
+        c_side = self.side[start:stop]
+        eligible = (
+            (dot >= np.maximum(cos_reach[:, None], self.cos_reach[start:stop][None, :]))
+            & self.alive[start:stop][None, :]
+            & (c_side[None, :] != side[:, None])
+            & (self.market[start:stop][None, :] == market[:, None])
+        )
+        qi, ci = np.nonzero(eligible)
+        rows = ci + start
+        dist = EARTH_RADIUS_KM * np.arccos(np.clip(dot[qi, ci], -1.0, 1.0))
+        reach = np.minimum(radius_km[qi], self.radius_km[rows])
+
+        # Budget comes from the "want" side, asking price from the "have" side
+        q_wants = side[qi] == WANT
+        budget = np.where(q_wants, price[qi], self.price[rows])
+        asking = np.where(q_wants, self.price[rows], price[qi])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist_score = np.where(reach > 0, 1.0 - dist / reach, 1.0)
+        scores = (
+            DISTANCE_WEIGHT * dist_score
+            + PRICE_WEIGHT * price_scores(budget, asking)
+            + SUB_CATEGORY_WEIGHT * (self.sub[rows] == sub[qi])
+        )
+        return qi, rows, scores, dist
+
+class MatchEngine:
+    """Per-category column stores plus batched top-k matching."""
+
+    def __init__(self):
+        self.tables: Dict[str, CategoryTable] = {}
+        self.categories: Dict[str, str] = {}  # quest key -> general_category
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    def upsert(self, key: str, record: Dict[str, Any]) -> None:
+        """Index a quest row; quests outside MATCH_CATEGORIES or without coordinates or a side are dropped."""
+        category = record.get("general_category")
+        side, market = _side(record.get("want_or_have"))
+        lat, lng = record.get("lat"), record.get("lng")
+        with self.lock:
+            self._remove_locked(key)
+            if category not in MATCH_CATEGORIES or side == UNKNOWN or lat is None or lng is None:
+                return
+            radius = _float(record.get("distance"))
+            radius_km = to_km(radius, record.get("distance_unit")) if not math.isnan(radius) else DEFAULT_RADIUS_KM
+            price = _float(record.get(PRICE_FIELDS[category]))
+            table = self.tables.setdefault(category, CategoryTable())
+            table.upsert(key, float(lat), float(lng), radius_km, price, side, market, record.get("sub_category"))
+            self.categories[key] = category
+
+    def remove(self, key: str) -> None:
+        with self.lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: str) -> None:
+        category = self.categories.pop(key, None)
+        if category is not None:
+            self.tables[category].remove(key)
+
+    def match_batch(self, keys: List[str], k: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k matches for each indexed quest in `keys`, grouped by category and scored in batches."""
+        results: Dict[str, List[Dict[str, Any]]] = {key: [] for key in keys}
+        by_category: Dict[str, List[str]] = {}
+        with self.lock:
+            for key in keys:
+                category = self.categories.get(key)
+                if category is not None:
+                    by_category.setdefault(category, []).append(key)
+            for category, cat_keys in by_category.items():
+                table = self.tables[category]
+                rows = np.array([table.rows[key] for key in cat_keys])
+                for b in range(0, len(rows), MATCH_BATCH):
+                    chunk_rows = rows[b:b + MATCH_BATCH]
+                    for key, matches in zip(cat_keys[b:b + MATCH_BATCH], self._top_k(table, chunk_rows, k)):
+                        results[key] = matches
+        return results
+
+    def match(self, key: str, k: int = 20) -> List[Dict[str, Any]]:
+        return self.match_batch([key], k)[key]
+
+    def _top_k(self, table: CategoryTable, rows: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        query = (
+            table.xyz[rows], table.cos_reach[rows], table.radius_km[rows],
+            table.price[rows], table.side[rows], table.market[rows], table.sub[rows]
+        )
+        parts = []
+        step = max(1, MATCH_CHUNK // max(len(rows), 1))
+        for start in range(0, table.size, step):
+            parts.append(table.score(*query, start, min(start + step, table.size)))
+        qi = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, dtype=np.int64)
+        cand_rows = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, dtype=np.int64)
+        scores = np.concatenate([p[2] for p in parts]) if parts else np.zeros(0)
+        dist = np.concatenate([p[3] for p in parts]) if parts else np.zeros(0)
+
+        # Sort by query, then best score first, and keep the first k of each query
+        order = np.lexsort((-scores, qi))
+        results: List[List[Dict[str, Any]]] = [[] for _ in range(len(rows))]
+        for j in order:
+            matches = results[qi[j]]
+            if len(matches) < k:
+                matches.append({
+                    "key": table.keys[cand_rows[j]],
+                    "score": round(float(scores[j]), 4),
+                    "distance_km": round(float(dist[j]), 3),
+                })
+        return results
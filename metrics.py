@@ -0,0 +1,67 @@
+import os
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+# === PROCESS METRICS ===
+# Minimal in-process counters and latency samples, exposed as JSON on /metrics.
+# Names are dotted paths, e.g. "llm_cache.hit.memory" or "llm.latency_ms.classify".
+
+METRICS_SAMPLES = int(os.getenv("METRICS_SAMPLES", "2048"))
+
+_lock = threading.Lock()
+COUNTERS: Dict[str, float] = {}
+# Point-in-time values (queue depths, breaker state, ...)
+GAUGES: Dict[str, float] = {}
+# Latency name -> most recent samples (ms); percentiles are over this window
+LATENCIES: Dict[str, deque] = {}
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        GAUGES[name] = value
+
+def observe(name: str, ms: float) -> None:
+    with _lock:
+        samples = LATENCIES.get(name)
+        if samples is None:
+            samples = LATENCIES[name] = deque(maxlen=METRICS_SAMPLES)
+        samples.append(ms)
+
+def sample_count(name: str) -> int:
+    with _lock:
+        return len(LATENCIES.get(name, ()))
+
+def percentile(name: str, q: float) -> Optional[float]:
+    """q-th percentile (0-100) of the recent samples for `name`, or None without samples."""
+    with _lock:
+        samples = sorted(LATENCIES.get(name, ()))
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+def ratio(numerator: str, denominator: str) -> Optional[float]:
+    with _lock:
+        total = COUNTERS.get(denominator, 0)
+        return round(COUNTERS.get(numerator, 0) / total, 4) if total else None
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        counters = dict(COUNTERS)
+        gauges = dict(GAUGES)
+        windows = {name: sorted(samples) for name, samples in LATENCIES.items()}
+    latencies = {}
+    for name, samples in windows.items():
+        if samples:
+            n = len(samples)
+            latencies[name] = {
+                "count": n,
+                "p50": round(samples[n // 2], 2),
+                "p95": round(samples[min(n - 1, int(n * 0.95))], 2),
+                "p99": round(samples[min(n - 1, int(n * 0.99))], 2),
+                "max": round(samples[-1], 2),
+            }
+    return {"counters": counters, "gauges": gauges, "latency_ms": latencies}
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import metrics
+import serialization
+from vertex_client import get_vertex_chat_response_async, CHAT_MODEL_ID
+from quest_prompts import CHARS_PER_TOKEN
+
+# === MODEL TIERING ===
+# Each pipeline stage runs on the cheapest model that handles it; the pro model
+# is reserved for turns that need it. A cheap-tier answer that doesn't parse or
+# fails the call site's check is retried once on the top tier (escalation).
+
+MODEL_TIERS: Dict[str, str] = {
+    "flash": os.getenv("VERTEX_FLASH_MODEL_ID", "gemini-2.5-flash"),
+    "pro": CHAT_MODEL_ID,
+}
+TOP_TIER = "pro"
+
+# Stage -> tier, and per-category overrides of it
+STAGE_TIERS: Dict[str, str] = {
+    "classify": "flash",
+    "confirm_location": "flash",
+    "quest_turn": "flash",
+    "quest_extract": "flash",
+}
+# e.g. MODEL_ROUTES='{"jobs": {"quest_turn": "pro"}}'
+CATEGORY_STAGE_TIERS: Dict[str, Dict[str, str]] = json.loads(os.getenv("MODEL_ROUTES", "{}"))
+
+# Conversation turns move to the top tier when the user writes a lot or the
+# conversation has dragged on (the cheap model is likely struggling)
+ROUTER_PRO_MIN_WORDS = int(os.getenv("ROUTER_PRO_MIN_WORDS", "60"))
+ROUTER_PRO_MIN_HISTORY = int(os.getenv("ROUTER_PRO_MIN_HISTORY", "16"))
+
+# USD per 1M tokens (input, output); override to match your billing
+MODEL_PRICES: Dict[str, tuple] = {
+    "flash": (float(os.getenv("FLASH_PRICE_IN", "0.30")), float(os.getenv("FLASH_PRICE_OUT", "2.50"))),
+    "pro": (float(os.getenv("PRO_PRICE_IN", "1.25")), float(os.getenv("PRO_PRICE_OUT", "10.0"))),
+}
+
+def route(stage: str, category: Optional[str] = None, complex_turn: bool = False) -> str:
+    """Tier for a stage, after per-category overrides; complex turns always get the top tier."""
+    if complex_turn:
+        return TOP_TIER
+    tier = CATEGORY_STAGE_TIERS.get(category or "", {}).get(stage) or STAGE_TIERS.get(stage, TOP_TIER)
+    return tier if tier in MODEL_TIERS else TOP_TIER
+
+def is_complex_turn(message: str, chat_history: List[Dict[str, str]]) -> bool:
+    return len(message.split()) >= ROUTER_PRO_MIN_WORDS or len(chat_history) >= ROUTER_PRO_MIN_HISTORY
+
+def estimate_cost(tier: str, messages: List[Dict[str, str]], response: str) -> float:
+    """Rough USD cost from character counts (the SDK's token usage isn't threaded through)."""
+    price_in, price_out = MODEL_PRICES.get(tier, MODEL_PRICES[TOP_TIER])
+    tokens_in = sum(len(m["content"]) for m in messages) / CHARS_PER_TOKEN
+    tokens_out = len(response) / CHARS_PER_TOKEN
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+def _acceptable(text: str, validate: Optional[Callable[[Dict[str, Any]], bool]]) -> bool:
+    try:
+        parsed = serialization.loads(text)
+    except (serialization.JSONDecodeError, TypeError):
+        return False
+    if not isinstance(parsed, dict):
+        return False
+    return validate(parsed) if validate else True
+
+async def routed_chat_response(
+    stage: str,
+    messages: List[Dict[str, str]],
+    category: Optional[str] = None,
+    complex_turn: bool = False,
+    validate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    **kwargs
+) -> str:
+    """
+    Run a Gemini call for `stage` on the routed tier, escalating to the top tier
+    when the answer is unparseable or `validate(parsed)` rejects it.
+    """
+    tier = route(stage, category, complex_turn)
+    text, cost = await _timed_call(stage, tier, messages, **kwargs)
+    if tier != TOP_TIER and not _acceptable(text, validate):
+        metrics.incr(f"router.escalations.{stage}")
+        logging.info(f"[routed_chat_response] {stage}: {tier} answer rejected, escalating to {TOP_TIER}")
+        text, escalated_cost = await _timed_call(stage, TOP_TIER, messages, **kwargs)
+        cost += escalated_cost
+    # Against sending everything to the top tier; negative when escalation didn't pay off
+    metrics.incr("router.est_savings_usd", estimate_cost(TOP_TIER, messages, text) - cost)
+    return text
+
+async def _timed_call(stage: str, tier: str, messages: List[Dict[str, str]], **kwargs) -> Tuple[str, float]:
+    start = time.perf_counter()
+    text = await get_vertex_chat_response_async(messages, model_id=MODEL_TIERS[tier], call_site=stage, **kwargs)
+    metrics.observe(f"router.latency_ms.{stage}.{tier}", (time.perf_counter() - start) * 1000)
+    cost = estimate_cost(tier, messages, text)
+    metrics.incr(f"router.calls.{stage}.{tier}")
+    metrics.incr(f"router.est_cost_usd.{tier}", cost)
+    return text, cost
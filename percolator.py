@@ -0,0 +1,267 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+import requests
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+from geo_index import KM_PER_DEGREE_LAT, haversine_km, to_km
+from match_engine import MATCH_CATEGORIES, PRICE_FIELDS, DEFAULT_RADIUS_KM, quest_market, quest_side
+from slot_extractor import PRICE_FIELD
+from text_index import tokenize, quest_terms
+
+# === SAVED-SEARCH PERCOLATOR ===
+# The reverse of a search: standing subscriptions (open "want" quests and saved
+# searches) are indexed by (general_category, sub_category) -> geo cell ->
+# price band, and each newly saved quest looks up only the buckets it can
+# fall into. Candidates are then checked exactly (distance, price, keywords)
+# and matches are queued for delivery.
+
+PERCOLATE_CELL_DEGREES = float(os.getenv("PERCOLATE_CELL_DEGREES", "0.25"))
+# Subscriptions covering more cells than this are indexed as "anywhere"
+PERCOLATE_MAX_CELLS = int(os.getenv("PERCOLATE_MAX_CELLS", "400"))
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "1024"))
+NOTIFY_INBOX_SIZE = int(os.getenv("NOTIFY_INBOX_SIZE", "100"))
+# Optional HTTP endpoint that receives each notification as JSON
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL")
+
+ANYWHERE = None
+ANY_PRICE = None
+
+def price_band(price: Optional[float]) -> Optional[int]:
+    """Power-of-two price band; a quest priced p can only satisfy subscriptions in bands >= band(p)."""
+    if price is None or (isinstance(price, float) and math.isnan(price)):
+        return ANY_PRICE
+    return int(math.floor(math.log2(max(float(price), 0.0) + 1.0)))
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def quest_subscription(key: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """An open "want" quest subscribes to "have" quests of the same kind and market nearby and within budget."""
+    if quest_side(record.get("want_or_have")) != "want" or record.get("general_category") not in MATCH_CATEGORIES:
+        return None
+    distance = _float(record.get("distance"))
+    return {
+        "id": f"quest:{key}",
+        "owner": record.get("quest_id") or key,
+        "quest_key": key,
+        "general_category": record["general_category"],
+        "sub_category": record.get("sub_category"),
+        "lat": _float(record.get("lat")),
+        "lng": _float(record.get("lng")),
+        "radius_km": to_km(distance, record.get("distance_unit")) if distance is not None else DEFAULT_RADIUS_KM,
+        "max_price": _float(record.get(PRICE_FIELDS[record["general_category"]])),
+        "terms": (),
+        "want_or_have": "have",
+        "market": quest_market(record.get("want_or_have")),
+    }
+
+def saved_search_subscription(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Subscription for a row of the `saved_searches` table."""
+    radius = _float(row.get("radius"))
+    return {
+        "id": f"search:{row['id']}",
+        "owner": row.get("session_id"),
+        "saved_search_id": row["id"],
+        "general_category": row.get("general_category"),
+        "sub_category": row.get("sub_category"),
+        "lat": _float(row.get("lat")),
+        "lng": _float(row.get("lng")),
+        "radius_km": to_km(radius, row.get("unit")) if radius is not None else None,
+        "max_price": _float(row.get("max_price")),
+        "terms": tuple(sorted(set(tokenize(row.get("query") or "")))),
+        "want_or_have": row.get("want_or_have"),
+    }
+
+Placement = Tuple[Tuple[Optional[str], Optional[str]], Optional[Tuple[int, int]], Optional[int]]
+
+class Percolator:
+    """Reverse index of subscriptions; `percolate` returns the ones a quest satisfies."""
+
+    def __init__(self, cell_degrees: float = PERCOLATE_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.subscriptions: Dict[str, Dict[str, Any]] = {}
+        # (general_category, sub_category) -> cell -> price band -> {subscription id}
+        self.index: Dict[Tuple[Optional[str], Optional[str]], Dict[Any, Dict[Any, set]]] = {}
+        self.placements: Dict[str, List[Placement]] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def _cells(self, sub: Dict[str, Any]) -> List[Any]:
+        if sub["lat"] is None or sub["lng"] is None or sub["radius_km"] is None:
+            return [ANYWHERE]
+        dlat = sub["radius_km"] / KM_PER_DEGREE_LAT
+        lat_edge = min(abs(sub["lat"]) + dlat, 89.9)
+        dlng = min(sub["radius_km"] / (KM_PER_DEGREE_LAT * math.cos(math.radians(lat_edge))), 180.0)
+        min_x, min_y = self._cell(sub["lat"] - dlat, sub["lng"] - dlng)
+        max_x, max_y = self._cell(sub["lat"] + dlat, sub["lng"] + dlng)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > PERCOLATE_MAX_CELLS:
+            return [ANYWHERE]
+        return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    def upsert(self, sub: Dict[str, Any]) -> None:
+        category = (sub.get("general_category"), sub.get("sub_category"))
+        band = price_band(sub.get("max_price"))
+        placements = [(category, cell, band) for cell in self._cells(sub)]
+        with self.lock:
+            self._remove_locked(sub["id"])
+            self.subscriptions[sub["id"]] = sub
+            self.placements[sub["id"]] = placements
+            for category, cell, band in placements:
+                self.index.setdefault(category, {}).setdefault(cell, {}).setdefault(band, set()).add(sub["id"])
+
+    def remove(self, sub_id: str) -> None:
+        with self.lock:
+            self._remove_locked(sub_id)
+
+    def _remove_locked(self, sub_id: str) -> None:
+        self.subscriptions.pop(sub_id, None)
+        for category, cell, band in self.placements.pop(sub_id, ()):
+            cells = self.index[category]
+            bands = cells[cell]
+            bands[band].discard(sub_id)
+            if not bands[band]:
+                del bands[band]
+            if not bands:
+                del cells[cell]
+            if not cells:
+                del self.index[category]
+
+    def candidates(self, record: Dict[str, Any]) -> set:
+        """Subscription ids whose buckets the quest falls into (before exact checks)."""
+        gc, sc = record.get("general_category"), record.get("sub_category")
+        lat, lng = _float(record.get("lat")), _float(record.get("lng"))
+        band = price_band(_float(record.get(PRICE_FIELD.get(gc, "price"))))
+        cells = [ANYWHERE] if lat is None or lng is None else [self._cell(lat, lng), ANYWHERE]
+        found: set = set()
+        for category in {(gc, sc), (gc, None), (None, sc), (None, None)}:
+            by_cell = self.index.get(category)
+            if not by_cell:
+                continue
+            for cell in cells:
+                for sub_band, ids in by_cell.get(cell, {}).items():
+                    if band is ANY_PRICE or sub_band is ANY_PRICE or sub_band >= band:
+                        found |= ids
+        return found
+
+    def percolate(self, key: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Subscriptions satisfied by a new quest; cost scales with the candidate set, not all subscriptions."""
+        with self.lock:
+            subs = [self.subscriptions[sub_id] for sub_id in self.candidates(record)]
+        if not subs:
+            return []
+        lat, lng = _float(record.get("lat")), _float(record.get("lng"))
+        # Saved searches cover every category, not just the matched ones
+        price = _float(record.get(PRICE_FIELD.get(record.get("general_category"), "price")))
+        side = quest_side(record.get("want_or_have"))
+        market = quest_market(record.get("want_or_have"))
+        gc, sc = record.get("general_category"), record.get("sub_category")
+        owner = record.get("quest_id") or key
+        terms = None
+        matched = []
+        for sub in subs:
+            if sub["owner"] == owner or sub.get("quest_key") == key:
+                continue
+            if sub["want_or_have"] and sub["want_or_have"] != side:
+                continue
+            # Saved searches have no market; a "rent" quest only hears about rent-outs
+            if sub.get("market") is not None and sub["market"] != market:
+                continue
+            if (sub["general_category"] and sub["general_category"] != gc) or (sub["sub_category"] and sub["sub_category"] != sc):
+                continue
+            if sub["max_price"] is not None and price is not None and price > sub["max_price"]:
+                continue
+            distance_km = None
+            if sub["lat"] is not None and sub["lng"] is not None and sub["radius_km"] is not None:
+                if lat is None or lng is None:
+                    continue
+                distance_km = haversine_km(sub["lat"], sub["lng"], lat, lng)
+                if distance_km > sub["radius_km"]:
+                    continue
+            if sub["terms"]:
+                terms = quest_terms(record) if terms is None else terms
+                if not terms.issuperset(sub["terms"]):
+                    continue
+            matched.append({**sub, "distance_km": round(distance_km, 3) if distance_km is not None else None})
+        return matched
+
+class Notifier:
+    """Bounded queue of match notifications, drained into per-owner inboxes (and an optional webhook)."""
+
+    def __init__(self, queue_size: int = NOTIFY_QUEUE_SIZE, inbox_size: int = NOTIFY_INBOX_SIZE):
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self.inbox_size = inbox_size
+        self.inboxes: Dict[str, deque] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"queued": 0, "delivered": 0, "dropped": 0, "webhook_failed": 0}
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.task = asyncio.create_task(self._worker())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def emit(self, sub: Dict[str, Any], quest_key: str, record: Dict[str, Any]) -> bool:
+        if self.queue is None or not sub.get("owner"):
+            return False
+        notification = {
+            "owner": sub["owner"],
+            "subscription_id": sub["id"],
+            "quest_key": quest_key,
+            "general_category": record.get("general_category"),
+            "sub_category": record.get("sub_category"),
+            "description": record.get("description"),
+            "distance_km": sub.get("distance_km"),
+            "created_at": time.time(),
+        }
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logging.warning(f"[Notifier] Queue full, dropping notification for {sub['owner']}")
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def drain_inbox(self, owner: str) -> List[Dict[str, Any]]:
+        inbox = self.inboxes.pop(owner, None)
+        return list(inbox) if inbox else []
+
+    async def _worker(self) -> None:
+        while True:
+            notification = await self.queue.get()
+            try:
+                self.inboxes.setdefault(notification["owner"], deque(maxlen=self.inbox_size)).append(notification)
+                if NOTIFY_WEBHOOK_URL:
+                    response = await asyncio.to_thread(requests.post, NOTIFY_WEBHOOK_URL, json=notification, timeout=5)
+                    if response.status_code >= 300:
+                        self.stats["webhook_failed"] += 1
+                        logging.error(f"[Notifier] Webhook error {response.status_code}: {response.text}")
+                self.stats["delivered"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["webhook_failed"] += 1
+                logging.error(f"[Notifier] Delivery failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "queue_depth": self.queue.qsize() if self.queue else 0, "inboxes": len(self.inboxes)}
@@ -0,0 +1,183 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from quest_prompts import CATEGORY_SPECS, DISTANCE_BUTTONS
+from quest_schema import compact_state
+
+# === CONVERSATION STATE MACHINE ===
+# Which question comes next is decided here, not by the LLM. Per category
+# (field lists from quest_prompts.CATEGORY_SPECS) a quest moves through
+#   collect -> confirm_location -> offer_photos -> ready
+# collect asks the first missing required field; confirm_location asks the
+# user to confirm general_location; offer_photos is offered once; ready asks
+# to post. The LLM only extracts field values from free text (see
+# quest_prompts.compile_extract_prompt); button answers never reach it.
+#
+# SERVER_QUEST_FLOW=false goes back to the LLM running the conversation.
+
+SERVER_QUEST_FLOW = os.getenv("SERVER_QUEST_FLOW", "true").lower() == "true"
+
+YES_NO_BUTTONS = ["Yes", "No"]
+
+# How to ask for a field: (text, ui, button label -> stored value). Fields
+# with button values are answered locally when the reply is one of them.
+FIELD_QUESTIONS: Dict[str, Tuple[str, Optional[dict], Optional[Dict[str, str]]]] = {
+    "description": ("Can you describe what you're offering or looking for?", None, None),
+    "general_location": ("What city and state are you in?", None, None),
+    "distance": (
+        "How far are you willing to travel?",
+        {"trigger": "distance_select", "buttons": DISTANCE_BUTTONS},
+        None
+    ),
+    "property_type": ("What type of property are you interested in?", None, None),
+    "budget": ("What's your budget?", None, None),
+    "move_in_date": ("When would you like to move in?", None, None),
+    "job_role": ("What job role are you interested in?", None, None),
+    "employment_type": (
+        "Are you looking for full-time or part-time?",
+        {"trigger": "employment_type_select", "buttons": ["Full-time", "Part-time"]},
+        {"Full-time": "full-time", "Part-time": "part-time"}
+    ),
+    "industry": ("Which industry are you interested in?", None, None),
+    "experience_level": ("What's your experience level?", None, None),
+    "work_location": (
+        "Do you prefer remote or on-site work?",
+        {"trigger": "work_location_select", "buttons": ["Remote", "On-site", "Hybrid"]},
+        {"Remote": "remote", "On-site": "on-site", "Hybrid": "hybrid"}
+    ),
+    "service_type": ("What type of service is this?", None, None),
+    "timeframe": ("What timeframe do you have in mind?", None, None),
+    "activity": ("What's the activity?", None, None),
+    "date_time": ("When is it happening?", None, None),
+    "meetup_location": ("Where will you meet up?", None, None),
+    "group_size": ("How many people are you expecting?", None, None),
+    "gig_type": ("What type of gig is this?", None, None),
+    "duration": ("How long is the gig, or which dates?", None, None),
+    "pay_rate": ("What's the pay rate or budget?", None, None),
+}
+# want_or_have means something different per category
+CATEGORY_FIELD_QUESTIONS: Dict[Tuple[str, str], Tuple[str, Optional[dict], Optional[Dict[str, str]]]] = {
+    ("for_sale", "want_or_have"): (
+        "Are you offering something or looking for something?",
+        {"trigger": "want_or_have_select", "buttons": ["Offering", "Looking"]},
+        {"Offering": "have", "Looking": "want"}
+    ),
+    ("housing", "want_or_have"): (
+        "Are you looking to rent, buy or sublet, or offering a place to rent out or sell?",
+        {"trigger": "rent_or_buy_select", "buttons": ["Rent", "Buy", "Sublet", "Rent out", "Sell"]},
+        {"Rent": "rent", "Buy": "buy", "Sublet": "sublet", "Rent out": "rent out", "Sell": "sell"}
+    ),
+}
+
+def _spec_actions(category: str) -> Dict[str, str]:
+    return {field: action for field, _, action in CATEGORY_SPECS[category]["fields"] if action}
+
+def required_fields(category: str) -> List[str]:
+    """Fields that must be set before the location is confirmed, in the order they're asked."""
+    spec = CATEGORY_SPECS[category]
+    optional = set(spec.get("optional", ()))
+    fields = [field for field, _, _ in spec["fields"] if field not in optional]
+    fields.append("general_location")
+    if spec["distance"]:
+        fields.append("distance")
+    return fields
+
+REQUIRED_FIELDS: Dict[str, List[str]] = {category: required_fields(category) for category in CATEGORY_SPECS}
+
+def field_question(category: str, field: str) -> Tuple[str, str, Optional[dict], Optional[Dict[str, str]]]:
+    """(action, text, ui, button values) for asking `field`."""
+    text, ui, values = CATEGORY_FIELD_QUESTIONS.get((category, field)) or FIELD_QUESTIONS.get(
+        field, (f"What's the {field.replace('_', ' ')}?", None, None)
+    )
+    if field == "general_location":
+        action = "validate_location"
+    elif field == "distance":
+        action = "ask_for_distance"
+    else:
+        action = _spec_actions(category).get(field) or f"ask_for_{field}"
+    return action, text, ui, values
+
+def field_for_action(category: Optional[str], action: Optional[str]) -> Optional[str]:
+    """The field an ask_for_* action asked about."""
+    if category not in CATEGORY_SPECS or not action:
+        return None
+    for field in REQUIRED_FIELDS[category]:
+        if field_question(category, field)[0] == action:
+            return field
+    return None
+
+def is_missing(value: Any) -> bool:
+    return value is None or value == "" or value == []
+
+def missing_fields(state: Dict[str, Any], category: str) -> List[str]:
+    return [field for field in REQUIRED_FIELDS[category] if is_missing(state.get(field))]
+
+def is_ready(state: Dict[str, Any], category: str) -> bool:
+    return (
+        not missing_fields(state, category)
+        and bool(state.get("location_confirmed"))
+        and state.get("lat") is not None and state.get("lng") is not None
+        and bool(state.get("photos") or state.get("photos_offered"))
+    )
+
+def response(state: Dict[str, Any], action: str, text: str, ui: Optional[dict] = None) -> Dict[str, Any]:
+    result = {k: v for k, v in state.items() if k != "ui"}
+    result["action"] = action
+    result["text"] = text
+    if ui:
+        result["ui"] = ui
+    return result
+
+def ready(state: Dict[str, Any]) -> Dict[str, Any]:
+    return response(
+        state,
+        "ready",
+        "Your quest is ready. Would you like to post it?",
+        {"trigger": "post_quest", "buttons": YES_NO_BUTTONS}
+    )
+
+def next_step(state: Dict[str, Any], general_category: Optional[str], extracted: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    The next question for `state`: the full state with action, text and ui set.
+    Returns None when only the LLM can move on: unknown category, or a confirmed
+    location without coordinates before this turn's extraction has run
+    (`extracted=False`). After extraction a location that still can't be
+    placed is asked for again.
+    """
+    if general_category not in CATEGORY_SPECS:
+        return None
+    for field in missing_fields(state, general_category):
+        action, text, ui, _ = field_question(general_category, field)
+        return response(state, action, text, ui)
+    if not state.get("location_confirmed"):
+        return response(
+            state,
+            "validate_location",
+            f"Is your location {state['general_location']}?",
+            {"trigger": "location_confirm", "buttons": YES_NO_BUTTONS}
+        )
+    if state.get("lat") is None or state.get("lng") is None:
+        if not extracted:
+            # Coordinates come from the extraction turn
+            return None
+        state = {**state, "general_location": None, "location_confirmed": False}
+        return response(state, "validate_location", "I couldn't place that location. Which city and state should I use?")
+    if not (state.get("photos") or state.get("photos_offered")):
+        return response(
+            {**state, "photos_offered": True},
+            "offer_photos",
+            "Would you like to add photos to your quest?",
+            {"trigger": "yes_no", "buttons": YES_NO_BUTTONS}
+        )
+    return ready(state)
+
+def apply_extracted(state: Dict[str, Any], extracted: Dict[str, Any], general_category: str) -> Dict[str, Any]:
+    """Merge values the LLM extracted into `state`; a new location has to be confirmed again."""
+    values = {k: v for k, v in extracted.items() if not is_missing(v) and k not in ("action", "text", "ui")}
+    merged = {**state, **values}
+    new_location = values.get("general_location")
+    if new_location and new_location != state.get("general_location"):
+        merged["location_confirmed"] = False
+        merged["lat"] = values.get("lat")
+        merged["lng"] = values.get("lng")
+    # Drops fields the category doesn't have and values that don't validate
+    return compact_state(merged, general_category)
@@ -0,0 +1,169 @@
+import os
+import logging
+from typing import Dict, Any, Iterator, List, Optional
+import serialization
+from geo_index import GeoIndex
+from supabase_client import supabase_request
+from match_engine import MatchEngine
+from semantic_index import SemanticIndex, SEMANTIC_INDEX_PATH
+from text_index import TextIndex
+from percolator import Percolator, Notifier, quest_subscription, saved_search_subscription
+
+# === IN-PROCESS QUEST INDEXES ===
+# Read paths (nearby, matches, search) are served from memory. The indexes are
+# loaded from Supabase at startup and updated incrementally whenever
+# create_quest/update_quest write a quest. They live in one process: each
+# worker would hold its own copy that only sees its own writes, so the app
+# runs a single worker (see gunicorn.conf.py). The semantic index file is
+# opened in that worker (open_quest_indexes), never at import, so a
+# preloading master doesn't hold a stale mapping that later workers inherit.
+
+SUPABASE_API = os.getenv("SUPABASE_API")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+QUEST_INDEX_PAGE = int(os.getenv("QUEST_INDEX_PAGE", "1000"))
+# Extra PostgREST filter for "active" quests, e.g. "status=eq.active"
+QUEST_ACTIVE_FILTER = os.getenv("QUEST_ACTIVE_FILTER", "")
+
+geo_index = GeoIndex(float(os.getenv("GEO_CELL_DEGREES", "0.02")))
+match_engine = MatchEngine()
+semantic_index = SemanticIndex(path=None)
+text_index = TextIndex()
+# Standing subscriptions (open "want" quests, saved searches) and their delivery queue
+percolator = Percolator()
+notifier = Notifier()
+
+# Text fields that describe what a quest is about, across all categories
+QUEST_TEXT_FIELDS = [
+    "title", "description", "sub_category", "condition", "property_type", "job_role",
+    "industry", "service_type", "qualifications", "activity", "gig_type",
+]
+# How much description similarity counts when ranking matches
+SEMANTIC_MATCH_WEIGHT = float(os.getenv("SEMANTIC_MATCH_WEIGHT", "0.3"))
+
+# quest key -> quest row as stored in Supabase
+QUEST_RECORDS: Dict[str, Dict[str, Any]] = {}
+
+def quest_key(row: Dict[str, Any]) -> Optional[str]:
+    key = row.get("id") or row.get("quest_id")
+    return str(key) if key is not None else None
+
+def quest_text(record: Dict[str, Any]) -> str:
+    return " ".join(str(record[field]) for field in QUEST_TEXT_FIELDS if record.get(field))
+
+def index_quest(row: Dict[str, Any]) -> None:
+    """Add or refresh one quest row in every index."""
+    key = quest_key(row)
+    if key is None:
+        return
+    record = {**QUEST_RECORDS.get(key, {}), **row}
+    record.pop("photo_renditions", None)
+    QUEST_RECORDS[key] = record
+    if record.get("lat") is not None and record.get("lng") is not None:
+        geo_index.upsert(key, float(record["lat"]), float(record["lng"]), record.get("general_category"), record.get("sub_category"))
+    else:
+        geo_index.remove(key)
+    match_engine.upsert(key, record)
+    semantic_index.upsert(key, quest_text(record))
+    text_index.upsert(key, record)
+    subscription = quest_subscription(key, record)
+    if subscription:
+        percolator.upsert(subscription)
+    else:
+        percolator.remove(f"quest:{key}")
+
+def remove_quest(key: str) -> None:
+    QUEST_RECORDS.pop(key, None)
+    geo_index.remove(key)
+    match_engine.remove(key)
+    semantic_index.remove(key)
+    text_index.remove(key)
+    percolator.remove(f"quest:{key}")
+
+def percolate_quest(row: Dict[str, Any]) -> int:
+    """Queue notifications for every subscription a newly saved quest satisfies."""
+    key = quest_key(row)
+    if key is None:
+        return 0
+    record = QUEST_RECORDS.get(key, row)
+    matches = percolator.percolate(key, record)
+    for subscription in matches:
+        notifier.emit(subscription, key, record)
+    if matches:
+        logging.info(f"[percolate_quest] Quest {key} matched {len(matches)} subscriptions")
+    return len(matches)
+
+def match_quest(key: str, k: int = 20) -> List[Dict[str, Any]]:
+    """
+    Top-k want/have matches for a quest: the match engine proposes compatible
+    quests, which are re-ranked with description similarity.
+    """
+    matches = match_engine.match(key, k * 4)
+    if not matches:
+        return []
+    similarities = semantic_index.similarity(key, [m["key"] for m in matches])
+    for m in matches:
+        m["semantic"] = round(max(similarities[m["key"]], 0.0), 4)
+        m["score"] = round((1 - SEMANTIC_MATCH_WEIGHT) * m["score"] + SEMANTIC_MATCH_WEIGHT * m["semantic"], 4)
+    matches.sort(key=lambda m: m["score"], reverse=True)
+    return matches[:k]
+
+def fetch_rows(table: str, extra_filter: str = "") -> Iterator[Dict[str, Any]]:
+    """Page through a Supabase table."""
+    offset = 0
+    while True:
+        path = f"{table}?select=*&order=id&limit={QUEST_INDEX_PAGE}&offset={offset}"
+        if extra_filter:
+            path += f"&{extra_filter}"
+        # Paging a big table is slow; give each page more time than a normal call
+        response = supabase_request("GET", path, timeout=60)
+        if response.status_code != 200:
+            raise RuntimeError(f"Supabase error {response.status_code}: {response.text}")
+        rows = serialization.loads(response.content)
+        yield from rows
+        if len(rows) < QUEST_INDEX_PAGE:
+            return
+        offset += QUEST_INDEX_PAGE
+
+def fetch_active_quests() -> Iterator[Dict[str, Any]]:
+    return fetch_rows("quests", QUEST_ACTIVE_FILTER)
+
+def open_quest_indexes() -> None:
+    """Attach the on-disk semantic index in this process; call once per worker, before loading."""
+    semantic_index.open(SEMANTIC_INDEX_PATH)
+
+def load_quest_indexes() -> int:
+    """Load all active quests into the in-memory indexes. Blocking; run it off the event loop."""
+    if not SUPABASE_API or not SUPABASE_KEY:
+        logging.info("[load_quest_indexes] Supabase not configured; starting with empty indexes")
+        return 0
+    count = 0
+    try:
+        for row in fetch_active_quests():
+            index_quest(row)
+            count += 1
+    except Exception as e:
+        logging.error(f"[load_quest_indexes] Failed after {count} quests: {e}")
+    else:
+        # Snapshots may still hold quests deleted while we were down
+        stale = text_index.retain(QUEST_RECORDS)
+        for key in [key for key in semantic_index.rows if key not in QUEST_RECORDS]:
+            semantic_index.remove(key)
+        if stale:
+            logging.info(f"[load_quest_indexes] Dropped {stale} stale quests from the snapshots")
+    save_quest_indexes()
+    try:
+        for row in fetch_rows("saved_searches"):
+            percolator.upsert(saved_search_subscription(row))
+    except Exception as e:
+        logging.error(f"[load_quest_indexes] Failed to load saved searches: {e}")
+    logging.info(f"[load_quest_indexes] Indexed {count} quests ({len(geo_index)} with coordinates), {len(percolator)} subscriptions")
+    return count
+
+def save_quest_indexes() -> None:
+    """Persist the on-disk indexes so the next start only re-indexes changed quests."""
+    semantic_index.flush()
+    try:
+        text_index.save()
+    except Exception as e:
+        logging.error(f"[save_quest_indexes] Text index snapshot failed: {e}")
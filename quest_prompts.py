@@ -1,384 +1,218 @@
-# === PROMPT TEMPLATES ===
-FOR_SALE_PROMPT = """
-What the user wants or has (e.g., "offering a new car"--have)  
-A short description  
-The general location (city, state) -- always collect and confirm with the user  
-Confirmation of the location from the user using the "validate_location" action and the geocode_location tool.  Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-- The distance (in km or miles) -- always collect. For 'have', this is how far the user is willing to travel to provide the service. For 'want', this is how far they are willing to travel to receive the service. provide some quick options like 5 mi, 10 mi, 20 mi, in ui.buttons.
-Price, if it is a tangible item (e.g., a car, bike, laptop, etc.) and the user has something to offer, ask the price they want. If they are looking or "want" the item, ask how much they'd be willing to pay. Use your best judgment based on the description and context. If unsure, do not ask for price.
-
-General Instructions  
-If the user's message includes what they are offering or seeking (e.g., "offering a new car in oakland,ca"), extract the description (e.g., "a new car") and use it for the description field.  
-Only ask for a description if you cannot infer it from the user's input.  
-If you are unsure, use a reasonable default like "a new car" or echo the item/quest mentioned by the user.  
-Do not ask for the description again if you already have one.  
-Always collect and confirm the user's location. Only ask for location confirmation if location_confirmed is not true.  
-Always collect distance if it is missing.  
-Only offer the photo upload once, after all required fields are present.  This should be a yes/no question.
-When all fields are present and confirmed, and the photo step is complete (either photos provided or skipped), set action: "ready".  
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.  
-Always include the latest values for all fields in the JSON.  
-Never ask for the same information twice unless the user says it was incorrect.  
-Confirmation of the location uses geocode_location tool but if there is any question prompt the user to post the location again.  
-When the action field is "ready", prompt the user to post the quest with UI Example: "ui": {
-  "trigger": "post_quest",
-  "buttons": ["Yes", "No"]
-}
-
-User Interface Hints (for frontend rendering)  
-When asking a question that can benefit from a UI element (e.g., yes/no buttons, location confirmation, or a short list of options like distance choices), include a `"ui"` field inside the JSON block. Do not include a `"ui"` field for actions that expect free text input.
-
-- `ui.trigger`: A string that indicates the frontend UI component to show (e.g., "yes_no", "location_confirm", "distance_select", "map_confirm").  
-- `ui.buttons`: Optional. A list of strings representing quick-reply buttons (e.g., ["Yes", "No"], ["5 mi", "10 mi", "20 mi"]).  
-- Do not use HTML. The frontend handles rendering based on the `ui` metadata.  
-- You must still include all the usual fields (like want_or_have, description, etc.) as part of the complete quest state.  
-- Only include the `"ui"` field when a visual component would enhance the user experience. If not needed, omit the `ui` field entirely.
-
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_price"
-"ask_for_condition"
-"ask_for_description"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "location_confirm",
-  "buttons": ["Yes", "No"]
-}
-
-Example output:
-{
-  "text": "Is your location San Francisco?",
-  "want_or_have": "have",
-  "description": "iPhone 12",
-  "price": null,
-  "condition": null,
-  "location": "San Francisco",
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "distance": 11,
-  "photos": [],
-  "action": "validate_location",
-  "ui": {
-    "trigger": "yes_no",
-    "buttons": ["Yes", "No"]
-  }
-}
-
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-"""
-HOUSING_PROMPT = """
-You are a 'housing' quest agent. Your job is to collect:
-- Rent/buy/sublet
-- Property type
-- Budget range
-- Move-in date
-- The general location (city, state) -- always collect and confirm with the user
-Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-- The distance (in km or miles) -- always collect. For 'have', this is how far the user is willing to travel to provide the service. For 'want', this is how far they are willing to travel to receive the service. provide some quick options like 5 mi, 10 mi, 20 mi, in ui.buttons.
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
+import hashlib
+from typing import Dict, List, Optional
+from quota_governor import CHARS_PER_TOKEN
 
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "distance_select",
-  "buttons": ["5 mi", "10 mi", "20 mi"]
-}
-
-Example output:
-{
-  "text": "How far are you willing to look?",
-  "want_or_have": "rent",
-  "property_type": null,
-  "budget": null,
-  "move_in_date": null,
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "distance":  2,
-  "action": "ask_for_distance",
-  "ui": {
-    "trigger": "distance_select",
-    "buttons": ["5 mi", "10 mi", "20 mi"]
-  }
-}
-
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_property_type"
-"ask_for_budget"
-"ask_for_move_in_date"
-"ask_for_rent_or_buy"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When all required information has been collected and confirmed, set action: "ready".
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.
-"""
-JOBS_PROMPT = """
-You are a 'jobs' quest agent. Your job is to collect:
-- Job role
-- Full-time or part-time
-- Desired industry
-- Experience level
-- Preferred work location (remote/on-site)
-- The general location (city, state) -- always collect and confirm with the user
-Confirmation of the location from the user using the "validate_location" action and the geocode_location tool.  Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-
-- The distance (in km or miles) -- always collect. For 'have', this is how far the user is willing to travel to provide the service. For 'want', this is how far they are willing to travel to receive the service. provide some quick options like 5 mi, 10 mi, 20 mi, in ui.buttons.- Resume upload if needed
-
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
-
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "yes_no",
-  "buttons": ["Yes", "No"]
-}
-
-Example output:
-{
-  "text": "Do you want to upload a resume?",
-  "job_role": null,
-  "employment_type": null,
-  "industry": null,
-  "experience_level": null,
-  "work_location": null,
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "distance": 2,
-  "resume_uploaded": false,
-  "action": "ask_for_resume",
-  "ui": {
-    "trigger": "yes_no",
-    "buttons": ["Yes", "No"]
-  }
-}
-
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_job_role"
-"ask_for_employment_type"
-"ask_for_industry"
-"ask_for_experience_level"
-"ask_for_work_location"
-"ask_for_resume"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When all required information has been collected and confirmed, set action: "ready".
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.
-"""
-SERVICES_PROMPT = """
-You are a 'services' quest agent. Your job is to collect:
-- Type of service needed (e.g., plumbing, tutoring)
-- Desired timeframe
-- Budget
-- Relevant qualifications or certifications
-- The general location (city, state) -- always collect and confirm with the user
-Confirmation of the location from the user using the "validate_location" action and the geocode_location tool.  Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-- The distance (in km or miles) -- always collect. For 'have', this is how far the user is willing to travel to provide the service. For 'want', this is how far they are willing to travel to receive the service. provide some quick options like 5 mi, 10 mi, 20 mi, in ui.buttons.
-
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
-
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "yes_no",
-  "buttons": ["Yes", "No"]
-}
-
-Example output:
-{
-  "text": "What type of service do you need?",
-  "service_type": null,
-  "timeframe": null,
-  "budget": null,
-  "qualifications": null,
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "distance": 2,
-  "action": "ask_for_service_type"
-}
-
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_service_type"
-"ask_for_timeframe"
-"ask_for_budget"
-"ask_for_qualifications"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When all required information has been collected and confirmed, set action: "ready".
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.
-"""
-COMMUNITY_PROMPT = """
-You are a 'community' quest agent. Your job is to collect:
-- Activity description
-- Date/time
-- Meetup location
-- Group size
-- Any costs (if applicable)
-- The general location (city, state) -- always collect and confirm with the user
-Confirmation of the location from the user using the "validate_location" action and the geocode_location tool.  Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
-
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "yes_no",
-  "buttons": ["Yes", "No"]
-}
-
-Example output:
-{
-  "text": "What is the activity description?",
-  "activity": null,
-  "date_time": null,
-  "meetup_location": null,
-  "group_size": null,
-  "cost": null,
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "action": "ask_for_activity"
+# === PROMPT TEMPLATES ===
+# Category prompts are compiled from shared fragments (location, distance,
+# UI hints, JSON output rules, ...) plus a per-category spec of the fields to
+# collect, so the boilerplate exists once and every prompt carries only what
+# its category needs. prompt_version() hashes the compiled text, so any
+# fragment edit shows up as a new version (and a new LLM cache key).
+# `python quest_prompts.py` prints the token report; test_prompt_budget.py
+# fails when a prompt grows past PROMPT_TOKEN_BUDGETS.
+
+DISTANCE_BUTTONS = ["5 mi", "10 mi", "20 mi"]
+
+FRAGMENTS: Dict[str, str] = {
+    "role": "You are a '{category}' quest agent. Collect these fields (JSON keys):",
+    "location": """\
+- general_location: city, state. Always collect it, then confirm it with action "validate_location" unless location_confirmed is true.
+- lat, lng: once the location is confirmed, geocode it. If that isn't possible, set them to null and ask for the location again.""",
+    "distance": """\
+- distance, distance_unit ("mi" or "km"): always collect. For 'have', how far the user will travel to provide it; for 'want', how far they will travel to get it. Offer ui.buttons {buttons}.""",
+    "conversation": """\
+Rules:
+- Take values from what the user already said; only ask for what is missing, never twice unless the user says it was wrong.""",
+    "photos": """\
+- When all fields are present and the location is confirmed, offer photo upload once as a yes/no question (action "offer_photos").""",
+    "ready": """\
+- When all is collected and photos are added or skipped, set action "ready" (never "complete") and ask to post it, "ui": {"trigger": "post_quest", "buttons": ["Yes", "No"]}.""",
+    "ui": """\
+- Add "ui" only for button answers (yes/no, location confirm, short option lists), not free text: {"trigger": "yes_no" | "location_confirm" | "distance_select" | "map_confirm", "buttons": [...]}. No HTML.""",
+    "actions": "- action must be one of: {actions}. Do not invent others.",
+    "extract_role": "Extract '{category}' quest fields from the user's message. Fields (JSON keys):",
+    "extract_location": """\
+- general_location: city, state
+- lat, lng: coordinates of general_location; give them whenever general_location is set and they are null""",
+    "extract_distance": '- distance (number), distance_unit ("mi" or "km")',
+    "extract_output": """\
+Use the current state and the last question to read short answers ("300" to a price question is the price). Reply with ONLY one JSON object holding just the fields the message gives a value for, e.g. {"price": 300}, or {} if none. Do not write a message to the user.""",
+    "json_output": """\
+Reply with ONLY one valid JSON object (no code fences, comments, trailing commas or other text) holding "text" (the message for the user), "action" and the latest value of every field (null if unknown), e.g.
+{example}""",
 }
 
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_activity"
-"ask_for_date_time"
-"ask_for_meetup_location"
-"ask_for_group_size"
-"ask_for_cost"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When all required information has been collected and confirmed, set action: "ready".
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.
-"""
-GIGS_PROMPT = """
-You are a 'gigs' quest agent. Your job is to collect:
-- Gig type (e.g., labor, creative)
-- Duration or dates required
-- Pay rate or budget
-- Location or remote flexibility
-- Portfolio or sample work
-- The general location (city, state) -- always collect and confirm with the user
-Confirmation of the location from the user using the "validate_location" action and the geocode_location tool.  Always collect and confirm the user's location (city, state). 
-When the location is confirmed, geocode it to latitude and longitude and include "lat" and "lng" as fields in the JSON output. If geocoding is not possible, set them to null and trigger the "geocode_location" action.
-
-After each user message, output ONLY a single valid JSON object. Do not include any markdown code fences (```), ###JSON### tags, explanations, or code. The JSON must:
-1. Be a single, complete JSON object
-2. Always include a "text" field with the message to show the user
-3. Include all current quest state fields
-4. Have no trailing commas
-5. Have no comments
-6. Have no extra text before or after the JSON
-
-When a UI element is needed (like yes/no, location confirm, distance select), always include a "ui" field in the JSON, e.g.:
-"ui": {
-  "trigger": "yes_no",
-  "buttons": ["Yes", "No"]
+# Per category: the fields to ask for as (field, description, action), which
+# of them are optional, whether distance is collected, and any category-only
+# rules (conversation prompt only). Field names must exist
+# in quest_schema.CATEGORY_FIELDS or the common fields.
+CATEGORY_SPECS: Dict[str, dict] = {
+    "for_sale": {
+        "fields": [
+            ("want_or_have", '"want" or "have" (e.g. "offering a new car" = have)', "ask_for_want_or_have"),
+            ("description", "short description of the item", "ask_for_description"),
+            ("price", "for tangible items only: asking price for 'have', most they'd pay for 'want'; skip if unsure", "ask_for_price"),
+            ("condition", "item condition, if relevant", "ask_for_condition"),
+        ],
+        "optional": ["price", "condition"],
+        "distance": True,
+        "rules": [
+            '- Infer description from the message ("offering a new car in oakland, ca" -> "a new car"); ask only if you can\'t.',
+        ],
+    },
+    "housing": {
+        "fields": [
+            ("want_or_have", '"rent", "buy", "sublet" (looking for a place) or "rent out", "sell" (offering one)', "ask_for_rent_or_buy"),
+            ("property_type", "property type", "ask_for_property_type"),
+            ("budget", "budget (number)", "ask_for_budget"),
+            ("move_in_date", "move-in date", "ask_for_move_in_date"),
+        ],
+        "distance": True,
+    },
+    "jobs": {
+        "fields": [
+            ("job_role", "job role", "ask_for_job_role"),
+            ("employment_type", "full-time or part-time", "ask_for_employment_type"),
+            ("industry", "desired industry", "ask_for_industry"),
+            ("experience_level", "experience level", "ask_for_experience_level"),
+            ("work_location", "remote, on-site or hybrid", "ask_for_work_location"),
+            ("resume_uploaded", "true once a resume is uploaded, if one is needed", "ask_for_resume"),
+        ],
+        "optional": ["resume_uploaded"],
+        "distance": True,
+    },
+    "services": {
+        "fields": [
+            ("service_type", "type of service (e.g. plumbing, tutoring)", "ask_for_service_type"),
+            ("timeframe", "desired timeframe", "ask_for_timeframe"),
+            ("budget", "budget (number)", "ask_for_budget"),
+            ("qualifications", "relevant qualifications or certifications", "ask_for_qualifications"),
+        ],
+        "optional": ["qualifications"],
+        "distance": True,
+    },
+    "community": {
+        "fields": [
+            ("activity", "activity description", "ask_for_activity"),
+            ("date_time", "date and time", "ask_for_date_time"),
+            ("meetup_location", "meetup spot", "ask_for_meetup_location"),
+            ("group_size", "group size (number)", "ask_for_group_size"),
+            ("cost", "cost per person, if any (number)", "ask_for_cost"),
+        ],
+        "optional": ["cost"],
+        "distance": False,
+    },
+    "gigs": {
+        "fields": [
+            ("gig_type", "gig type (e.g. labor, creative)", "ask_for_gig_type"),
+            ("duration", "duration or dates", "ask_for_duration"),
+            ("pay_rate", "pay rate or budget (number)", "ask_for_pay_rate"),
+            ("portfolio", "portfolio or sample work links (list)", "ask_for_portfolio"),
+        ],
+        "optional": ["portfolio"],
+        "distance": False,
+    },
 }
 
-Example output:
-{
-  "text": "What type of gig are you looking for?",
-  "gig_type": null,
-  "duration": null,
-  "pay_rate": null,
-  "location": null, 
-  "lat": 37.774929,
-  "lng": -122.419416,
-  "portfolio": null,
-  "action": "ask_for_gig_type"
+# Estimated tokens (see prompt_tokens); raise deliberately, not to make a test pass.
+# Conversation prompts are only used with SERVER_QUEST_FLOW=false.
+PROMPT_TOKEN_BUDGETS: Dict[str, int] = {
+    "for_sale": 610,
+    "housing": 560,
+    "jobs": 610,
+    "services": 570,
+    "community": 500,
+    "gigs": 490,
 }
 
-Remember: Output ONLY the JSON object, nothing else. No code fences, no tags, no explanations.
-
-action field must be one of the following if relevant:
-"validate_location"
-"ask_for_distance"
-"ask_for_gig_type"
-"ask_for_duration"
-"ask_for_pay_rate"
-"ask_for_portfolio"
-"ask_for_location"
-"offer_photos"
-"ready"
-"summarize"
-
-Only use the above actions. Do not invent new actions.
-
-When all required information has been collected and confirmed, set action: "ready".
-Use "ready" only when the quest is fully complete and ready to post. Never use "complete" or any other action for this purpose.
-"""
-
+EXTRACT_PROMPT_TOKEN_BUDGET = 220
+
+GENERIC_PROMPT = "You are a generic quest processor. Process the following quest:"
+
+def _fragment(name: str, **values) -> str:
+    text = FRAGMENTS[name]
+    return text.format(**values) if values else text
+
+def _example(spec: dict) -> str:
+    # One compact line: keys matter to the model, pretty-printing doesn't
+    keys = [field for field, _, _ in spec["fields"]] + ["general_location", "lat", "lng"]
+    if spec["distance"]:
+        keys += ["distance", "distance_unit"]
+    body = ", ".join(f'"{key}": null' for key in keys)
+    return (
+        '{"text": "Is your location San Francisco, CA?", ' + body + ', '
+        '"action": "validate_location", "ui": {"trigger": "location_confirm", "buttons": ["Yes", "No"]}}'
+    )
+
+def category_actions(category: str) -> List[str]:
+    spec = CATEGORY_SPECS[category]
+    actions = ["validate_location"]
+    if spec["distance"]:
+        actions.append("ask_for_distance")
+    actions += [action for _, _, action in spec["fields"] if action]
+    return actions + ["offer_photos", "ready", "summarize"]
+
+def compile_prompt(category: str) -> str:
+    """Assemble a category's prompt from the shared fragments and its spec."""
+    spec = CATEGORY_SPECS[category]
+    parts = [_fragment("role", category=category)]
+    parts += [f"- {field}: {description}" for field, description, _ in spec["fields"]]
+    parts.append(_fragment("location"))
+    if spec["distance"]:
+        parts.append(_fragment("distance", buttons=", ".join(f'"{b}"' for b in DISTANCE_BUTTONS)))
+    parts.append(_fragment("conversation"))
+    parts += spec.get("rules", [])
+    parts += [_fragment("photos"), _fragment("ready"), _fragment("ui")]
+    parts.append(_fragment("actions", actions=", ".join(f'"{a}"' for a in category_actions(category))))
+    parts.append(_fragment("json_output", example=_example(spec)))
+    return "\n".join(parts)
+
+def compile_extract_prompt(category: str) -> str:
+    """Extraction-only prompt for the server-side flow (quest_flow): no conversation rules."""
+    spec = CATEGORY_SPECS[category]
+    parts = [_fragment("extract_role", category=category)]
+    parts += [f"- {field}: {description}" for field, description, _ in spec["fields"]]
+    parts.append(_fragment("extract_location"))
+    if spec["distance"]:
+        parts.append(_fragment("extract_distance"))
+    parts.append(_fragment("extract_output"))
+    return "\n".join(parts)
+
+def prompt_tokens(text: str) -> int:
+    """Token estimate, the same one the quota governor reserves with."""
+    return len(text) // CHARS_PER_TOKEN
+
+def prompt_version(category: str) -> str:
+    """Short content hash of a compiled prompt, for logs and cache debugging."""
+    text = PROMPTS.get(category, GENERIC_PROMPT)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+def prompt_token_report() -> Dict[str, Dict[str, int]]:
+    return {
+        category: {
+            "tokens": prompt_tokens(text), "chars": len(text), "budget": PROMPT_TOKEN_BUDGETS[category],
+            "extract_tokens": prompt_tokens(EXTRACT_PROMPTS[category]), "extract_budget": EXTRACT_PROMPT_TOKEN_BUDGET,
+        }
+        for category, text in PROMPTS.items()
+    }
+
+def get_prompt(category: Optional[str]) -> str:
+    return PROMPTS.get(category, GENERIC_PROMPT)
+
+PROMPTS: Dict[str, str] = {category: compile_prompt(category) for category in CATEGORY_SPECS}
+EXTRACT_PROMPTS: Dict[str, str] = {category: compile_extract_prompt(category) for category in CATEGORY_SPECS}
+
+FOR_SALE_PROMPT = PROMPTS["for_sale"]
+HOUSING_PROMPT = PROMPTS["housing"]
+JOBS_PROMPT = PROMPTS["jobs"]
+SERVICES_PROMPT = PROMPTS["services"]
+COMMUNITY_PROMPT = PROMPTS["community"]
+GIGS_PROMPT = PROMPTS["gigs"]
+
+if __name__ == "__main__":
+    total = 0
+    print(f"{'category':10s} {'tokens':>6s} {'budget':>6s} {'chars':>6s} {'extract':>7s}  version")
+    for category, row in prompt_token_report().items():
+        total += row["tokens"]
+        print(f"{category:10s} {row['tokens']:6d} {row['budget']:6d} {row['chars']:6d} {row['extract_tokens']:7d}  {prompt_version(category)}")
+    print(f"{'total':10s} {total:6d}")
@@ -0,0 +1,113 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+from typing_extensions import Annotated
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError, create_model
+
+# === QUEST STATE SCHEMA ===
+# Single source for quest fields. Category-specific state models, the
+# all-category QuestState and the QuestCreateRequest body are generated from
+# it, so session blobs and prompts only carry fields the category uses.
+
+# A trailing "k" is thousands ("85k"), as in slot_extractor; "5 kids" and "10 km" are not
+NUMBER_RE = re.compile(r"(-?\d[\d,]*(?:\.\d+)?)(?:\s*(k)\b)?", re.IGNORECASE)
+
+def _number(value: Any) -> Any:
+    # LLM output is loose: "$1,500", "$85k", "10 miles", "5 people"
+    if isinstance(value, str):
+        match = NUMBER_RE.search(value)
+        if not match:
+            return None
+        number = match.group(1).replace(",", "")
+        return float(number) * 1000 if match.group(2) else number
+    return value
+
+def _integer(value: Any) -> Any:
+    number = _number(value)
+    if number is None:
+        return None
+    try:
+        return int(float(number))
+    except (TypeError, ValueError, OverflowError):
+        # A list, object or inf; ValueError makes pydantic report it so compact_state drops the field
+        raise ValueError(f"not a number: {value!r}")
+
+def _text(value: Any) -> Any:
+    return str(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+Number = Annotated[Optional[float], BeforeValidator(_number)]
+Integer = Annotated[Optional[int], BeforeValidator(_integer)]
+Text = Annotated[Optional[str], BeforeValidator(_text)]
+
+# Fields every category carries
+COMMON_FIELDS: Dict[str, Any] = {
+    "want_or_have": Text,
+    "description": Text,
+    "general_category": Text,
+    "sub_category": Text,
+    "general_location": Text,
+    "location_confirmed": Optional[bool],
+    "lat": Number,
+    "lng": Number,
+    "distance": Number,
+    "distance_unit": Text,
+    "photos": Optional[List[str]],
+    "photos_offered": Optional[bool],
+    "action": Text,
+    "text": Text,
+}
+
+CATEGORY_FIELDS: Dict[str, Dict[str, Any]] = {
+    "for_sale": {"title": Text, "price": Number, "condition": Text},
+    "housing": {"property_type": Text, "budget": Number, "move_in_date": Text},
+    "jobs": {
+        "job_role": Text, "employment_type": Text, "industry": Text,
+        "experience_level": Text, "work_location": Text, "resume_uploaded": Optional[bool],
+    },
+    "services": {"service_type": Text, "timeframe": Text, "qualifications": Text, "budget": Number},
+    "community": {"activity": Text, "date_time": Text, "meetup_location": Text, "group_size": Integer, "cost": Number},
+    "gigs": {"gig_type": Text, "duration": Text, "pay_rate": Number, "portfolio": Optional[List[str]]},
+}
+
+# Kept in the session but never written to the quests table
+SESSION_ONLY_FIELDS = {"action", "text", "location_confirmed", "photos_offered", "general_category", "sub_category"}
+
+ALL_FIELDS: Dict[str, Any] = {**COMMON_FIELDS}
+for _fields in CATEGORY_FIELDS.values():
+    ALL_FIELDS.update(_fields)
+
+class SparseState(BaseModel):
+    # Unknown keys (other categories' fields, stray LLM output) are dropped
+    model_config = ConfigDict(extra="ignore")
+
+    def sparse(self) -> Dict[str, Any]:
+        return self.model_dump(exclude_none=True)
+
+@lru_cache(maxsize=None)
+def state_model(general_category: Optional[str] = None) -> Type[SparseState]:
+    """State model for a category (all fields when the category is unknown); built once per category."""
+    fields = {**COMMON_FIELDS, **CATEGORY_FIELDS[general_category]} if general_category in CATEGORY_FIELDS else ALL_FIELDS
+    name = "".join(part.title() for part in (general_category or "any").split("_")) + "QuestState"
+    return create_model(name, __base__=SparseState, **{field: (annotation, None) for field, annotation in fields.items()})
+
+def compact_state(state: Dict[str, Any], general_category: Optional[str]) -> Dict[str, Any]:
+    """Validate `state` against its category model and drop nulls and foreign fields."""
+    # Server-side photo renditions are a free-form map; carry them through untouched
+    renditions = state.get("photo_renditions")
+    model = state_model(general_category)
+    try:
+        compacted = model.model_validate(state).sparse()
+    except ValidationError as e:
+        # Drop values of the wrong shape (e.g. an object where text belongs) rather than the whole state
+        bad = {error["loc"][0] for error in e.errors() if error["loc"]}
+        compacted = model.model_validate({k: v for k, v in state.items() if k not in bad}).sparse()
+    if renditions:
+        compacted["photo_renditions"] = renditions
+    return compacted
+
+QuestState = state_model(None)
+
+QuestCreateRequestBase = create_model(
+    "QuestCreateRequestBase",
+    **{field: (annotation, None) for field, annotation in ALL_FIELDS.items() if field not in SESSION_ONLY_FIELDS}
+)
@@ -1,12 +1,23 @@
 import os
 import json
 import logging
-import requests
 import re
-from typing import Dict, Any, List, Optional
+import asyncio
+import threading
+import weakref
+from typing import Callable, Dict, Any, List, Optional
 from pydantic import BaseModel
-from vertex_client import get_vertex_chat_response
-from quest_prompts import FOR_SALE_PROMPT, HOUSING_PROMPT, JOBS_PROMPT, SERVICES_PROMPT, COMMUNITY_PROMPT, GIGS_PROMPT
+from model_router import routed_chat_response, is_complex_turn
+from quest_prompts import get_prompt, prompt_version, EXTRACT_PROMPTS
+from quest_flow import SERVER_QUEST_FLOW, apply_extracted, next_step
+from quick_replies import confirm_location_reply
+from slot_extractor import prefill_quest_state
+from quest_schema import compact_state
+from taxonomy_index import taxonomy_index
+from session_codec import encode_row, decode_row
+from supabase_client import supabase_request, supabase_breaker, CircuitOpenError
+import metrics
+import serialization
 import httpx
 
 # === SUPABASE CONFIG ===
@@ -16,54 +27,181 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Local storage for development/testing
 LOCAL_SESSIONS: Dict[str, Dict[str, Any]] = {}
 
-# === TAXONOMY LOADED FROM EXTERNAL FILE ===
-with open("taxonomy.json", "r") as f:
-    TAXONOMY = json.load(f)
+# Max sessions per bulk Supabase request (keeps `in.(...)` URLs short)
+SESSION_BULK_CHUNK = int(os.getenv("SESSION_BULK_CHUNK", "100"))
 
 # === SESSION MANAGEMENT TOOLS USING SUPABASE ===
+# While Supabase is down (or its circuit is open) sessions are served from and
+# written to LOCAL_SESSIONS; the writes are buffered in PENDING_SESSION_WRITES
+# and replayed as one bulk upsert once the breaker closes again. A session
+# whose row could not be read comes back marked "unloaded": its turns are kept
+# locally and only ever inserted (never upserted over the real row), and they
+# are not queued for replay.
+PENDING_SESSION_WRITES: Dict[str, Dict[str, Any]] = {}
+_pending_lock = threading.Lock()
+
+def _empty_session() -> Dict[str, Any]:
+    return {"quest_state": {}, "chat_history": []}
+
+def _unloaded_session(session_id: str) -> Dict[str, Any]:
+    """What to run a turn on when the stored row couldn't be read."""
+    # With Supabase configured, LOCAL_SESSIONS only holds pending writes and unloaded copies
+    return LOCAL_SESSIONS.get(session_id) or {**_empty_session(), "unloaded": True}
+
+def _session_row(session_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
+    # Bulk upserts need every row to carry the same keys
+    return {
+        "quest_id": session_id,
+        "quest_state": session.get("quest_state", {}),
+        "chat_history": session.get("chat_history", []),
+        "general_category": session.get("general_category"),
+        "sub_category": session.get("sub_category"),
+        "last_updated": "now()"
+    }
+
+def _save_degraded(row: Dict[str, Any], unloaded: bool = False) -> None:
+    """Keep a session locally and queue it for replay to Supabase (unless its state was never loaded)."""
+    LOCAL_SESSIONS[row["quest_id"]] = {
+        "quest_state": row["quest_state"],
+        "chat_history": row["chat_history"],
+        "general_category": row["general_category"],
+        "sub_category": row["sub_category"]
+    }
+    if unloaded:
+        LOCAL_SESSIONS[row["quest_id"]]["unloaded"] = True
+        return
+    with _pending_lock:
+        PENDING_SESSION_WRITES[row["quest_id"]] = row
+        metrics.set_gauge("supabase.pending_writes", len(PENDING_SESSION_WRITES))
+
+def _clear_pending(session_ids: List[str]) -> None:
+    # Supabase has the latest copy now; a local one would go stale
+    with _pending_lock:
+        for session_id in session_ids:
+            PENDING_SESSION_WRITES.pop(session_id, None)
+            LOCAL_SESSIONS.pop(session_id, None)
+        metrics.set_gauge("supabase.pending_writes", len(PENDING_SESSION_WRITES))
+
+def _local_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """The local copy if it is newer than Supabase's (a write is still waiting for replay)."""
+    if session_id in PENDING_SESSION_WRITES:
+        return LOCAL_SESSIONS.get(session_id)
+    return None
+
+def replay_pending_writes() -> int:
+    """Upsert buffered session writes once Supabase is back. Runs in a background thread."""
+    with _pending_lock:
+        pending = dict(PENDING_SESSION_WRITES)
+    if not pending:
+        return 0
+    logging.info(f"[replay_pending_writes] Replaying {len(pending)} buffered session writes")
+    replayed = 0
+    rows = list(pending.values())
+    for start in range(0, len(rows), SESSION_BULK_CHUNK):
+        chunk = rows[start:start + SESSION_BULK_CHUNK]
+        try:
+            response = supabase_request("POST", "quest_sessions", prefer="resolution=merge-duplicates", json=[encode_row(row) for row in chunk])
+            if response.status_code not in (200, 201, 204):
+                raise RuntimeError(response.text)
+        except Exception as e:
+            logging.error(f"[replay_pending_writes] Stopped after {replayed} sessions: {e}")
+            break
+        with _pending_lock:
+            for row in chunk:
+                # A newer degraded write may have replaced this one meanwhile
+                if PENDING_SESSION_WRITES.get(row["quest_id"]) is row:
+                    del PENDING_SESSION_WRITES[row["quest_id"]]
+                    LOCAL_SESSIONS.pop(row["quest_id"], None)
+            metrics.set_gauge("supabase.pending_writes", len(PENDING_SESSION_WRITES))
+        replayed += len(chunk)
+    metrics.incr("supabase.replayed", replayed)
+    return replayed
+
+supabase_breaker.on_recover(replay_pending_writes)
+
 async def load_session(session_id: str) -> Dict[str, Any]:
     logging.info(f"[load_session] Loading session: {session_id}")
     if not SUPABASE_API or not SUPABASE_KEY:
-        session = LOCAL_SESSIONS.get(session_id, {
-            "quest_state": {},
-            "chat_history": []
-        })
+        session = LOCAL_SESSIONS.get(session_id, _empty_session())
         logging.info(f"[load_session] Loaded from LOCAL_SESSIONS: {session}")
         logging.info(f"[load_session] Loaded quest_state: {session.get('quest_state', {})}")
         return session
+    local = _local_session(session_id)
+    if local is not None:
+        logging.info(f"[load_session] Using buffered local copy of {session_id}")
+        return local
     try:
-        response = requests.get(
-            f"{SUPABASE_API}/rest/v1/quest_sessions?quest_id=eq.{session_id}",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json"
-            }
-        )
+        response = supabase_request("GET", f"quest_sessions?quest_id=eq.{session_id}")
         logging.info(f"[load_session] Supabase GET status: {response.status_code}, response: {response.text}")
-        if response.status_code == 200 and response.json():
-            session = response.json()[0]
+        if response.status_code >= 500:
+            raise RuntimeError(f"Supabase GET failed with {response.status_code}")
+        rows = serialization.loads(response.content) if response.status_code == 200 else []
+        if rows:
+            session = decode_row(rows[0])
             logging.info(f"[load_session] Loaded session from Supabase: {session}")
             logging.info(f"[load_session] Loaded quest_state: {session.get('quest_state', {})}")
             return session
         else:
             logging.info(f"[load_session] No session found in Supabase for: {session_id}")
+    except CircuitOpenError:
+        logging.warning(f"[load_session] Supabase circuit open; serving {session_id} from the degraded store")
+        return _unloaded_session(session_id)
     except Exception as e:
         logging.error(f"[load_session] Error loading session from Supabase: {e}")
-    return {
-        "quest_state": {},
-        "chat_history": []
-    }
+        return _unloaded_session(session_id)
+    return _empty_session()
+
+async def load_sessions(session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Load many sessions at once using a single `in.(...)` query per chunk.
+    Sessions that don't exist yet come back with an empty quest_state/chat_history.
+    """
+    ids = list(dict.fromkeys(session_ids))
+    sessions: Dict[str, Dict[str, Any]] = {}
+    if SUPABASE_API and SUPABASE_KEY:
+        for session_id in ids:
+            local = _local_session(session_id)
+            if local is not None:
+                sessions[session_id] = local
+        remote_ids = [session_id for session_id in ids if session_id not in sessions]
+        for start in range(0, len(remote_ids), SESSION_BULK_CHUNK):
+            chunk = remote_ids[start:start + SESSION_BULK_CHUNK]
+            id_list = ",".join(f'"{session_id}"' for session_id in chunk)
+            try:
+                response = supabase_request("GET", f"quest_sessions?quest_id=in.({id_list})")
+                logging.info(f"[load_sessions] Supabase GET status: {response.status_code} for {len(chunk)} sessions")
+                if response.status_code >= 500:
+                    raise RuntimeError(f"Supabase GET failed with {response.status_code}")
+                if response.status_code == 200:
+                    for row in serialization.loads(response.content):
+                        sessions[row["quest_id"]] = decode_row(row)
+            except Exception as e:
+                logging.error(f"[load_sessions] Error loading sessions from Supabase: {e}")
+                for session_id in chunk:
+                    sessions[session_id] = _unloaded_session(session_id)
+    else:
+        for session_id in ids:
+            if session_id in LOCAL_SESSIONS:
+                sessions[session_id] = LOCAL_SESSIONS[session_id]
+    for session_id in ids:
+        sessions.setdefault(session_id, _empty_session())
+    return sessions
+
+def _upsert_preference(unloaded: bool) -> str:
+    # A session we couldn't read may exist with real state; only insert it if it doesn't
+    return "resolution=ignore-duplicates" if unloaded else "resolution=merge-duplicates"
 
 async def save_session(
     session_id: str,
     quest_state: Dict[str, Any],
     chat_history: List[Dict[str, str]],
     general_category: str = None,
-    sub_category: str = None
+    sub_category: str = None,
+    unloaded: bool = False
 ) -> None:
     """
     Save the session to Supabase or local storage. Category fields are saved as top-level fields, not inside quest_state.
+    `unloaded` sessions (the stored row couldn't be read) are only inserted, never written over an existing row.
     """
     logging.info(f"[save_session] Saving session: {session_id} with quest_state: {quest_state}, chat_history: {chat_history}, general_category: {general_category}, sub_category: {sub_category}")
     if not SUPABASE_API or not SUPABASE_KEY:
@@ -86,52 +224,168 @@ async def save_session(
             data["general_category"] = general_category
         if sub_category:
             data["sub_category"] = sub_category
-        response = requests.post(
-            f"{SUPABASE_API}/rest/v1/quest_sessions",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "resolution=merge-duplicates"
-            },
-            json=data
-        )
+        response = supabase_request("POST", "quest_sessions", prefer=_upsert_preference(unloaded), json=encode_row(data))
         logging.info(f"[save_session] Supabase POST status: {response.status_code}, response: {response.text}")
+        if response.status_code >= 500:
+            raise RuntimeError(response.text)
+        _clear_pending([session_id])
     except Exception as e:
         logging.error(f"[save_session] Error saving session to Supabase: {e}")
-        # Fallback to local storage
-        LOCAL_SESSIONS[session_id] = {
+        # Fallback to local storage, replayed once Supabase recovers
+        _save_degraded(_session_row(session_id, {
             "quest_state": quest_state,
             "chat_history": chat_history,
             "general_category": general_category,
             "sub_category": sub_category
-        }
+        }), unloaded)
         logging.info(f"[save_session] Fallback saved to LOCAL_SESSIONS: {LOCAL_SESSIONS[session_id]}")
 
+async def save_sessions(sessions: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Bulk upsert many sessions. Each value holds quest_state, chat_history and the
+    optional general_category/sub_category, as passed to save_session.
+    """
+    logging.info(f"[save_sessions] Saving {len(sessions)} sessions")
+    if not SUPABASE_API or not SUPABASE_KEY:
+        for session_id, session in sessions.items():
+            LOCAL_SESSIONS[session_id] = {
+                "quest_state": session.get("quest_state", {}),
+                "chat_history": session.get("chat_history", []),
+                "general_category": session.get("general_category"),
+                "sub_category": session.get("sub_category")
+            }
+        return
+    for unloaded in (False, True):
+        rows = [
+            _session_row(session_id, session) for session_id, session in sessions.items()
+            if bool(session.get("unloaded")) == unloaded
+        ]
+        for start in range(0, len(rows), SESSION_BULK_CHUNK):
+            chunk = rows[start:start + SESSION_BULK_CHUNK]
+            try:
+                response = supabase_request("POST", "quest_sessions", prefer=_upsert_preference(unloaded), json=[encode_row(row) for row in chunk])
+                logging.info(f"[save_sessions] Supabase POST status: {response.status_code} for {len(chunk)} sessions")
+                if response.status_code not in (200, 201, 204):
+                    raise RuntimeError(response.text)
+                _clear_pending([row["quest_id"] for row in chunk])
+            except Exception as e:
+                logging.error(f"[save_sessions] Error saving sessions to Supabase: {e}")
+                # Fallback to local storage, replayed once Supabase recovers
+                for row in chunk:
+                    _save_degraded(row, unloaded)
+
+# === CONCURRENT WRITERS OF ONE SESSION ===
+# A /start-quest turn saves the whole session once its Gemini call returns,
+# while photo uploads and the image pipeline add photos/photo_renditions to
+# the same session. Photo writers hold the session's lock for their
+# read-modify-write and bump its counter; a turn saves under the same lock
+# and, if photos were written since it loaded the session, takes those
+# fields from the stored copy instead of its own stale one.
+SERVER_SIDE_FIELDS = ("photos", "photo_renditions")
+
+class SessionWrites:
+    """Per-session lock and photo-write counter, shared while anyone holds a reference."""
+    __slots__ = ("lock", "photo_writes", "__weakref__")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.photo_writes = 0
+
+_session_writes: "weakref.WeakValueDictionary[str, SessionWrites]" = weakref.WeakValueDictionary()
+
+def session_writes(session_id: str) -> SessionWrites:
+    """Take this before loading a session that will be saved after a slow step, and keep it until the save."""
+    writes = _session_writes.get(session_id)
+    if writes is None:
+        writes = _session_writes[session_id] = SessionWrites()
+    return writes
+
+async def update_server_fields(session_id: str, update: Callable[[Dict[str, Any]], None]) -> None:
+    """Apply `update` to the stored quest_state (photo fields only) without racing a turn's save."""
+    writes = session_writes(session_id)
+    async with writes.lock:
+        session = await load_session(session_id)
+        quest_state = dict(session.get("quest_state", {}))
+        update(quest_state)
+        await save_session(
+            session_id,
+            quest_state,
+            session.get("chat_history", []),
+            session.get("general_category"),
+            session.get("sub_category"),
+            session.get("unloaded", False)
+        )
+        writes.photo_writes += 1
+
+async def _carry_server_fields(session_id: str, session: Dict[str, Any], writes: SessionWrites, seen: int) -> None:
+    # Caller holds writes.lock
+    if writes.photo_writes == seen:
+        return
+    stored = (await load_session(session_id)).get("quest_state", {})
+    quest_state = {k: v for k, v in session.get("quest_state", {}).items() if k not in SERVER_SIDE_FIELDS}
+    quest_state.update({field: stored[field] for field in SERVER_SIDE_FIELDS if field in stored})
+    session["quest_state"] = quest_state
+
+async def save_turn(session_id: str, session: Dict[str, Any], writes: SessionWrites, seen: int) -> None:
+    """Save a session after a turn; `seen` is writes.photo_writes from before the session was loaded."""
+    async with writes.lock:
+        await _carry_server_fields(session_id, session, writes, seen)
+        await save_session(
+            session_id,
+            session["quest_state"],
+            session["chat_history"],
+            session.get("general_category"),
+            session.get("sub_category"),
+            session.get("unloaded", False)
+        )
+
+async def save_turns(sessions: Dict[str, Dict[str, Any]], writes: Dict[str, SessionWrites], seen: Dict[str, int]) -> None:
+    """Bulk version of save_turn for the batch endpoint."""
+    # Photo writers take one lock at a time, so taking many in any order can't deadlock
+    locked = []
+    try:
+        for session_id in sessions:
+            await writes[session_id].lock.acquire()
+            locked.append(writes[session_id].lock)
+            await _carry_server_fields(session_id, sessions[session_id], writes[session_id], seen[session_id])
+        await save_sessions(sessions)
+    finally:
+        for lock in locked:
+            lock.release()
+
 async def update_quest_state(session_id: str, updates: Dict[str, Any], general_category: str = None, sub_category: str = None) -> Dict[str, Any]:
     """Update quest state in Supabase."""
-    current = await load_session(session_id)
-    logging.info(f"[update_quest_state] Current quest_state: {current['quest_state']}")
-    current["quest_state"].update(updates)
-    logging.info(f"[update_quest_state] Updated quest_state: {current['quest_state']}")
-    # Use explicit general_category/sub_category if provided, else from current session
-    gc = general_category or current.get("general_category")
-    sc = sub_category or current.get("sub_category")
-    await save_session(session_id, current["quest_state"], current["chat_history"], gc, sc)
+    writes = session_writes(session_id)
+    async with writes.lock:
+        current = await load_session(session_id)
+        logging.info(f"[update_quest_state] Current quest_state: {current['quest_state']}")
+        # Use explicit general_category/sub_category if provided, else from current session
+        gc = general_category or current.get("general_category")
+        sc = sub_category or current.get("sub_category")
+        # Photo fields in `updates` are the turn's stale copy; the stored ones win
+        updates = {k: v for k, v in updates.items() if k not in SERVER_SIDE_FIELDS}
+        current["quest_state"] = compact_state({**current["quest_state"], **updates}, gc)
+        logging.info(f"[update_quest_state] Updated quest_state: {current['quest_state']}")
+        await save_session(session_id, current["quest_state"], current["chat_history"], gc, sc, current.get("unloaded", False))
     return current["quest_state"]
 
 def safe_json_parse(response: str) -> dict:
-    import re
-    import json
     logging.info(f"Safe JSON Response: {response}")
-    
+    # Well-behaved replies are bare JSON
+    try:
+        parsed = serialization.loads(response)
+        if isinstance(parsed, dict):
+            return parsed
+    except (serialization.JSONDecodeError, TypeError):
+        pass
+
     # Try to find JSON blocks with triple backticks first
     code_block_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response, re.DOTALL)
     if code_block_match:
         try:
             json_str = code_block_match.group(1)
             logging.info(f"Found JSON in code block: {json_str}")
-            return json.loads(json_str)
+            return serialization.loads(json_str)
         except Exception as e:
             logging.error(f"Failed to parse JSON from code block: {e}")
     
@@ -141,7 +395,7 @@ def safe_json_parse(response: str) -> dict:
         try:
             json_str = json_marker_match.group(1)
             logging.info(f"Found JSON with marker: {json_str}")
-            return json.loads(json_str)
+            return serialization.loads(json_str)
         except Exception as e:
             logging.error(f"Failed to parse JSON with marker: {e}")
     
@@ -153,7 +407,7 @@ def safe_json_parse(response: str) -> dict:
         for m in matches:
             try:
                 logging.info(f"Trying to parse JSON block: {m}")
-                return json.loads(m)
+                return serialization.loads(m)
             except Exception as e:
                 logging.error(f"Failed to parse JSON block: {e} | {m}")
     
@@ -161,8 +415,9 @@ def safe_json_parse(response: str) -> dict:
     return {}
 
 # === AI TOOLS ===
-async def classify_quest(quest_text: str, taxonomy: Dict[str, Any] = TAXONOMY) -> Dict[str, Any]:
-    """Classify quest using Vertex AI."""
+async def classify_quest(quest_text: str, taxonomy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Classify quest using Vertex AI; categories are snapped onto the taxonomy."""
+    taxonomy = taxonomy or taxonomy_index.taxonomy
     prompt = (
         f"You are a quest classifier. Given the following quest, output ONLY a valid JSON object with 'general_category' and 'sub_category' fields, and nothing else. "
         f"Here are the available general categories: {list(taxonomy.keys())}.\n"
@@ -179,8 +434,12 @@ async def classify_quest(quest_text: str, taxonomy: Dict[str, Any] = TAXONOMY) -
     messages = [
             {"role": "user", "content": f"{prompt}\n{quest_text}"}
         ]
-    response = get_vertex_chat_response(messages)
-    return safe_json_parse(response)
+    # Escalate when the cheap model names a category we don't have (near-misses are fine)
+    response = await routed_chat_response(
+        "classify", messages,
+        validate=lambda r: taxonomy_index.category(r.get("general_category")) in taxonomy and bool(r.get("sub_category"))
+    )
+    return taxonomy_index.normalize(safe_json_parse(response))
 
 async def geocode_location(location: str) -> Dict[str, Any]:
     """Geocode location using our /api/geocode endpoint."""
@@ -206,7 +465,10 @@ async def confirm_location(location: str, coordinates: Dict[str, float]) -> bool
     messages = [
         {"role": "user", "content": f"{prompt}\nLocation: {location}\nCoordinates: {coordinates}"}
     ]
-    response = get_vertex_chat_response(messages)
+    response = await routed_chat_response(
+        "confirm_location", messages,
+        validate=lambda r: isinstance(r.get("confirmed"), bool)
+    )
     result = safe_json_parse(response)
     return result.get("confirmed", False)
 
@@ -214,11 +476,18 @@ async def confirm_location(location: str, coordinates: Dict[str, float]) -> bool
 async def process_quest(
     quest_text: str,
     session_id: str,
-    chat_history: List[Dict[str, str]]
+    chat_history: List[Dict[str, str]],
+    session: Optional[Dict[str, Any]] = None,
+    persist: bool = True
 ) -> Dict[str, Any]:
-    """Process a quest using Vertex AI."""
+    """
+    Process a quest using Vertex AI.
+    Pass `session` to skip reloading it, and `persist=False` when the caller
+    saves the session itself (e.g. bulk upserts from the batch endpoint).
+    """
     # Load current quest state from session
-    session = await load_session(session_id)
+    if session is None:
+        session = await load_session(session_id)
     current_quest_state = session.get("quest_state", {})
     #logging.info(f"[process_quest] Loaded current quest_state: {current_quest_state}")
 
@@ -229,26 +498,21 @@ async def process_quest(
         #logging.info(f"Classification result: {classification}")
         
         # Update quest_sessions with category info
-        try:
-            session_update = {
-                "general_category": classification.get("general_category"),
-                "sub_category": classification.get("sub_category"),
-                "last_updated": "now()"
-            }
-            response = requests.patch(
-                f"{SUPABASE_API}/rest/v1/quest_sessions?quest_id=eq.{session_id}",
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation"
-                },
-                json=session_update
-            )
-            if response.status_code not in (200, 201):
-                logging.error(f"Failed to update quest_sessions with category info: {response.text}")
-        except Exception as e:
-            logging.error(f"Error updating quest_sessions with category info: {str(e)}")
+        if persist:
+            try:
+                session_update = {
+                    "general_category": classification.get("general_category"),
+                    "sub_category": classification.get("sub_category"),
+                    "last_updated": "now()"
+                }
+                response = supabase_request(
+                    "PATCH", f"quest_sessions?quest_id=eq.{session_id}",
+                    prefer="return=representation", json=session_update
+                )
+                if response.status_code not in (200, 201):
+                    logging.error(f"Failed to update quest_sessions with category info: {response.text}")
+            except Exception as e:
+                logging.error(f"Error updating quest_sessions with category info: {str(e)}")
         
         # Update current quest state with classification
         #current_quest_state.update(classification)
@@ -261,24 +525,42 @@ async def process_quest(
 
     # Get category-specific prompt
     category = classification.get("general_category", "generic")
-    prompt = get_category_prompt(category)
     logging.info(f"Using category: {category}")
 
-    # Build messages: system message with current quest state, then prompt, then chat history, then user message
-    addClassification = {"role": "user", "content": f"Category: {json.dumps(classification)}"}
-    system_message = {"role": "user", "content": f"Current quest state: {json.dumps(current_quest_state)}"}
-    messages = [
-        addClassification,
-        system_message,
-        {"role": "user", "content": prompt},
-        *chat_history,
-        {"role": "user", "content": f"Respond to the user's message: {quest_text}"}
-    ]
-    #logging.info(f"Sending messages to Vertex AI: {messages}")
-    response = get_vertex_chat_response(messages)
-    #logging.info(f"Raw Vertex AI response: {response}")
-    result = safe_json_parse(response)
-    #logging.info(f"Parsed result: {result}")
+    # Pre-fill fields the user stated outright so the LLM doesn't ask for them
+    prefilled = prefill_quest_state(current_quest_state, quest_text, category)
+    # The prompt only sees the category's fields that are actually set
+    current_quest_state = compact_state({**current_quest_state, **prefilled}, category)
+
+    if SERVER_QUEST_FLOW and category in EXTRACT_PROMPTS:
+        result = await extract_quest_turn(quest_text, current_quest_state, category, chat_history)
+    else:
+        # Build messages: system message with current quest state, then prompt, then chat history, then user message
+        prompt = get_category_prompt(category)
+        logging.info(f"[process_quest] LLM-driven turn (prompt {prompt_version(category)})")
+        addClassification = {"role": "user", "content": f"Category: {serialization.dumps(classification)}"}
+        system_message = {"role": "user", "content": f"Current quest state: {serialization.dumps(current_quest_state)}"}
+        messages = [
+            addClassification,
+            system_message,
+            {"role": "user", "content": prompt},
+            *chat_history,
+            {"role": "user", "content": f"Respond to the user's message: {quest_text}"}
+        ]
+        #logging.info(f"Sending messages to Vertex AI: {messages}")
+        response = await routed_chat_response(
+            "quest_turn", messages,
+            category=category,
+            complex_turn=is_complex_turn(quest_text, chat_history),
+            validate=lambda r: isinstance(r.get("text"), str) and bool(r["text"].strip())
+        )
+        #logging.info(f"Raw Vertex AI response: {response}")
+        result = safe_json_parse(response)
+        #logging.info(f"Parsed result: {result}")
+        # Keep pre-filled values unless the model supplied its own
+        for key, value in prefilled.items():
+            if result.get(key) is None:
+                result[key] = value
 
     # Update state
     state_update = {
@@ -286,18 +568,40 @@ async def process_quest(
         **result
     }
     #logging.info(f"Updating quest state with: {state_update}")
-    await update_quest_state(session_id, state_update, classification.get("general_category"), classification.get("sub_category"))
+    if persist:
+        await update_quest_state(session_id, state_update, classification.get("general_category"), classification.get("sub_category"))
 
     return result
 
+async def extract_quest_turn(
+    quest_text: str,
+    quest_state: Dict[str, Any],
+    category: str,
+    chat_history: List[Dict[str, str]]
+) -> Dict[str, Any]:
+    """
+    One turn of the server-side flow: Gemini only extracts field values from
+    the message, then quest_flow picks the next question. Only the last
+    question is sent, not the whole chat history.
+    """
+    quest_state = confirm_location_reply(quest_state, quest_text)
+    known = {k: v for k, v in quest_state.items() if k not in ("action", "text", "ui")}
+    messages = [
+        {"role": "user", "content": EXTRACT_PROMPTS[category]},
+        {"role": "user", "content": f"Current quest state: {serialization.dumps(known)}"},
+    ]
+    if quest_state.get("text"):
+        messages.append({"role": "user", "content": f"Last question: {quest_state['text']}"})
+    messages.append({"role": "user", "content": f"User message: {quest_text}"})
+    response = await routed_chat_response(
+        "quest_extract", messages,
+        category=category,
+        complex_turn=is_complex_turn(quest_text, chat_history)
+    )
+    extracted = safe_json_parse(response)
+    logging.info(f"[extract_quest_turn] Extracted: {extracted}")
+    return next_step(apply_extracted(quest_state, extracted, category), category, extracted=True)
+
 def get_category_prompt(category: str) -> str:
-    """Get the prompt template for a specific category."""
-    prompts = {
-        "for_sale": FOR_SALE_PROMPT,
-        "housing": HOUSING_PROMPT,
-        "jobs": JOBS_PROMPT,
-        "services": SERVICES_PROMPT,
-        "community": COMMUNITY_PROMPT,
-        "gigs": GIGS_PROMPT
-    }
-    return prompts.get(category, "You are a generic quest processor. Process the following quest:")
+    """Get the compiled prompt for a specific category."""
+    return get_prompt(category)
@@ -0,0 +1,104 @@
+import re
+import logging
+from typing import Dict, Any, Optional
+from quest_flow import YES_NO_BUTTONS, next_step, response, ready, field_for_action, field_question
+
+# === QUICK-REPLY FAST PATH ===
+# Most turns are the user tapping one of the ui.buttons we offered on the
+# previous turn. When the reply matches what the previous action offered we
+# apply the transition locally instead of paying for a Gemini round trip;
+# quest_flow decides what to ask next.
+
+YES_REPLIES = {"yes", "y", "yep", "yeah", "sure", "ok", "okay"}
+NO_REPLIES = {"no", "n", "nope", "skip", "no thanks"}
+DONE_REPLIES = {"done", "finished", "all done", "that's all", "uploaded"}
+
+# A distance button looks like "10 mi" or "25 km"; anything else is free text.
+DISTANCE_REPLY_RE = re.compile(
+    r"^\s*(\d+(?:\.\d+)?)\s*(mi|mile|miles|km|kms|kilometer|kilometers)\s*$",
+    re.IGNORECASE
+)
+
+def _normalize_reply(message: str) -> str:
+    return re.sub(r"[\s.!]+$", "", message.strip()).lower()
+
+# === RULES (keyed on the previous turn's action) ===
+def _on_distance(state, reply, general_category):
+    match = DISTANCE_REPLY_RE.match(reply)
+    if not match:
+        return None
+    unit = "km" if match.group(2).lower().startswith("k") else "mi"
+    state = {**state, "distance": float(match.group(1)), "distance_unit": unit}
+    return next_step(state, general_category)
+
+def _on_validate_location(state, reply, general_category):
+    if reply in YES_REPLIES and state.get("general_location"):
+        return next_step({**state, "location_confirmed": True}, general_category)
+    if reply in NO_REPLIES:
+        state = {**state, "location_confirmed": False, "general_location": None, "lat": None, "lng": None}
+        return response(state, "validate_location", "No problem. What city and state should I use?")
+    return None
+
+def confirm_location_reply(state: Dict[str, Any], message: str) -> Dict[str, Any]:
+    """
+    `state` with the location confirmed when `message` says yes to validate_location.
+    A yes that can't be finished locally (no coordinates yet) goes on to the
+    extraction turn, which doesn't return location_confirmed itself.
+    """
+    if state.get("action") == "validate_location" and state.get("general_location") and _normalize_reply(message) in YES_REPLIES:
+        return {**state, "location_confirmed": True}
+    return state
+
+def _on_offer_photos(state, reply, general_category):
+    if reply in YES_REPLIES:
+        return response(
+            state,
+            "offer_photos",
+            "Great! Upload your photos and let me know when you're done.",
+            {"trigger": "photo_upload"}
+        )
+    if reply in NO_REPLIES or reply in DONE_REPLIES:
+        return next_step({**state, "photos_offered": True}, general_category)
+    return None
+
+def _on_ready(state, reply, general_category):
+    # Posting is final: only the button labels count, "ok"/"sure" go to the LLM
+    yes, no = (label.lower() for label in YES_NO_BUTTONS)
+    if reply == yes:
+        return response(state, "ready", "Posting your quest now!")
+    if reply == no:
+        return response(state, "summarize", "No problem. What would you like to change?")
+    return None
+
+def _on_field_choice(state, reply, general_category):
+    # Answer to one of quest_flow's button questions (e.g. "Full-time")
+    field = field_for_action(general_category, state.get("action"))
+    values = field_question(general_category, field)[3] if field else None
+    for label, value in (values or {}).items():
+        if reply == label.lower():
+            return next_step({**state, field: value}, general_category)
+    return None
+
+QUICK_REPLY_RULES = {
+    "ask_for_distance": _on_distance,
+    "validate_location": _on_validate_location,
+    "offer_photos": _on_offer_photos,
+    "ready": _on_ready,
+}
+
+def apply_quick_reply(
+    quest_state: Dict[str, Any],
+    message: str,
+    general_category: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply a quick-reply button answer to the quest state without calling the LLM.
+    Returns the full next quest state (including text/action/ui) or None when the
+    reply is free text and should go through process_quest.
+    """
+    action = (quest_state or {}).get("action")
+    rule = QUICK_REPLY_RULES.get(action, _on_field_choice)
+    result = rule(dict(quest_state or {}), _normalize_reply(message), general_category)
+    if result is not None:
+        logging.info(f"[apply_quick_reply] Handled '{message}' after action '{action}' -> '{result.get('action')}'")
+    return result
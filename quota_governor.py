@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+import metrics
+
+# === VERTEX QUOTA GOVERNOR ===
+# Client-side view of Vertex's per-model, per-region requests-per-minute and
+# tokens-per-minute quotas. Each call's tokens are estimated before sending and
+# counted in a 60 s sliding window per (model, region); a call that wouldn't
+# fit is rerouted to another configured region with room, or paced until the
+# window frees up, instead of being sent into a 429. A 429 that happens anyway
+# (other clients share the quota) makes that model/region the last choice for
+# a cooldown: calls go elsewhere while any region has room, and otherwise stay
+# on the region they asked for (the retry backoff already spaces them out).
+#
+# Limits are per process: with N gunicorn workers, configure quota / N.
+#   VERTEX_QUOTAS='{"gemini-2.5-flash": {"rpm": 500, "tpm": 2000000},
+#                   "gemini-2.5-pro@europe-west4": {"rpm": 60}}'
+# Unlisted models use QUOTA_DEFAULT_RPM / QUOTA_DEFAULT_TPM (0 = unlimited).
+
+VERTEX_QUOTAS: Dict[str, Dict[str, float]] = json.loads(os.getenv("VERTEX_QUOTAS", "{}"))
+QUOTA_DEFAULT_RPM = float(os.getenv("QUOTA_DEFAULT_RPM", "0"))
+QUOTA_DEFAULT_TPM = float(os.getenv("QUOTA_DEFAULT_TPM", "0"))
+# Use at most this fraction of a quota, leaving room for estimate error
+QUOTA_TARGET_UTILIZATION = float(os.getenv("QUOTA_TARGET_UTILIZATION", "0.9"))
+QUOTA_WINDOW_S = 60.0
+QUOTA_THROTTLE_COOLDOWN_S = float(os.getenv("QUOTA_THROTTLE_COOLDOWN_S", "5"))
+# Output tokens reserved up front; corrected once the response is in
+QUOTA_OUTPUT_ESTIMATE = int(os.getenv("QUOTA_OUTPUT_ESTIMATE", "300"))
+CHARS_PER_TOKEN = 4
+
+class QuotaWaitTimeout(TimeoutError):
+    """No region had quota headroom within the call's time budget."""
+
+def estimate_tokens(messages: Sequence[Dict[str, str]], max_tokens: int) -> int:
+    """Input tokens from character counts, plus the expected output."""
+    chars = sum(len(m["content"]) for m in messages)
+    return chars // CHARS_PER_TOKEN + min(max_tokens, QUOTA_OUTPUT_ESTIMATE)
+
+class _Window:
+    def __init__(self):
+        self.entries: deque = deque()  # [sent_at, tokens]
+        self.tokens = 0
+        self.blocked_until = 0.0
+
+    def trim(self, now: float) -> None:
+        while self.entries and self.entries[0][0] <= now - QUOTA_WINDOW_S:
+            self.tokens -= self.entries.popleft()[1]
+
+class QuotaGovernor:
+    def __init__(self):
+        self.windows: Dict[Tuple[str, str], _Window] = {}
+        self.lock = threading.Lock()
+
+    def limits(self, model_id: str, region: str) -> Tuple[float, float]:
+        limit = VERTEX_QUOTAS.get(f"{model_id}@{region}") or VERTEX_QUOTAS.get(model_id) or {}
+        rpm = limit.get("rpm", QUOTA_DEFAULT_RPM) * QUOTA_TARGET_UTILIZATION
+        tpm = limit.get("tpm", QUOTA_DEFAULT_TPM) * QUOTA_TARGET_UTILIZATION
+        # A configured limit always allows at least one request per window
+        return (max(1.0, rpm) if rpm else 0.0), tpm
+
+    def _window(self, model_id: str, region: str) -> _Window:
+        window = self.windows.get((model_id, region))
+        if window is None:
+            window = self.windows[(model_id, region)] = _Window()
+        return window
+
+    def _wait_time(self, model_id: str, region: str, tokens: int, now: float) -> float:
+        """Seconds until `tokens` more would fit in the window (0 = fits now)."""
+        window = self._window(model_id, region)
+        window.trim(now)
+        wait = 0.0
+        rpm, tpm = self.limits(model_id, region)
+        if rpm and len(window.entries) + 1 > rpm:
+            # The oldest requests have to age out first
+            excess = len(window.entries) + 1 - int(rpm)
+            wait = max(wait, window.entries[excess - 1][0] + QUOTA_WINDOW_S - now)
+        if tpm and window.tokens + tokens > tpm:
+            if tokens > tpm:
+                tokens = int(tpm)  # a single oversized call only needs an empty window
+            freed, needed = 0, window.tokens + tokens - tpm
+            for sent_at, entry_tokens in window.entries:
+                freed += entry_tokens
+                if freed >= needed:
+                    wait = max(wait, sent_at + QUOTA_WINDOW_S - now)
+                    break
+        return wait
+
+    def _pick(self, model_id: str, regions: Sequence[str], tokens: int, now: float) -> Tuple[Optional[str], float]:
+        # Caller holds self.lock
+        waits, cooling = [], None
+        for region in regions:
+            wait = self._wait_time(model_id, region, tokens, now)
+            if wait > 0:
+                waits.append(wait)
+            elif self._window(model_id, region).blocked_until > now:
+                cooling = cooling or region
+            else:
+                return region, 0.0
+        if cooling:
+            return cooling, 0.0
+        return None, min(waits)
+
+    def try_reserve(self, model_id: str, regions: Sequence[str], tokens: int) -> Tuple[Optional[str], Optional[list], float]:
+        """
+        Reserve `tokens` in the first region (in preference order) that has room.
+        Returns (region, ticket, 0) on success, else (None, None, shortest wait).
+        """
+        now = time.monotonic()
+        with self.lock:
+            region, wait = self._pick(model_id, regions, tokens, now)
+            if region is None:
+                return None, None, wait
+            return region, self._reserve(model_id, region, tokens, now), 0.0
+
+    def headroom_wait(self, model_id: str, regions: Sequence[str], tokens: int) -> float:
+        """Seconds until some region in `regions` has room for `tokens` (0 = now); reserves nothing."""
+        with self.lock:
+            return self._pick(model_id, regions, tokens, time.monotonic())[1]
+
+    def _reserve(self, model_id: str, region: str, tokens: int, now: float) -> list:
+        window = self._window(model_id, region)
+        ticket = [now, tokens]
+        window.entries.append(ticket)
+        window.tokens += tokens
+        self._export(model_id, region, window)
+        return ticket
+
+    def settle(self, model_id: str, region: str, ticket: list, actual_tokens: int) -> None:
+        """Replace a reservation's estimate with the tokens actually used."""
+        with self.lock:
+            window = self._window(model_id, region)
+            if window.entries and window.entries[0][0] <= ticket[0]:
+                # Still inside the window (not trimmed yet)
+                window.tokens += actual_tokens - ticket[1]
+            ticket[1] = actual_tokens
+            self._export(model_id, region, window)
+
+    def throttled(self, model_id: str, region: str) -> None:
+        """Vertex returned 429: prefer other regions for this model for a cooldown."""
+        with self.lock:
+            self._window(model_id, region).blocked_until = time.monotonic() + QUOTA_THROTTLE_COOLDOWN_S
+        metrics.incr(f"llm.quota.throttled.{model_id}.{region}")
+        logging.warning(f"[QuotaGovernor] 429 from {model_id} in {region}; avoiding it for {QUOTA_THROTTLE_COOLDOWN_S}s")
+
+    def _export(self, model_id: str, region: str, window: _Window) -> None:
+        rpm, tpm = self.limits(model_id, region)
+        if rpm:
+            metrics.set_gauge(f"llm.quota.rpm_headroom.{model_id}.{region}", round(1 - len(window.entries) / rpm, 3))
+        if tpm:
+            metrics.set_gauge(f"llm.quota.tpm_headroom.{model_id}.{region}", round(1 - window.tokens / tpm, 3))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        usage = {}
+        with self.lock:
+            for (model_id, region), window in self.windows.items():
+                window.trim(now)
+                rpm, tpm = self.limits(model_id, region)
+                usage[f"{model_id}@{region}"] = {
+                    "requests": len(window.entries), "tokens": window.tokens,
+                    "rpm_limit": rpm, "tpm_limit": tpm,
+                    "blocked_s": round(max(0.0, window.blocked_until - now), 1),
+                }
+        return usage
+
+    def candidates(self, region: str, regions: Sequence[str]) -> List[str]:
+        """`region` first, then the other configured regions to reroute to."""
+        return [region] + [r for r in regions if r != region]
+
+    def reserve(self, model_id: str, region: str, tokens: int, regions: Sequence[str] = ()) -> Tuple[Optional[str], Optional[list]]:
+        """Reserve quota now if any candidate region has room, else (None, None); never waits."""
+        chosen, ticket, _ = self.try_reserve(model_id, self.candidates(region, regions), tokens)
+        if ticket is not None and chosen != region:
+            metrics.incr("llm.quota.rerouted")
+        return chosen, ticket
+
+    async def pace(self, model_id: str, region: str, tokens: int, budget_s: float, regions: Sequence[str] = ()) -> None:
+        """
+        Sleep until a candidate region has room for `tokens`, without reserving
+        it, so a caller can pace before taking a scarce slot. Raises
+        QuotaWaitTimeout if that is more than `budget_s` away.
+        """
+        deadline = time.monotonic() + budget_s
+        candidates = self.candidates(region, regions)
+        while True:
+            wait = self.headroom_wait(model_id, candidates, tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                metrics.incr("llm.quota.rejected")
+                raise QuotaWaitTimeout(f"No {model_id} quota headroom within {budget_s:.1f}s")
+            metrics.incr("llm.quota.paced")
+            metrics.observe("llm.quota.pace_ms", wait * 1000)
+            await asyncio.sleep(wait)
+
+    async def acquire(self, model_id: str, region: str, tokens: int, budget_s: float, regions: Sequence[str] = ()) -> Tuple[str, list]:
+        """Reserve quota for a call, rerouting among `regions` or pacing up to `budget_s`."""
+        deadline = time.monotonic() + budget_s
+        candidates = self.candidates(region, regions)
+        while True:
+            chosen, ticket, wait = self.try_reserve(model_id, candidates, tokens)
+            if ticket is not None:
+                if chosen != region:
+                    metrics.incr("llm.quota.rerouted")
+                return chosen, ticket
+            if time.monotonic() + wait > deadline:
+                metrics.incr("llm.quota.rejected")
+                raise QuotaWaitTimeout(f"No {model_id} quota headroom within {budget_s:.1f}s")
+            metrics.incr("llm.quota.paced")
+            metrics.observe("llm.quota.pace_ms", wait * 1000)
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, model_id: str, region: str, tokens: int, budget_s: float, regions: Sequence[str] = ()) -> Tuple[str, list]:
+        """Blocking variant of `acquire` for the sync client."""
+        deadline = time.monotonic() + budget_s
+        candidates = self.candidates(region, regions)
+        while True:
+            chosen, ticket, wait = self.try_reserve(model_id, candidates, tokens)
+            if ticket is not None:
+                if chosen != region:
+                    metrics.incr("llm.quota.rerouted")
+                return chosen, ticket
+            if time.monotonic() + wait > deadline:
+                metrics.incr("llm.quota.rejected")
+                raise QuotaWaitTimeout(f"No {model_id} quota headroom within {budget_s:.1f}s")
+            metrics.incr("llm.quota.paced")
+            time.sleep(wait)
+
+quota_governor = QuotaGovernor()
@@ -0,0 +1,173 @@
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Query
+from fastapi.responses import Response, StreamingResponse
+import os
+import re
+import hashlib
+import logging
+from uuid import uuid4
+from typing import AsyncIterator, Optional, Tuple
+from quest_tools import update_server_fields
+from image_pipeline import ImagePipeline
+
+router = APIRouter()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+PHOTO_MAX_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(15 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+# Content-addressed files never change, so clients and CDNs can cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/heic": "heic",
+    "image/heif": "heif",
+}
+EXTENSION_TYPES = {ext: content_type for content_type, ext in CONTENT_TYPES.items()}
+PHOTO_NAME_RE = re.compile(r"^[0-9a-f]{64}(?:_[a-z]+)?\.[a-z]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Thumbnails/renditions are built off the event loop after each upload
+image_pipeline = ImagePipeline(UPLOAD_DIR)
+
+def _extension_for(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in CONTENT_TYPES:
+        return CONTENT_TYPES[content_type]
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    if ext == "jpeg":
+        ext = "jpg"
+    if ext in EXTENSION_TYPES:
+        return ext
+    raise HTTPException(status_code=415, detail=f"Unsupported photo type: {content_type or filename}")
+
+async def store_photo_stream(chunks: AsyncIterator[bytes], ext: str) -> Tuple[str, bool]:
+    """
+    Write chunks to a temp file while hashing them, then move the file to
+    `<sha256>.<ext>`. Returns (file_name, created); duplicates are stored once.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid4().hex}")
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > PHOTO_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Photo too large (max {PHOTO_MAX_BYTES} bytes)")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        file_name = f"{digest.hexdigest()}.{ext}"
+        file_path = os.path.join(UPLOAD_DIR, file_name)
+        if os.path.exists(file_path):
+            return file_name, False
+        os.replace(tmp_path, file_path)
+        return file_name, True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def _upload_file_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def add_photo_to_session(session_id: str, photo_url: str) -> None:
+    """Append a photo URL to the session's quest_state.photos (once)."""
+    def add(quest_state):
+        photos = list(quest_state.get("photos") or [])
+        if photo_url not in photos:
+            photos.append(photo_url)
+        quest_state["photos"] = photos
+    await update_server_fields(session_id, add)
+
+async def _finish_upload(file_name: str, created: bool, session_id: Optional[str]) -> dict:
+    photo_url = f"/uploads/{file_name}"
+    logging.info(f"[upload_photo] Stored {photo_url} (new file: {created})")
+    if session_id:
+        await add_photo_to_session(session_id, photo_url)
+    image_pipeline.enqueue(file_name, session_id)
+    return {"url": photo_url, "deduplicated": not created}
+
+@router.post("/upload-photo")
+async def upload_photo(file: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    """Multipart upload; the file is copied to disk in chunks."""
+    ext = _extension_for(file.content_type, file.filename)
+    file_name, created = await store_photo_stream(_upload_file_chunks(file), ext)
+    return await _finish_upload(file_name, created, session_id)
+
+@router.put("/api/photos")
+async def upload_photo_raw(request: Request, session_id: Optional[str] = Query(None)):
+    """Raw-body upload (Content-Type: image/*); the request body is streamed straight to disk."""
+    ext = _extension_for(request.headers.get("content-type"))
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > PHOTO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Photo too large (max {PHOTO_MAX_BYTES} bytes)")
+    file_name, created = await store_photo_stream(request.stream(), ext)
+    return await _finish_upload(file_name, created, session_id)
+
+@router.get("/api/photos/pipeline")
+async def photo_pipeline_stats():
+    return image_pipeline.snapshot()
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+@router.get("/uploads/{file_name}")
+async def get_photo(file_name: str, request: Request):
+    if not PHOTO_NAME_RE.match(file_name):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    file_path = os.path.join(UPLOAD_DIR, file_name)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    etag = f'"{file_name.split(".")[0]}"'
+    headers = {
+        "Cache-Control": CACHE_CONTROL,
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(file_path)
+    media_type = EXTENSION_TYPES.get(file_name.rsplit(".", 1)[-1], "application/octet-stream")
+    range_header = request.headers.get("range")
+    if range_header:
+        match = RANGE_RE.match(range_header.strip())
+        if not match or match.groups() == ("", ""):
+            raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+        first, last = match.groups()
+        if first == "":
+            # Suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(_iter_file(file_path, start, length), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(file_path, 0, size), media_type=media_type, headers=headers)
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, Path, Request
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from pydantic import BaseModel
 import os
 import requests
 from typing import List, Optional, Any, Dict
 import logging
-from quest_tools import load_session
+import time
+import serialization
+from quest_tools import load_session, load_sessions
+from quest_indexes import QUEST_RECORDS, geo_index, semantic_index, text_index, quest_key, index_quest, match_quest, percolate_quest
+from geo_index import to_km
+from taxonomy_index import taxonomy_index
+from quest_schema import QuestCreateRequestBase, SESSION_ONLY_FIELDS
+from supabase_client import supabase_request, CircuitOpenError, SUPABASE_BREAKER_RESET_S
 
 router = APIRouter()
 
@@ -12,87 +19,50 @@ SUPABASE_API = os.getenv("SUPABASE_API")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 
-class QuestState(BaseModel):
-    # Core fields
-    want_or_have: Optional[str] = None
-    description: Optional[str] = None
-    general_location: Optional[str] = None
-    location_confirmed: Optional[bool] = None
-    lat: Optional[float] = None
-    lng: Optional[float] = None
-    location: Optional[List[float]] = None  # [lng, lat]
-    distance: Optional[float] = None
-    distance_unit: Optional[str] = None
-    price: Optional[float] = None
-    photos: Optional[List[str]] = Field(default_factory=list)
-    action: Optional[str] = None
-    text: Optional[str] = None
-    ui: Optional[dict] = None
-    # For Sale specific
-    condition: Optional[str] = None
-    title: Optional[str] = None
-    # Housing specific
-    property_type: Optional[str] = None
-    budget: Optional[float] = None
-    move_in_date: Optional[str] = None
-    # Jobs specific
-    job_role: Optional[str] = None
-    employment_type: Optional[str] = None
-    industry: Optional[str] = None
-    experience_level: Optional[str] = None
-    work_location: Optional[str] = None
-    resume_uploaded: Optional[bool] = None
-    # Services specific
-    service_type: Optional[str] = None
-    timeframe: Optional[str] = None
-    qualifications: Optional[str] = None
-    # Community specific
-    activity: Optional[str] = None
-    date_time: Optional[str] = None
-    meetup_location: Optional[str] = None
-    group_size: Optional[int] = None
-    cost: Optional[float] = None
-    # Gigs specific
-    gig_type: Optional[str] = None
-    duration: Optional[str] = None
-    pay_rate: Optional[float] = None
-    portfolio: Optional[List[str]] = None
-
-class QuestCreateRequest(BaseModel):
-    # Required fields
+class QuestCreateRequest(QuestCreateRequestBase):
     quest_id: str
-    want_or_have: Optional[str] = None
-    description: Optional[str] = None
-    
-    # Optional fields that we want to save
-    general_location: Optional[str] = None
-    lat: Optional[float] = None
-    lng: Optional[float] = None
-    distance: Optional[float] = None
-    photos: Optional[List[str]] = Field(default_factory=list)
-    
-    # Category-specific fields
-    condition: Optional[str] = None
-    property_type: Optional[str] = None
-    budget: Optional[float] = None
-    move_in_date: Optional[str] = None
-    job_role: Optional[str] = None
-    employment_type: Optional[str] = None
-    industry: Optional[str] = None
-    experience_level: Optional[str] = None
-    work_location: Optional[str] = None
-    service_type: Optional[str] = None
-    timeframe: Optional[str] = None
-    qualifications: Optional[str] = None
-    activity: Optional[str] = None
-    date_time: Optional[str] = None
-    meetup_location: Optional[str] = None
-    group_size: Optional[int] = None
-    cost: Optional[float] = None
-    gig_type: Optional[str] = None
-    duration: Optional[str] = None
-    pay_rate: Optional[float] = None
-    portfolio: Optional[List[str]] = None
+
+def build_quest_payload(
+    quest_state: Dict[str, Any],
+    request_data: Dict[str, Any],
+    general_category: str,
+    sub_category: str,
+    quest_id: str
+) -> Dict[str, Any]:
+    """Merge the validated session state with request data into a `quests` row."""
+    # Start with validated quest state; conversation bookkeeping has no column
+    data = {
+        key: value for key, value in {**quest_state, **request_data}.items()
+        if key not in SESSION_ONLY_FIELDS
+    }
+    data.update({
+        "general_category": general_category,  # Add categories from session
+        "sub_category": sub_category,
+        "quest_id": quest_id
+    })
+    # Remove UI and other non-database fields
+    data.pop("ui", None)
+    data.pop("location", None)
+    # Renditions live in the session only; their URLs derive from the photo names
+    data.pop("photo_renditions", None)
+
+    if "lat" in data and "lng" in data and data["lat"] is not None and data["lng"] is not None:
+        data["location"] = f'POINT({data["lng"]} {data["lat"]})'
+    return data
+
+def insert_quests(rows: List[Dict[str, Any]]) -> requests.Response:
+    """
+    Upsert one or more rows into `quests` in a single request, keyed on quest_id
+    (unique in `quests`), so re-sending a row that already landed - a retry
+    after a timeout - updates it instead of adding a duplicate quest.
+    """
+    # PostgREST needs the full column list when rows don't share the same keys
+    columns = ",".join(sorted({key for row in rows for key in row}))
+    return supabase_request(
+        "POST", f"quests?columns={columns}&on_conflict=quest_id",
+        prefer="resolution=merge-duplicates,return=representation",
+        json=rows  # Supabase expects a list of records
+    )
 
 @router.post("/api/quests/save")
 async def create_quest(request: QuestCreateRequest):
@@ -114,65 +84,223 @@ async def create_quest(request: QuestCreateRequest):
             raise HTTPException(status_code=400, detail="Quest categories not found in session")
         
         # Merge request data with validated quest state
-        data = {
-            **quest_state,  # Start with validated quest state
-            **request.model_dump(exclude_unset=True),
-            "general_category": general_category,  # Add categories from session
-            "sub_category": sub_category,
-            "quest_id": request.quest_id
-        }
-        logging.info(f"DATA: {data}")
-        # Remove UI and other non-database fields
-        data.pop("ui", None)
-        data.pop("action", None)
-        data.pop("text", None)
-        data.pop("location", None)
+        data = build_quest_payload(
+            quest_state,
+            request.model_dump(exclude_unset=True),
+            general_category,
+            sub_category,
+            request.quest_id
+        )
         logging.info(f"DATA: {data}")
 
-        if "lat" in data and "lng" in data and data["lat"] is not None and data["lng"] is not None:
-            data["location"] = f'POINT({data["lng"]} {data["lat"]})'
-
-        
-        response = requests.post(
-            f"{SUPABASE_API}/rest/v1/quests",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            },
-            json=[data]  # Supabase expects a list of records
-        )
+        response = insert_quests([data])
         if response.status_code not in (200, 201):
             raise HTTPException(status_code=500, detail=f"Supabase error: {response.text}")
-        return {"success": True, "quest": response.json()[0]}
+        quest = serialization.loads(response.content)[0]
+        index_quest(quest)
+        percolate_quest(quest)
+        return {"success": True, "quest": quest}
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Quest storage temporarily unavailable", headers={"Retry-After": str(int(SUPABASE_BREAKER_RESET_S))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save quest: {str(e)}")
 
+QUEST_INSERT_CHUNK = int(os.getenv("QUEST_INSERT_CHUNK", "200"))
+QUEST_BULK_MAX = int(os.getenv("QUEST_BULK_MAX", "1000"))
+
+class QuestBulkCreateRequest(BaseModel):
+    quests: List[QuestCreateRequest]
+
+@router.post("/api/quests/save/batch")
+async def create_quests_bulk(request: QuestBulkCreateRequest):
+    """
+    Publish many quests at once. Sessions are loaded with a single `in.(...)` query
+    and rows are inserted in chunked multi-row requests. Failures are reported per quest.
+    """
+    if not request.quests:
+        raise HTTPException(status_code=400, detail="No quests provided")
+    if len(request.quests) > QUEST_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Too many quests (max {QUEST_BULK_MAX})")
+    logging.info(f"[create_quests_bulk] Saving {len(request.quests)} quests")
+
+    saved: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+    try:
+        sessions = await load_sessions([q.quest_id for q in request.quests])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load sessions: {str(e)}")
+
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for quest in request.quests:
+        session = sessions.get(quest.quest_id, {})
+        general_category = session.get("general_category")
+        sub_category = session.get("sub_category")
+        if not general_category or not sub_category:
+            failed.append({"quest_id": quest.quest_id, "error": "Quest categories not found in session"})
+            continue
+        # One row per quest_id: an upsert can't touch the same row twice in one request
+        payloads[quest.quest_id] = build_quest_payload(
+            session.get("quest_state", {}),
+            quest.model_dump(exclude_unset=True),
+            general_category,
+            sub_category,
+            quest.quest_id
+        )
+
+    rows = list(payloads.values())
+    for start in range(0, len(rows), QUEST_INSERT_CHUNK):
+        chunk = rows[start:start + QUEST_INSERT_CHUNK]
+        try:
+            response = insert_quests(chunk)
+            if response.status_code in (200, 201):
+                saved.extend(serialization.loads(response.content))
+                continue
+            logging.error(f"[create_quests_bulk] Chunk insert failed: {response.text}")
+        except Exception as e:
+            logging.error(f"[create_quests_bulk] Chunk insert error: {e}")
+        # One bad row fails the whole chunk; retry rows individually to isolate it.
+        # A timed-out chunk may have been written anyway; the upsert makes resending safe.
+        for row in chunk:
+            try:
+                response = insert_quests([row])
+                if response.status_code in (200, 201):
+                    saved.extend(serialization.loads(response.content))
+                else:
+                    failed.append({"quest_id": row["quest_id"], "error": f"Supabase error: {response.text}"})
+            except Exception as e:
+                failed.append({"quest_id": row["quest_id"], "error": str(e)})
+
+    for quest in saved:
+        index_quest(quest)
+    # Index the whole batch first so wants and haves published together can match
+    for quest in saved:
+        percolate_quest(quest)
+    return {"success": not failed, "saved": saved, "failed": failed}
+
 class QuestUpdateRequest(BaseModel):
     updates: Dict[str, Any]
 
+NEARBY_MAX_RADIUS_KM = float(os.getenv("NEARBY_MAX_RADIUS_KM", "500"))
+# Weakest description similarity still offered as a search result
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.35"))
+
+@router.get("/api/quests/nearby")
+async def nearby_quests(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(10, gt=0),
+    unit: str = Query("mi", pattern="^(mi|km)$"),
+    general_category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Find quests within `radius` of a point, nearest first, from the in-memory geo index."""
+    radius_km = to_km(radius, unit)
+    if radius_km > NEARBY_MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"Radius too large (max {NEARBY_MAX_RADIUS_KM} km)")
+    general_category, sub_category = taxonomy_index.filter_categories(general_category, sub_category)
+    start = time.perf_counter()
+    hits = geo_index.query(lat, lng, radius_km, general_category, sub_category, limit)
+    took_ms = (time.perf_counter() - start) * 1000
+    quests = [
+        {**QUEST_RECORDS[key], "distance_km": round(distance, 3)}
+        for key, distance in hits if key in QUEST_RECORDS
+    ]
+    return {"count": len(quests), "took_ms": round(took_ms, 3), "quests": quests}
+
+@router.get("/api/quests/search")
+async def search_quests(
+    q: str = Query(..., min_length=1),
+    general_category: Optional[str] = None,
+    sub_category: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius: float = Query(10, gt=0),
+    unit: str = Query("mi", pattern="^(mi|km)$"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Full-text quest search (BM25 over title, description and category fields),
+    optionally limited to a category and/or a radius around lat/lng. When
+    keyword hits run short, semantically similar quests fill the remaining slots.
+    """
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    general_category, sub_category = taxonomy_index.filter_categories(general_category, sub_category)
+    start = time.perf_counter()
+    distances = None
+    if lat is not None:
+        radius_km = to_km(radius, unit)
+        if radius_km > NEARBY_MAX_RADIUS_KM:
+            raise HTTPException(status_code=400, detail=f"Radius too large (max {NEARBY_MAX_RADIUS_KM} km)")
+        distances = dict(geo_index.query(lat, lng, radius_km, general_category, sub_category))
+
+    def wanted(key: str) -> bool:
+        record = QUEST_RECORDS.get(key)
+        if record is None or (distances is not None and key not in distances):
+            return False
+        if general_category and record.get("general_category") != general_category:
+            return False
+        return not sub_category or record.get("sub_category") == sub_category
+
+    candidates = set(distances) if distances is not None else None
+    quests = []
+    for key, score in text_index.search(q, limit, general_category, sub_category, candidates):
+        if key in QUEST_RECORDS:
+            quests.append({**QUEST_RECORDS[key], "text_score": round(score, 4)})
+    if len(quests) < limit:
+        seen = {quest_key(quest) for quest in quests}
+        # Over-fetch so filtering still leaves enough semantic results
+        for key, similarity in semantic_index.search(q, limit * 5, candidates):
+            if similarity < SEARCH_MIN_SIMILARITY:
+                break
+            if key in seen or not wanted(key):
+                continue
+            quests.append({**QUEST_RECORDS[key], "semantic_score": round(similarity, 4)})
+            if len(quests) == limit:
+                break
+    if distances is not None:
+        for quest in quests:
+            quest["distance_km"] = round(distances[quest_key(quest)], 3)
+    took_ms = (time.perf_counter() - start) * 1000
+    return {"count": len(quests), "took_ms": round(took_ms, 3), "quests": quests}
+
+@router.get("/api/quests/{quest_id}/matches")
+async def quest_matches(quest_id: str = Path(...), k: int = Query(20, ge=1, le=100)):
+    """Top-k compatible quests (want <-> have) for an indexed quest."""
+    if quest_id not in QUEST_RECORDS:
+        raise HTTPException(status_code=404, detail="Quest not found")
+    start = time.perf_counter()
+    matches = match_quest(quest_id, k)
+    took_ms = (time.perf_counter() - start) * 1000
+    return {
+        "count": len(matches),
+        "took_ms": round(took_ms, 3),
+        "matches": [
+            {**QUEST_RECORDS[m["key"]], "match_score": m["score"], "semantic_score": m["semantic"], "distance_km": m["distance_km"]}
+            for m in matches if m["key"] in QUEST_RECORDS
+        ]
+    }
+
 @router.put("/api/quests/{quest_id}")
 async def update_quest(quest_id: str = Path(...), request: QuestUpdateRequest = None):
     if not request or not request.updates:
         raise HTTPException(status_code=400, detail="No update fields provided")
     try:
-        response = requests.patch(
-            f"{SUPABASE_API}/rest/v1/quests?id=eq.{quest_id}",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            },
+        response = supabase_request(
+            "PATCH", f"quests?id=eq.{quest_id}",
+            prefer="return=representation",
             json=request.updates
         )
         if response.status_code not in (200, 201):
             raise HTTPException(status_code=500, detail=f"Supabase error: {response.text}")
-        updated = response.json()
+        updated = serialization.loads(response.content)
         if not updated:
             raise HTTPException(status_code=404, detail="Quest not found or not updated")
+        index_quest(updated[0])
         return {"success": True, "quest": updated[0]}
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Quest storage temporarily unavailable", headers={"Retry-After": str(int(SUPABASE_BREAKER_RESET_S))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update quest: {str(e)}")
 
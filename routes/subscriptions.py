@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Path, Query
+from pydantic import BaseModel, Field
+import logging
+from typing import Optional
+from quest_indexes import percolator, notifier
+from percolator import saved_search_subscription
+from supabase_client import supabase_request, CircuitOpenError, SUPABASE_BREAKER_RESET_S
+from taxonomy_index import taxonomy_index
+
+router = APIRouter()
+
+def _storage_unavailable() -> HTTPException:
+    # Same answer as the quest routes while the Supabase breaker is open
+    return HTTPException(status_code=503, detail="Quest storage temporarily unavailable", headers={"Retry-After": str(int(SUPABASE_BREAKER_RESET_S))})
+
+class SavedSearchRequest(BaseModel):
+    session_id: str
+    query: Optional[str] = None
+    general_category: Optional[str] = None
+    sub_category: Optional[str] = None
+    want_or_have: Optional[str] = Field(None, pattern="^(want|have)$")
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
+    radius: Optional[float] = Field(None, gt=0)
+    unit: str = Field("mi", pattern="^(mi|km)$")
+    max_price: Optional[float] = Field(None, ge=0)
+
+@router.post("/api/saved-searches")
+async def create_saved_search(request: SavedSearchRequest):
+    """Save a standing search; newly saved quests that satisfy it are queued as notifications."""
+    if (request.lat is None) != (request.lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    if not (request.query or request.general_category or request.sub_category):
+        raise HTTPException(status_code=400, detail="A saved search needs a query or a category")
+    request.general_category, request.sub_category = taxonomy_index.filter_categories(request.general_category, request.sub_category)
+    try:
+        response = supabase_request("POST", "saved_searches", prefer="return=representation", json=request.model_dump())
+    except CircuitOpenError:
+        raise _storage_unavailable()
+    if response.status_code not in (200, 201):
+        raise HTTPException(status_code=500, detail=f"Supabase error: {response.text}")
+    row = response.json()[0]
+    percolator.upsert(saved_search_subscription(row))
+    logging.info(f"[create_saved_search] Saved search {row['id']} for session {request.session_id}")
+    return {"success": True, "saved_search": row}
+
+@router.delete("/api/saved-searches/{search_id}")
+async def delete_saved_search(search_id: str = Path(...)):
+    try:
+        response = supabase_request("DELETE", f"saved_searches?id=eq.{search_id}")
+    except CircuitOpenError:
+        raise _storage_unavailable()
+    if response.status_code not in (200, 204):
+        raise HTTPException(status_code=500, detail=f"Supabase error: {response.text}")
+    percolator.remove(f"search:{search_id}")
+    return {"success": True}
+
+@router.get("/api/notifications")
+async def get_notifications(session_id: str = Query(...)):
+    """Pending match notifications for a session; returned notifications are cleared."""
+    notifications = notifier.drain_inbox(session_id)
+    return {"count": len(notifications), "notifications": notifications}
+
+@router.get("/api/notifications/stats")
+async def notification_stats():
+    return {**notifier.snapshot(), "subscriptions": len(percolator)}
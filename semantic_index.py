@@ -0,0 +1,290 @@
+import os
+import re
+import zlib
+import fcntl
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# === LOCAL SEMANTIC SIMILARITY ===
+# CPU-only text vectors for quest descriptions: hashed character n-grams plus
+# word unigrams/bigrams, after a small bundled synonym table folds common
+# variants ("road bike" -> "bicycle"). Vectors live in a memory-mapped file;
+# random-hyperplane LSH tables give approximate nearest neighbours that are
+# re-ranked by exact cosine similarity. Rows are allocated from the in-memory
+# key list, so a file has exactly one writer: open() takes an exclusive lock
+# on `<path>.lock` and a second process stays in memory instead.
+
+SEMANTIC_DIM = 256
+SEMANTIC_INDEX_PATH = os.getenv("SEMANTIC_INDEX_PATH", "data/semantic_index.f32")
+LSH_TABLES = int(os.getenv("SEMANTIC_LSH_TABLES", "12"))
+LSH_BITS = int(os.getenv("SEMANTIC_LSH_BITS", "10"))
+NGRAM_SIZES = (3, 4, 5)
+WORD_WEIGHT = 2.0
+
+# Folded before hashing so variants share features
+SYNONYMS = {
+    "bike": "bicycle", "bikes": "bicycle", "cycle": "bicycle", "ebike": "bicycle electric",
+    "couch": "sofa", "couches": "sofa", "sectional": "sofa",
+    "apt": "apartment", "flat": "apartment", "studio": "apartment studio",
+    "tv": "television", "telly": "television",
+    "laptop": "computer laptop", "notebook": "computer laptop", "pc": "computer", "macbook": "computer laptop apple",
+    "phone": "cellphone", "iphone": "cellphone apple", "smartphone": "cellphone",
+    "car": "vehicle", "truck": "vehicle truck", "suv": "vehicle", "sedan": "vehicle",
+    "guitar": "guitar instrument", "piano": "piano instrument", "keyboard": "keyboard instrument",
+    "lessons": "lesson", "tutor": "lesson teacher", "tutoring": "lesson teacher", "teacher": "lesson teacher",
+    "dog": "pet dog", "cat": "pet cat", "puppy": "pet dog", "kitten": "pet cat",
+    "walker": "walking", "sitter": "sitting", "babysitter": "childcare sitting", "nanny": "childcare",
+    "movers": "moving", "mover": "moving", "cleaner": "cleaning", "cleaners": "cleaning",
+    "desk": "desk table", "standing": "standing adjustable",
+    "room": "room bedroom", "bedroom": "room bedroom", "br": "bedroom",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _tokens(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        tokens.extend(SYNONYMS.get(token, token).split())
+    return tokens
+
+def _bucket(feature: str) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode("utf-8"))
+    # Low bits pick the dimension, one high bit picks the sign
+    return h % SEMANTIC_DIM, (1.0 if (h >> 31) & 1 else -1.0)
+
+def embed(text: str) -> np.ndarray:
+    """Unit-length float32 vector for `text` (all zeros if there are no tokens)."""
+    vector = np.zeros(SEMANTIC_DIM, dtype=np.float32)
+    tokens = _tokens(text)
+    for i, token in enumerate(tokens):
+        dim, sign = _bucket(f"w:{token}")
+        vector[dim] += sign * WORD_WEIGHT
+        if i:
+            dim, sign = _bucket(f"b:{tokens[i - 1]}_{token}")
+            vector[dim] += sign
+        padded = f"#{token}#"
+        for n in NGRAM_SIZES:
+            for j in range(len(padded) - n + 1):
+                dim, sign = _bucket(padded[j:j + n])
+                vector[dim] += sign
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticIndex:
+    """Incremental ANN index over quest vectors, persisted to a memory-mapped file."""
+
+    def __init__(self, path: Optional[str] = SEMANTIC_INDEX_PATH, tables: int = LSH_TABLES, bits: int = LSH_BITS, seed: int = 13):
+        self.tables = tables
+        self.bits = bits
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables * bits, SEMANTIC_DIM)).astype(np.float32)
+        self.bit_weights = (1 << np.arange(bits)).astype(np.int64)
+        self.buckets: List[Dict[int, set]] = [{} for _ in range(tables)]
+        self.keys: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.codes: List[Optional[np.ndarray]] = []
+        self.text_hashes: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.capacity = 0
+        self.vectors = np.zeros((0, SEMANTIC_DIM), dtype=np.float32)
+        self._writer_lock = None
+        self.path = None
+        if path:
+            self.open(path)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # --- storage ---
+    def _keys_path(self) -> str:
+        return f"{self.path}.keys"
+
+    def open(self, path: str) -> bool:
+        """
+        Load `path` and become its only writer. Returns False, and keeps the
+        index in memory, when another process already holds the file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        writer_lock = open(f"{path}.lock", "w")
+        try:
+            fcntl.flock(writer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            writer_lock.close()
+            logging.warning(f"[SemanticIndex] {path} is open in another process; this index stays in memory")
+            return False
+        with self.lock:
+            self._writer_lock = writer_lock
+            self.path = path
+            self.buckets = [{} for _ in range(self.tables)]
+            self._open()
+        return True
+
+    def close(self) -> None:
+        """Flush and give up the file; the index is empty afterwards."""
+        with self.lock:
+            self.flush()
+            self.buckets = [{} for _ in range(self.tables)]
+            self.keys, self.rows, self.codes, self.text_hashes = [], {}, [], {}
+            self.vectors = np.zeros((0, SEMANTIC_DIM), dtype=np.float32)
+            self.capacity = 0
+            self.path = None
+            if self._writer_lock:
+                self._writer_lock.close()
+                self._writer_lock = None
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        keys: List[Optional[str]] = []
+        hashes: Dict[str, int] = {}
+        if os.path.exists(self._keys_path()):
+            # Append-only log of "row<TAB>key<TAB>text hash"; later lines win
+            with open(self._keys_path()) as f:
+                for line in f:
+                    row, key, text_hash = (line.rstrip("\n").split("\t") + ["", ""])[:3]
+                    row = int(row)
+                    while len(keys) <= row:
+                        keys.append(None)
+                    keys[row] = key or None
+                    if key:
+                        hashes[key] = int(text_hash or 0)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        rows_on_disk = size // (SEMANTIC_DIM * 4)
+        keys = keys[:rows_on_disk]
+        self._map(max(1024, rows_on_disk))
+        self.keys = keys
+        self.rows = {key: row for row, key in enumerate(keys) if key is not None}
+        self.text_hashes = {key: hashes.get(key, 0) for key in self.rows}
+        self.codes = [None] * len(keys)
+        if self.rows:
+            live = np.array(sorted(self.rows.values()))
+            for row, code in zip(live, self._hash(self.vectors[live])):
+                self._add_to_buckets(int(row), code)
+        logging.info(f"[SemanticIndex] Loaded {len(self.rows)} vectors from {self.path}")
+
+    def _map(self, capacity: int) -> None:
+        if self.path:
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+                del self.vectors
+            with open(self.path, "ab") as f:
+                f.truncate(capacity * SEMANTIC_DIM * 4)
+            self.vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, SEMANTIC_DIM))
+        else:
+            grown = np.zeros((capacity, SEMANTIC_DIM), dtype=np.float32)
+            grown[:len(self.keys)] = self.vectors[:len(self.keys)]
+            self.vectors = grown
+        self.capacity = capacity
+
+    def flush(self) -> None:
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+
+    def _log_key(self, row: int, key: Optional[str], text_hash: int = 0) -> None:
+        if self.path:
+            with open(self._keys_path(), "a") as f:
+                f.write(f"{row}\t{key or ''}\t{text_hash}\n")
+
+    # --- LSH ---
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, tables) bucket ids from the sign of each hyperplane projection."""
+        bits = (np.asarray(vectors) @ self.planes.T) > 0
+        return bits.reshape(len(vectors), self.tables, self.bits).astype(np.int64) @ self.bit_weights
+
+    def _add_to_buckets(self, row: int, code: np.ndarray) -> None:
+        self.codes[row] = code
+        for t, bucket_id in enumerate(code):
+            self.buckets[t].setdefault(int(bucket_id), set()).add(row)
+
+    def _remove_from_buckets(self, row: int) -> None:
+        code = self.codes[row]
+        if code is None:
+            return
+        for t, bucket_id in enumerate(code):
+            bucket = self.buckets[t].get(int(bucket_id))
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del self.buckets[t][int(bucket_id)]
+        self.codes[row] = None
+
+    # --- public API ---
+    def upsert(self, key: str, text: str) -> None:
+        """Add or refresh a quest's vector; unchanged text (e.g. on restart) is skipped."""
+        text_hash = zlib.crc32((text or "").encode("utf-8")) + 1
+        if self.text_hashes.get(key) == text_hash:
+            return
+        vector = embed(text)
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                row = len(self.keys)
+                if row >= self.capacity:
+                    self._map(self.capacity * 2)
+                self.keys.append(key)
+                self.codes.append(None)
+                self.rows[key] = row
+            else:
+                self._remove_from_buckets(row)
+            self.text_hashes[key] = text_hash
+            self._log_key(row, key, text_hash)
+            self.vectors[row] = vector
+            if np.any(vector):
+                self._add_to_buckets(row, self._hash(vector[None, :])[0])
+
+    def remove(self, key: str) -> None:
+        with self.lock:
+            row = self.rows.pop(key, None)
+            self.text_hashes.pop(key, None)
+            if row is None:
+                return
+            self._remove_from_buckets(row)
+            self.keys[row] = None
+            self._log_key(row, None)
+
+    def vector(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        return np.array(self.vectors[row]) if row is not None else None
+
+    def similarity(self, key: str, other_keys: List[str]) -> Dict[str, float]:
+        """Cosine similarity between one indexed quest and others (missing -> 0)."""
+        with self.lock:
+            row = self.rows.get(key)
+            rows = [self.rows.get(k) for k in other_keys]
+            if row is None:
+                return {k: 0.0 for k in other_keys}
+            present = [(k, r) for k, r in zip(other_keys, rows) if r is not None]
+            sims = self.vectors[[r for _, r in present]] @ self.vectors[row] if present else []
+        result = {k: 0.0 for k in other_keys}
+        result.update({k: float(s) for (k, _), s in zip(present, sims)})
+        return result
+
+    def search(self, text: str, k: int = 10, candidates: Optional[set] = None, exact: bool = False) -> List[Tuple[str, float]]:
+        """
+        Nearest quests to `text` by cosine similarity. LSH buckets (plus a
+        one-bit multi-probe) propose candidates that are re-ranked exactly;
+        `exact=True` scans every vector. `candidates` restricts results to those keys.
+        """
+        query = embed(text)
+        if not np.any(query):
+            return []
+        with self.lock:
+            if exact:
+                rows = np.array(sorted(self.rows.values()), dtype=np.int64)
+            else:
+                code = self._hash(query[None, :])[0]
+                found = set()
+                for t, bucket_id in enumerate(code):
+                    bucket_id = int(bucket_id)
+                    found |= self.buckets[t].get(bucket_id, set())
+                    for bit in range(self.bits):
+                        found |= self.buckets[t].get(bucket_id ^ (1 << bit), set())
+                rows = np.fromiter(found, dtype=np.int64, count=len(found))
+            if candidates is not None:
+                rows = np.array([r for r in rows if self.keys[r] in candidates], dtype=np.int64)
+            if len(rows) == 0:
+                return []
+            sims = self.vectors[rows] @ query
+            top = np.argsort(-sims)[:k]
+            return [(self.keys[rows[i]], float(sims[i])) for i in top if self.keys[rows[i]] is not None]
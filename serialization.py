@@ -0,0 +1,66 @@
+import os
+import json
+import logging
+from typing import Any, Union
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is used instead
+    orjson = None
+
+# === JSON SERIALIZATION ===
+# One place for JSON encoding/decoding across the app: API responses, Supabase
+# request bodies, prompt payloads and Gemini output. Uses orjson when
+# installed (several times faster, emits bytes), else the stdlib.
+#
+# Output is compact either way (no spaces after separators, UTF-8 rather than
+# \u escapes), so the bytes don't change when orjson is added or removed.
+
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError subclasses it
+
+# Responses at least this large are gzip/brotli-compressed when the client accepts it
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_COMPRESS_LEVEL = int(os.getenv("RESPONSE_COMPRESS_LEVEL", "6"))
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys).encode()
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+def dumps(obj: Any, sort_keys: bool = False) -> str:
+    return dumps_bytes(obj, sort_keys).decode()
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: renders through `dumps_bytes` (orjson when available)."""
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+def add_compression(app) -> None:
+    """Compress responses above RESPONSE_COMPRESS_MIN_BYTES: brotli if brotli-asgi is installed (gzip fallback), else gzip."""
+    try:
+        from brotli_asgi import BrotliMiddleware
+    except ImportError:
+        BrotliMiddleware = None
+    if BrotliMiddleware is not None:
+        # Photos are already compressed and served with range requests
+        app.add_middleware(
+            BrotliMiddleware, minimum_size=RESPONSE_COMPRESS_MIN_BYTES, quality=4,
+            gzip_fallback=True, excluded_handlers=[r"/uploads/.*"]
+        )
+        logging.info(f"[add_compression] brotli/gzip responses >= {RESPONSE_COMPRESS_MIN_BYTES} B")
+    else:
+        from starlette.middleware.gzip import GZipMiddleware
+        # Images (photo uploads, range requests) are excluded by GZipMiddleware's defaults
+        app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESS_MIN_BYTES, compresslevel=RESPONSE_COMPRESS_LEVEL)
+        logging.info(f"[add_compression] gzip responses >= {RESPONSE_COMPRESS_MIN_BYTES} B")
@@ -0,0 +1,96 @@
+import os
+import zlib
+import base64
+import logging
+from typing import Any, Dict, Tuple
+import serialization
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is used instead
+    zstandard = None
+
+# === COMPACT SESSION ENCODING ===
+# Optionally store quest_state + chat_history as one compressed blob in the
+# `session_blob` text column of quest_sessions instead of two verbose JSON
+# columns. Blob layout (base64 for the JSON transport):
+#   byte 0: format version, byte 1: codec, rest: payload
+# Rows written before the blob existed (or with encoding off) still decode:
+# without a blob the plain columns are used as before, so the setting can be
+# flipped either way on a live table.
+#
+# Needs: alter table quest_sessions add column session_blob text;
+
+SESSION_ENCODING = os.getenv("SESSION_ENCODING", "json")  # json | zlib | zstd
+SESSION_COMPRESS_LEVEL = int(os.getenv("SESSION_COMPRESS_LEVEL", "3"))
+# Payloads below this many bytes are stored uncompressed inside the blob
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv("SESSION_COMPRESS_MIN_BYTES", "256"))
+
+FORMAT_VERSION = 1
+CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD = 0, 1, 2
+CODECS = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+if SESSION_ENCODING == "zstd" and zstandard is None:
+    logging.warning("[session_codec] SESSION_ENCODING=zstd but zstandard is not installed; using zlib")
+    SESSION_ENCODING = "zlib"
+
+def encoding_enabled() -> bool:
+    return SESSION_ENCODING in CODECS
+
+def _compress(raw: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=SESSION_COMPRESS_LEVEL).compress(raw)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(raw, SESSION_COMPRESS_LEVEL)
+    return raw
+
+def _decompress(payload: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Session blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_RAW:
+        return payload
+    raise ValueError(f"Unknown session codec {codec}")
+
+def encode_blob(quest_state: Dict[str, Any], chat_history: list, encoding: str = None) -> str:
+    """Pack quest_state and chat_history into a versioned, compressed, base64 blob."""
+    raw = serialization.dumps_bytes({"q": quest_state, "h": chat_history})
+    codec = CODECS.get(encoding or SESSION_ENCODING, CODEC_ZLIB)
+    if len(raw) < SESSION_COMPRESS_MIN_BYTES:
+        codec = CODEC_RAW
+    return base64.b64encode(bytes((FORMAT_VERSION, codec)) + _compress(raw, codec)).decode()
+
+def decode_blob(blob: str) -> Tuple[Dict[str, Any], list]:
+    data = base64.b64decode(blob)
+    version, codec = data[0], data[1]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported session blob version {version}")
+    payload = serialization.loads(_decompress(data[2:], codec))
+    return payload["q"], payload["h"]
+
+def encode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The quest_sessions row as sent to Supabase; unchanged when encoding is off."""
+    if not encoding_enabled():
+        return row
+    return {
+        **row,
+        "quest_state": {},
+        "chat_history": [],
+        "session_blob": encode_blob(row.get("quest_state", {}), row.get("chat_history", [])),
+    }
+
+def decode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """A quest_sessions row with quest_state/chat_history restored from its blob, if it has one."""
+    blob = row.get("session_blob")
+    # Encoded writes leave the plain columns empty; if they're filled, a plain
+    # write (encoding switched off again) came after the blob and wins
+    if not blob or row.get("chat_history") or row.get("quest_state"):
+        return row
+    quest_state, chat_history = decode_blob(blob)
+    decoded = {k: v for k, v in row.items() if k != "session_blob"}
+    decoded["quest_state"] = quest_state
+    decoded["chat_history"] = chat_history
+    return decoded
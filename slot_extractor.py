@@ -0,0 +1,164 @@
+import re
+import logging
+from typing import Dict, Any, Optional
+
+# === RULE-BASED SLOT PRE-EXTRACTION ===
+# Users often state price, distance and city in their first message
+# ("selling my 2015 civic for $9k in oakland, ca, within 20 miles"). Pulling
+# those out with cheap regexes before the LLM turn saves the turns the model
+# would otherwise spend asking for each field.
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
+    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "district of columbia": "DC",
+}
+STATE_CODES = set(US_STATES.values())
+
+# Which state field a money amount or date lands in, per category.
+PRICE_FIELD = {
+    "for_sale": "price",
+    "housing": "budget",
+    "services": "budget",
+    "community": "cost",
+    "gigs": "pay_rate",
+}
+DATE_FIELD = {
+    "housing": "move_in_date",
+    "community": "date_time",
+    "services": "timeframe",
+}
+
+CONDITIONS = ["brand new", "like new", "new", "excellent", "very good", "good", "fair", "used", "refurbished", "for parts"]
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+
+# Only explicit money: "$300", "300 dollars/bucks", or a price/budget/asking/paying
+# cue. "for 2 chairs", "under 3 kids" are counts, not prices, and a wrong
+# price is never asked for again.
+PRICE_RE = re.compile(
+    rf"(?:\$\s*(?P<dollar>{_NUMBER})\s*(?P<dollar_k>k\b)?)"
+    rf"|(?:\b(?:asking(?: price)?|price|budget|pay(?:ing| rate)?)(?:\s+(?:is|of))?\s*:?\s+(?P<word>{_NUMBER})\s*(?P<word_k>k\b)?(?!\s*(?:mi|mile|miles|km|kms|kilometers?|minutes?|hours?|days?|weeks?|years?|people|ppl)\b))"
+    rf"|(?:\b(?P<plain>{_NUMBER})\s*(?P<plain_k>k)?\s*(?:dollars|bucks|usd)\b)",
+    re.IGNORECASE
+)
+DISTANCE_RE = re.compile(
+    rf"\b(?P<value>{_NUMBER})\s*(?P<unit>mi|mile|miles|km|kms|kilometers?|kilometres?)\b",
+    re.IGNORECASE
+)
+LOCATION_RE = re.compile(
+    r"\b(?:in|near|around|from|at)\s+(?P<city>[a-z][a-z .'-]{1,40}?)\s*,\s*(?P<state>[a-z]{2}|[a-z][a-z ]{3,20}?)\b(?=\s*(?:[,.;!?]|$|\s+(?:within|for|and|area|asap|next|by|on|starting)\b))",
+    re.IGNORECASE
+)
+DATE_RE = re.compile(
+    r"\b(?P<date>(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?(?:,?\s+\d{4})?"
+    r"|\d{1,2}/\d{1,2}(?:/\d{2,4})?"
+    r"|\d{4}-\d{2}-\d{2}"
+    r"|(?:this|next)\s+(?:week|weekend|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|tomorrow|tonight|today|asap)\b",
+    re.IGNORECASE
+)
+CONDITION_RE = re.compile(
+    r"\b(" + "|".join(re.escape(c) for c in CONDITIONS) + r")\b(?:\s+condition)?",
+    re.IGNORECASE
+)
+# Checked before WANT_RE: "want to sell my bike" is an offer. A bare "i have"
+# ("i have a question") says nothing about the side, so it isn't a cue.
+HAVE_RE = re.compile(r"\b(?:sell(?:ing)?|offering|giving away|for sale|for rent|rent(?:ing)? out|hiring)\b", re.IGNORECASE)
+WANT_RE = re.compile(r"\b(?:looking for|want to buy|wanted|buying|need|searching for|in search of|iso|want)\b", re.IGNORECASE)
+
+def _to_number(value: str, thousands: Optional[str] = None) -> float:
+    number = float(value.replace(",", ""))
+    if thousands:
+        number *= 1000
+    return number
+
+def extract_price(text: str) -> Optional[float]:
+    match = PRICE_RE.search(text)
+    if not match:
+        return None
+    for group in ("dollar", "word", "plain"):
+        if match.group(group):
+            return _to_number(match.group(group), match.group(f"{group}_k"))
+    return None
+
+def extract_distance(text: str) -> Optional[Dict[str, Any]]:
+    match = DISTANCE_RE.search(text)
+    if not match:
+        return None
+    unit = "km" if match.group("unit").lower().startswith("k") else "mi"
+    return {"distance": _to_number(match.group("value")), "distance_unit": unit}
+
+def extract_location(text: str) -> Optional[str]:
+    for match in LOCATION_RE.finditer(text):
+        state = match.group("state").strip().lower()
+        code = state.upper() if state.upper() in STATE_CODES else US_STATES.get(state)
+        if not code:
+            continue
+        city = match.group("city").strip()
+        return f"{city.title()}, {code}"
+    return None
+
+def extract_condition(text: str) -> Optional[str]:
+    match = CONDITION_RE.search(text)
+    return match.group(1).lower() if match else None
+
+def extract_date(text: str) -> Optional[str]:
+    match = DATE_RE.search(text)
+    return match.group("date") if match else None
+
+def extract_want_or_have(text: str) -> Optional[str]:
+    if HAVE_RE.search(text):
+        return "have"
+    if WANT_RE.search(text):
+        return "want"
+    return None
+
+def extract_slots(text: str, general_category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract quest fields that can be recognised without the LLM.
+    Only fields that were found are returned; the caller decides what to overwrite.
+    """
+    slots: Dict[str, Any] = {}
+    if not text:
+        return slots
+    want_or_have = extract_want_or_have(text)
+    if want_or_have and general_category in (None, "for_sale", "services", "gigs"):
+        slots["want_or_have"] = want_or_have
+    price = extract_price(text)
+    if price is not None:
+        slots[PRICE_FIELD.get(general_category, "price")] = price
+    distance = extract_distance(text)
+    if distance:
+        slots.update(distance)
+    location = extract_location(text)
+    if location:
+        slots["general_location"] = location
+    if general_category in (None, "for_sale"):
+        condition = extract_condition(text)
+        if condition:
+            slots["condition"] = condition
+    date_field = DATE_FIELD.get(general_category)
+    if date_field:
+        date = extract_date(text)
+        if date:
+            slots[date_field] = date
+    return slots
+
+def prefill_quest_state(quest_state: Dict[str, Any], text: str, general_category: Optional[str] = None) -> Dict[str, Any]:
+    """Return the slots from `text` that are still missing in `quest_state`."""
+    prefilled = {
+        k: v for k, v in extract_slots(text, general_category).items()
+        if quest_state.get(k) in (None, "", [])
+    }
+    if prefilled:
+        logging.info(f"[prefill_quest_state] Pre-filled from message: {prefilled}")
+    return prefilled
@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+import threading
+import requests
+from typing import Any, Callable, Dict, List, Optional
+import metrics
+import serialization
+
+# === SUPABASE ACCESS WITH A CIRCUIT BREAKER ===
+# Every Supabase REST call goes through `supabase_request`. After
+# SUPABASE_BREAKER_FAILURES consecutive failures (timeouts, connection errors,
+# 5xx) the breaker opens and calls fail immediately with CircuitOpenError, so
+# callers drop to their degraded path instead of waiting on a dead backend.
+# After SUPABASE_BREAKER_RESET_S one probe request is let through (half-open);
+# its success closes the breaker and runs the recovery hooks (write replay).
+
+SUPABASE_API = os.getenv("SUPABASE_API")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+SUPABASE_TIMEOUT_S = float(os.getenv("SUPABASE_TIMEOUT_S", "5"))
+SUPABASE_BREAKER_FAILURES = int(os.getenv("SUPABASE_BREAKER_FAILURES", "5"))
+SUPABASE_BREAKER_RESET_S = float(os.getenv("SUPABASE_BREAKER_RESET_S", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpenError(Exception):
+    """Supabase is considered down; the call was not attempted."""
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_s: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.recovery_hooks: List[Callable[[], None]] = []
+        self.lock = threading.Lock()
+        self._export()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            recovered = self.state != CLOSED
+            if recovered:
+                self._transition(CLOSED)
+        if recovered:
+            for hook in self.recovery_hooks:
+                # Replays can be slow; don't hold up the request that closed the breaker
+                threading.Thread(target=hook, daemon=True).start()
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def release_probe(self) -> None:
+        """Let another probe out when this one ended without a verdict (an unexpected error)."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    def on_recover(self, hook: Callable[[], None]) -> None:
+        self.recovery_hooks.append(hook)
+
+    def _transition(self, state: str) -> None:
+        logging.warning(f"[CircuitBreaker] {self.name}: {self.state} -> {state}")
+        self.state = state
+        metrics.incr(f"{self.name}.breaker.{state}")
+        self._export()
+
+    def _export(self) -> None:
+        metrics.set_gauge(f"{self.name}.breaker.state", STATE_GAUGE[self.state])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+supabase_breaker = CircuitBreaker("supabase", SUPABASE_BREAKER_FAILURES, SUPABASE_BREAKER_RESET_S)
+
+def supabase_headers(prefer: Optional[str] = None) -> Dict[str, str]:
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "application/json"
+    }
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers
+
+def supabase_request(method: str, path: str, prefer: Optional[str] = None, **kwargs) -> requests.Response:
+    """
+    Call the Supabase REST API (`path` is relative to /rest/v1/) through the
+    circuit breaker. Raises CircuitOpenError without calling out while open.
+    """
+    if not SUPABASE_API or not SUPABASE_KEY:
+        raise RuntimeError("Supabase is not configured")
+    kwargs.setdefault("timeout", SUPABASE_TIMEOUT_S)
+    # Anything that can fail before the call goes out happens before a probe is taken
+    if "json" in kwargs:
+        kwargs["data"] = serialization.dumps_bytes(kwargs.pop("json"))
+    if not supabase_breaker.allow():
+        metrics.incr("supabase.short_circuited")
+        raise CircuitOpenError("Supabase circuit is open")
+    settled = False
+    try:
+        start = time.perf_counter()
+        try:
+            response = requests.request(method, f"{SUPABASE_API}/rest/v1/{path}", headers=supabase_headers(prefer), **kwargs)
+        except requests.RequestException:
+            metrics.incr("supabase.failures")
+            settled = True
+            supabase_breaker.record_failure()
+            raise
+        metrics.observe("supabase.latency_ms", (time.perf_counter() - start) * 1000)
+        settled = True
+        if response.status_code >= 500:
+            metrics.incr("supabase.failures")
+            supabase_breaker.record_failure()
+        else:
+            # 4xx means Supabase is up and answering
+            supabase_breaker.record_success()
+        return response
+    finally:
+        if not settled:
+            supabase_breaker.release_probe()
@@ -0,0 +1,273 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+import metrics
+
+# === TAXONOMY INDEX ===
+# Snaps the categories Gemini returns onto taxonomy.json so near-misses
+# ("cars & trucks", "Bicycles", "furnture") are stored as the real category
+# ("cars+trucks", "bikes", "furniture") and downstream filters match. Lookup
+# order: normalized key, alias table, then a trigram (Dice) fuzzy match
+# within the general category. Everything is precomputed when the file is
+# loaded; taxonomy.json (and the optional alias file) are reloaded when
+# their mtime changes, checked at most every TAXONOMY_RELOAD_S.
+
+TAXONOMY_PATH = os.getenv("TAXONOMY_PATH", "taxonomy.json")
+# Optional extra aliases, same shape as ALIASES: {"for_sale": {"e-bike": "bikes"}}
+TAXONOMY_ALIASES_PATH = os.getenv("TAXONOMY_ALIASES_PATH", "")
+TAXONOMY_RELOAD_S = float(os.getenv("TAXONOMY_RELOAD_S", "30"))
+# Minimum Dice similarity for a fuzzy match; below it the category's fallback is used
+TAXONOMY_FUZZY_MIN = float(os.getenv("TAXONOMY_FUZZY_MIN", "0.5"))
+
+# Sub-category used when nothing matches, per general category. Every
+# category needs one: a quest without a sub_category is re-classified on
+# every turn and can't be saved. A category missing here (e.g. added to
+# taxonomy.json later) keeps the classifier's raw value instead.
+FALLBACK_SUB_CATEGORIES = {
+    "for_sale": "general",
+    "housing": "apts / housing",
+    "jobs": "etc / misc",
+    "services": "household",
+    "community": "general",
+    "gigs": "labor",
+}
+
+# Synonyms normalization can't catch. Keys are normalized on load.
+CATEGORY_ALIASES: Dict[str, str] = {
+    "sale": "for_sale", "selling": "for_sale", "buy sell": "for_sale", "marketplace": "for_sale",
+    "job": "jobs", "employment": "jobs", "career": "jobs",
+    "rental": "housing", "real estate": "housing", "home": "housing",
+    "service": "services", "gig": "gigs", "event": "community", "social": "community",
+}
+ALIASES: Dict[str, Dict[str, str]] = {
+    "for_sale": {
+        "bicycle": "bikes", "cycling": "bikes", "car": "cars+trucks", "truck": "cars+trucks", "auto": "cars+trucks",
+        "vehicle": "cars+trucks", "phone": "cell phones", "smartphone": "cell phones", "mobile phone": "cell phones",
+        "laptop": "computers", "pc": "computers", "clothing": "clothes+acc", "apparel": "clothes+acc",
+        "video game": "video gaming", "toy": "toys+games", "musical instrument": "music instr",
+        "instrument": "music instr", "camera": "photo+video", "tire": "wheels+tires", "rv": "rvs+camp",
+        "sporting good": "sporting", "sport": "sporting", "kid": "baby+kids", "health beauty": "beauty+hlth",
+        "craft": "arts+crafts", "garden": "farm+garden", "motorbike": "motorcycles",
+    },
+    "housing": {
+        "apartment": "apts / housing", "rental": "apts / housing", "house": "apts / housing",
+        "room": "rooms / shared", "roommate": "rooms / shared", "sublet": "sublets / temporary",
+        "parking": "parking / storage", "storage": "parking / storage", "home for sale": "real estate for sale",
+        "vacation": "vacation rentals", "office": "office / commercial", "commercial": "office / commercial",
+    },
+    "jobs": {
+        "software": "software / qa / dba", "software engineer": "software / qa / dba", "developer": "software / qa / dba", "programming": "software / qa / dba",
+        "accounting": "accounting+finance", "finance": "accounting+finance", "healthcare": "medical / health",
+        "medical": "medical / health", "it": "systems / network", "tech support": "technical support",
+        "writing": "writing / editing", "trade": "skilled trades / craft", "labor": "general labor",
+        "hospitality": "food / bev / hosp", "restaurant": "food / bev / hosp", "admin": "admin / office",
+        "design": "art / media / design", "sales": "sales / biz dev",
+        "marketing": "marketing / pr / ad", "engineering": "arch / engineering", "teaching": "education",
+    },
+    "services": {
+        "moving": "labor/move", "mover": "labor/move", "plumbing": "skilled trade", "electrician": "skilled trade",
+        "tutoring": "lessons", "cleaning": "household", "auto repair": "automotive", "mechanic": "automotive",
+        "computer repair": "computer", "pet care": "pet", "translation": "write/ed/tr8", "editing": "write/ed/tr8",
+        "writing": "write/ed/tr8", "phone repair": "cell/mobile", "bike repair": "cycle", "small business": "sm biz ads",
+    },
+    "community": {
+        "carpool": "rideshare", "volunteering": "volunteers", "babysitting": "childcare", "class": "classes",
+        "lost found": "lost+found", "news": "local news", "music": "musicians", "sport": "activities",
+    },
+    "gigs": {
+        "moving": "labor", "design": "creative", "tech": "computer", "cleaning": "domestic",
+        "acting": "talent", "modeling": "talent", "event staff": "event",
+    },
+}
+
+_SEPARATORS = re.compile(r"[+&/_\-]|\band\b")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+def normalize_key(text: str) -> str:
+    """Lowercase, separators to spaces, punctuation dropped, plural -s stripped: "Cars & Trucks" -> "car truck"."""
+    words = _NON_WORD.sub(" ", _SEPARATORS.sub(" ", text.lower())).split()
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class _Index:
+    """Immutable lookup tables for one version of the taxonomy; swapped whole on reload."""
+
+    def __init__(self, taxonomy: Dict[str, List[str]], aliases: Dict[str, Dict[str, str]]):
+        self.taxonomy = taxonomy
+        self.categories = {normalize_key(c): c for c in taxonomy}
+        self.categories.update({normalize_key(a): c for a, c in CATEGORY_ALIASES.items() if c in taxonomy})
+        self.category_grams = {key: trigrams(key) for key in self.categories}
+        # general -> normalized key -> sub_category (exact names first, aliases never override them)
+        self.keys: Dict[str, Dict[str, str]] = {}
+        # general -> trigram -> [entry]; entry = (sub_category, trigram count)
+        self.grams: Dict[str, Dict[str, List[int]]] = {}
+        self.entries: Dict[str, List[Tuple[str, int]]] = {}
+        for general, subs in taxonomy.items():
+            keys = {}
+            for alias, sub in aliases.get(general, {}).items():
+                if sub in subs:
+                    keys[normalize_key(alias)] = sub
+            keys.update({normalize_key(sub): sub for sub in subs})
+            self.keys[general] = keys
+            entries, grams = [], {}
+            for key, sub in keys.items():
+                key_grams = trigrams(key)
+                for gram in key_grams:
+                    grams.setdefault(gram, []).append(len(entries))
+                entries.append((sub, len(key_grams)))
+            self.entries[general] = entries
+            self.grams[general] = grams
+        # sub_category key -> general categories that have it (for inferring a missing general)
+        self.owners: Dict[str, List[str]] = {}
+        for general, keys in self.keys.items():
+            for key in keys:
+                self.owners.setdefault(key, []).append(general)
+
+    def fuzzy(self, general: str, key: str) -> Tuple[Optional[str], float]:
+        query = trigrams(key)
+        shared = Counter()
+        postings = self.grams[general]
+        for gram in query:
+            for entry in postings.get(gram, ()):
+                shared[entry] += 1
+        best, best_score = None, 0.0
+        for entry, count in shared.items():
+            sub, size = self.entries[general][entry]
+            score = 2 * count / (len(query) + size)
+            if score > best_score:
+                best, best_score = sub, score
+        return best, best_score
+
+class TaxonomyIndex:
+    def __init__(self, path: str = TAXONOMY_PATH, aliases_path: str = TAXONOMY_ALIASES_PATH, reload_s: float = TAXONOMY_RELOAD_S):
+        self.path = path
+        self.aliases_path = aliases_path
+        self.reload_s = reload_s
+        self.lock = threading.Lock()
+        self._mtimes: Tuple[float, float] = (0.0, 0.0)
+        self._checked_at = 0.0
+        self._index: Optional[_Index] = None
+        self.reload()
+
+    def _file_mtimes(self) -> Tuple[float, float]:
+        aliases_mtime = os.path.getmtime(self.aliases_path) if self.aliases_path and os.path.exists(self.aliases_path) else 0.0
+        return os.path.getmtime(self.path), aliases_mtime
+
+    def reload(self) -> bool:
+        """(Re)build the index from disk; keeps the current one if the files don't parse."""
+        with self.lock:
+            try:
+                mtimes = self._file_mtimes()
+                with open(self.path, "r") as f:
+                    taxonomy = json.load(f)
+                aliases = {general: dict(table) for general, table in ALIASES.items()}
+                if mtimes[1]:
+                    with open(self.aliases_path, "r") as f:
+                        for general, table in json.load(f).items():
+                            aliases.setdefault(general, {}).update(table)
+                index = _Index(taxonomy, aliases)
+            except (OSError, ValueError, AttributeError) as e:
+                metrics.incr("taxonomy.reload_failed")
+                logging.error(f"[TaxonomyIndex] Failed to load {self.path}: {e!r}")
+                if self._index is None:
+                    raise
+                return False
+            self._index = index
+            self._mtimes = mtimes
+            self._checked_at = time.monotonic()
+        logging.info(f"[TaxonomyIndex] Loaded {sum(len(s) for s in taxonomy.values())} sub-categories from {self.path}")
+        return True
+
+    def _current(self) -> _Index:
+        if self.reload_s > 0 and time.monotonic() - self._checked_at >= self.reload_s:
+            self._checked_at = time.monotonic()
+            try:
+                changed = self._file_mtimes() != self._mtimes
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+        return self._index
+
+    @property
+    def taxonomy(self) -> Dict[str, List[str]]:
+        return self._current().taxonomy
+
+    def category(self, value: Optional[str]) -> Optional[str]:
+        """The general category `value` names (exact, alias or fuzzy), or None."""
+        if not value:
+            return None
+        index = self._current()
+        if value in index.taxonomy:
+            return value
+        key = normalize_key(value)
+        if key in index.categories:
+            return index.categories[key]
+        query = trigrams(key)
+        best, best_score = None, 0.0
+        for name_key, grams in index.category_grams.items():
+            score = 2 * len(query & grams) / (len(query) + len(grams))
+            if score > best_score:
+                best, best_score = index.categories[name_key], score
+        return best if best_score >= TAXONOMY_FUZZY_MIN else None
+
+    def sub_category(self, general: str, value: Optional[str], fallback: bool = True) -> Tuple[Optional[str], str]:
+        """(sub_category, how) for `value` within `general`; how is exact/normalized/alias/fuzzy/fallback/raw/none."""
+        index = self._current()
+        subs = index.taxonomy.get(general)
+        if subs is None:
+            return None, "none"
+        if value:
+            if value in subs:
+                return value, "exact"
+            key = normalize_key(value)
+            sub = index.keys[general].get(key)
+            if sub is not None:
+                return sub, "normalized" if normalize_key(sub) == key else "alias"
+            sub, score = index.fuzzy(general, key)
+            if sub is not None and score >= TAXONOMY_FUZZY_MIN:
+                return sub, "fuzzy"
+        if not fallback:
+            return None, "none"
+        default = FALLBACK_SUB_CATEGORIES.get(general)
+        if default in subs:
+            return default, "fallback"
+        if value and value.strip():
+            logging.warning(f"[TaxonomyIndex] No fallback sub_category for {general!r}; keeping {value!r}")
+            return value.strip(), "raw"
+        return None, "none"
+
+    def normalize(self, classification: Dict[str, Any]) -> Dict[str, Any]:
+        """Snap a classifier answer onto the taxonomy; unknown values come back as None."""
+        raw_general = classification.get("general_category")
+        raw_sub = classification.get("sub_category")
+        general = self.category(raw_general)
+        if general is None and raw_sub:
+            # Sub-category alone can pin the general category when only one has it
+            owners = self._current().owners.get(normalize_key(raw_sub), [])
+            general = owners[0] if len(owners) == 1 else None
+        if general is None:
+            metrics.incr("taxonomy.normalized.none")
+            return {**classification, "general_category": None, "sub_category": None}
+        sub, how = self.sub_category(general, raw_sub)
+        metrics.incr(f"taxonomy.normalized.{how}")
+        if how != "exact" or general != raw_general:
+            logging.info(f"[TaxonomyIndex] {raw_general!r}/{raw_sub!r} -> {general}/{sub} ({how})")
+        return {**classification, "general_category": general, "sub_category": sub}
+
+    def filter_categories(self, general: Optional[str], sub: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Snap user-supplied category filters; values that don't match are kept (and match nothing)."""
+        general = self.category(general) or general
+        if sub and general in self._current().taxonomy:
+            sub = self.sub_category(general, sub, fallback=False)[0] or sub
+        return general, sub
+
+taxonomy_index = TaxonomyIndex()
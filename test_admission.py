@@ -0,0 +1,45 @@
+"""
+Admission control: run with `python -m pytest test_admission.py`.
+"""
+import pytest
+from types import SimpleNamespace
+import admission
+from admission import AdmissionRejected, RateLimiter, check_rate_limits, client_ip
+
+def request(forwarded=None, peer="10.0.0.1"):
+    headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=peer))
+
+def test_forwarded_for_is_ignored_by_default():
+    assert client_ip(request("1.2.3.4")) == "10.0.0.1"
+
+@pytest.mark.parametrize("forwarded, hops, ip", [
+    ("203.0.113.7", 1, "203.0.113.7"),
+    # A client-supplied entry sits to the left of the one the proxy appended
+    ("1.2.3.4, 203.0.113.7", 1, "203.0.113.7"),
+    ("1.2.3.4, 203.0.113.7, 10.1.1.1", 2, "203.0.113.7"),
+    ("203.0.113.7", 2, "10.0.0.1"),
+])
+def test_forwarded_for_counts_trusted_hops_from_the_right(monkeypatch, forwarded, hops, ip):
+    monkeypatch.setattr(admission, "TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", hops)
+    assert client_ip(request(forwarded)) == ip
+
+def test_charge_over_burst_leaves_the_bucket_in_debt():
+    limiter = RateLimiter(rate_per_min=60, burst=20)
+    assert limiter.wait("ip") == 0
+    limiter.spend("ip", 100)
+    # 80 tokens of debt plus one to spend, at one token a second
+    assert limiter.wait("ip") == pytest.approx(81, abs=0.1)
+
+def test_rejected_session_does_not_spend_ip_tokens(monkeypatch):
+    monkeypatch.setattr(admission, "ip_limiter", RateLimiter(rate_per_min=60, burst=10))
+    monkeypatch.setattr(admission, "session_limiter", RateLimiter(rate_per_min=60, burst=2))
+    admission.session_limiter.spend("s1", 2)
+    with pytest.raises(AdmissionRejected) as rejected:
+        check_rate_limits("ip", ["s2", "s1"], cost=2)
+    assert rejected.value.reason == "session"
+    assert admission.ip_limiter.wait("ip", 10) == 0
+    assert admission.session_limiter.wait("s2", 2) == 0
+    check_rate_limits("ip", ["s2", "s2"], cost=2)
+    assert admission.ip_limiter.wait("ip", 9) > 0
@@ -0,0 +1,44 @@
+"""
+Radius queries on the grid index: run with `python -m pytest test_geo_index.py`.
+"""
+import random
+import pytest
+from geo_index import GeoIndex, KM_PER_DEGREE_LAT, haversine_km
+
+def brute_force(points, lat, lng, radius_km, limit=None):
+    hits = sorted(
+        ((key, haversine_km(lat, lng, p_lat, p_lng)) for key, (p_lat, p_lng) in points.items()),
+        key=lambda hit: hit[1]
+    )
+    hits = [hit for hit in hits if hit[1] <= radius_km]
+    return hits[:limit] if limit else hits
+
+def test_limit_counts_only_hits_inside_the_radius():
+    index = GeoIndex()
+    # Just outside 10 km, and close enough to pass the cheap pre-filter
+    for i in range(5):
+        index.upsert(f"edge-{i}", 37.8 + 10.3 / KM_PER_DEGREE_LAT, -122.27 + i * 1e-4)
+    index.upsert("inside", 37.8 + 9.0 / KM_PER_DEGREE_LAT, -122.27)
+    index.upsert("near", 37.8, -122.27)
+    assert [key for key, _ in index.query(37.8, -122.27, 10.0, limit=2)] == ["near", "inside"]
+
+@pytest.mark.parametrize("lng, other", [(179.99, -179.99), (-179.99, 179.99), (180.0, -179.995)])
+def test_query_crosses_the_antimeridian(lng, other):
+    index = GeoIndex()
+    index.upsert("across", 10.0, other)
+    hits = index.query(10.0, lng, 5.0)
+    assert [key for key, _ in hits] == ["across"]
+    assert hits[0][1] < 5.0
+
+@pytest.mark.parametrize("limit", [None, 1, 10, 50])
+@pytest.mark.parametrize("lat, lng, radius_km", [(37.8, -122.27, 15.0), (64.8, 179.9, 40.0), (-16.5, -179.95, 25.0)])
+def test_matches_brute_force(lat, lng, radius_km, limit):
+    rng = random.Random(7)
+    index, points = GeoIndex(), {}
+    for i in range(2000):
+        p_lat = lat + rng.uniform(-0.5, 0.5)
+        p_lng = (lng + rng.uniform(-1.0, 1.0) + 180.0) % 360.0 - 180.0
+        points[str(i)] = (p_lat, p_lng)
+        index.upsert(str(i), p_lat, p_lng)
+    expected = brute_force(points, lat, lng, radius_km, limit)
+    assert [key for key, _ in index.query(lat, lng, radius_km, limit=limit)] == [key for key, _ in expected]
@@ -0,0 +1,37 @@
+"""
+Want/have matching: run with `python -m pytest test_match_engine.py`.
+"""
+import pytest
+from match_engine import MatchEngine
+from percolator import Percolator, quest_subscription
+
+OAKLAND = {"lat": 37.8044, "lng": -122.2712}
+
+def housing(want_or_have, **fields):
+    return {"general_category": "housing", "sub_category": "apts / housing", "want_or_have": want_or_have, **OAKLAND, **fields}
+
+@pytest.mark.parametrize("want, partners", [
+    ("rent", {"rent out"}),
+    ("sublet", {"rent out"}),
+    ("buy", {"sell"}),
+])
+def test_housing_pairs_within_one_market(want, partners):
+    engine = MatchEngine()
+    engine.upsert("query", housing(want))
+    for value in ("rent out", "sell", "rent", "buy"):
+        engine.upsert(value, housing(value))
+    assert {m["key"] for m in engine.match("query")} == partners
+
+@pytest.mark.parametrize("category", ["jobs", "services", "community", "gigs"])
+def test_categories_without_a_side_are_not_indexed(category):
+    engine = MatchEngine()
+    engine.upsert("a", {"general_category": category, "want_or_have": "want", **OAKLAND})
+    engine.upsert("b", {"general_category": category, "want_or_have": "have", **OAKLAND})
+    assert len(engine) == 0
+    assert quest_subscription("a", {"general_category": category, "want_or_have": "want", **OAKLAND}) is None
+
+def test_rent_subscription_ignores_a_sale():
+    percolator = Percolator()
+    percolator.upsert(quest_subscription("renter", housing("rent", quest_id="s1")))
+    assert percolator.percolate("sale", housing("sell", quest_id="s2")) == []
+    assert [m["quest_key"] for m in percolator.percolate("rental", housing("rent out", quest_id="s3"))] == ["renter"]
@@ -0,0 +1,43 @@
+"""
+Prompt size guard: run in CI with `python -m pytest test_prompt_budget.py`.
+
+Every Gemini quest turn pays for its category prompt, so a prompt that grows
+past its budget in quest_prompts.PROMPT_TOKEN_BUDGETS fails the build.
+"""
+import pytest
+import quest_prompts
+from quest_prompts import CATEGORY_SPECS, PROMPT_TOKEN_BUDGETS, PROMPTS, FRAGMENTS, prompt_tokens
+from quest_prompts import EXTRACT_PROMPTS, EXTRACT_PROMPT_TOKEN_BUDGET
+from quest_schema import CATEGORY_FIELDS, COMMON_FIELDS
+
+@pytest.mark.parametrize("category", sorted(CATEGORY_SPECS))
+def test_prompt_within_budget(category):
+    tokens = prompt_tokens(PROMPTS[category])
+    budget = PROMPT_TOKEN_BUDGETS[category]
+    assert tokens <= budget, f"{category} prompt is ~{tokens} tokens, budget {budget}"
+
+def test_every_category_has_a_prompt_and_budget():
+    assert set(CATEGORY_SPECS) == set(CATEGORY_FIELDS) == set(PROMPT_TOKEN_BUDGETS)
+
+@pytest.mark.parametrize("category", sorted(CATEGORY_SPECS))
+def test_prompt_fields_exist_in_schema(category):
+    known = {**COMMON_FIELDS, **CATEGORY_FIELDS[category]}
+    fields = [field for field, _, _ in CATEGORY_SPECS[category]["fields"]]
+    for field in fields:
+        assert field in known, f"{category} prompt asks for unknown field {field}"
+    assert set(CATEGORY_SPECS[category].get("optional", ())) <= set(fields)
+
+@pytest.mark.parametrize("category", sorted(CATEGORY_SPECS))
+def test_shared_fragments_appear_once(category):
+    prompt = PROMPTS[category]
+    for name in ("location", "conversation", "photos", "ready", "ui"):
+        assert prompt.count(FRAGMENTS[name]) == 1, f"{name} fragment repeated in {category} prompt"
+
+def test_legacy_names_are_compiled_prompts():
+    assert quest_prompts.FOR_SALE_PROMPT == PROMPTS["for_sale"]
+    assert quest_prompts.GIGS_PROMPT == PROMPTS["gigs"]
+
+@pytest.mark.parametrize("category", sorted(CATEGORY_SPECS))
+def test_extract_prompt_within_budget(category):
+    tokens = prompt_tokens(EXTRACT_PROMPTS[category])
+    assert tokens <= EXTRACT_PROMPT_TOKEN_BUDGET, f"{category} extract prompt is ~{tokens} tokens, budget {EXTRACT_PROMPT_TOKEN_BUDGET}"
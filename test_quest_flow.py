@@ -0,0 +1,172 @@
+"""
+Server-side quest flow, end to end: run with `python -m pytest test_quest_flow.py`.
+
+Conversations go through main.run_quest_turn with Gemini replaced by a
+scripted extractor (the values a perfect extraction would return), so these
+run without Vertex credentials and never touch Supabase.
+"""
+import asyncio
+import json
+import pytest
+from google import genai
+
+class _OfflineClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+# vertex_client builds its clients at import; nothing here calls them
+genai.Client = _OfflineClient
+
+import main
+import quest_tools
+
+OAKLAND = {"lat": 37.8044, "lng": -122.2712}
+
+def converse(monkeypatch, category, sub_category, first_message, extractions, answer, max_turns=15):
+    """Run a conversation to the post confirmation; returns the (action, text) of every reply."""
+    async def classify_quest(quest_text, taxonomy=None):
+        return {"general_category": category, "sub_category": sub_category}
+
+    async def routed_chat_response(stage, messages, **kwargs):
+        assert stage == "quest_extract"
+        message = messages[-1]["content"].split("User message: ", 1)[-1]
+        return json.dumps(extractions.get(message, {}))
+
+    monkeypatch.setattr(main, "classify_quest", classify_quest)
+    monkeypatch.setattr(quest_tools, "routed_chat_response", routed_chat_response)
+    session = {"quest_state": {}, "chat_history": []}
+    replies, message = [], first_message
+    for _ in range(max_turns):
+        result = asyncio.run(main.run_quest_turn("test-session", message, session, persist=False))
+        replies.append((result["action"], result["text"]))
+        if result["text"].startswith("Posting"):
+            return replies, session
+        message = answer(result)
+    pytest.fail(f"conversation did not finish: {replies}")
+
+def button_or(free_text):
+    def answer(result):
+        buttons = (result.get("ui") or {}).get("buttons") or []
+        if result["action"] == "offer_photos":
+            return "No"
+        if result["action"] == "ask_for_distance":
+            return "10 mi"
+        return "Yes" if buttons == ["Yes", "No"] else free_text[result["action"]]
+    return answer
+
+def test_location_confirmed_once_when_coordinates_come_later(monkeypatch):
+    extractions = {
+        "selling my road bike for $300": {"want_or_have": "have", "description": "road bike", "price": 300},
+        "Oakland, CA": {"general_location": "Oakland, CA"},
+        # Coordinates only arrive with the turn that confirms the location
+        "Yes": OAKLAND,
+    }
+    replies, session = converse(
+        monkeypatch, "for_sale", "bikes", "selling my road bike for $300", extractions,
+        button_or({"validate_location": "Oakland, CA"})
+    )
+    confirmations = [text for action, text in replies if text == "Is your location Oakland, CA?"]
+    assert len(confirmations) == 1, replies
+    assert [action for action, _ in replies] == [
+        "validate_location", "ask_for_distance", "validate_location", "offer_photos", "ready", "ready"
+    ]
+    state = session["quest_state"]
+    assert state["location_confirmed"] is True
+    assert (state["lat"], state["lng"]) == (OAKLAND["lat"], OAKLAND["lng"])
+
+def test_location_and_coordinates_in_one_answer(monkeypatch):
+    extractions = {
+        "looking for a part-time barista job": {"job_role": "barista", "employment_type": "part-time"},
+        "hospitality": {"industry": "hospitality"},
+        "entry level": {"experience_level": "entry level"},
+        "Oakland, CA": {"general_location": "Oakland, CA", **OAKLAND},
+    }
+    replies, _ = converse(
+        monkeypatch, "jobs", "food / bev / hosp", "looking for a part-time barista job", extractions,
+        button_or({
+            "ask_for_industry": "hospitality",
+            "ask_for_experience_level": "entry level",
+            "ask_for_work_location": "On-site",
+            "validate_location": "Oakland, CA",
+        })
+    )
+    assert sum(1 for _, text in replies if text == "Is your location Oakland, CA?") == 1, replies
+    assert replies[-2][0] == "ready"
+
+def test_declined_location_is_asked_again(monkeypatch):
+    extractions = {
+        "selling my road bike for $300": {"want_or_have": "have", "description": "road bike", "price": 300},
+        "Oakland, CA": {"general_location": "Oakland, CA"},
+        "Berkeley, CA": {"general_location": "Berkeley, CA"},
+        "Yes": {"lat": 37.8715, "lng": -122.273},
+    }
+    locations = iter(["Oakland, CA", "Berkeley, CA"])
+    def answer(result):
+        if result["text"] == "Is your location Oakland, CA?":
+            return "No"
+        if result["action"] == "validate_location" and not result.get("ui"):
+            return next(locations)
+        return button_or({})(result)
+    replies, session = converse(monkeypatch, "for_sale", "bikes", "selling my road bike for $300", extractions, answer)
+    assert session["quest_state"]["general_location"] == "Berkeley, CA"
+    assert session["quest_state"]["location_confirmed"] is True
+
+def test_quest_row_has_no_session_only_fields(monkeypatch):
+    from quest_schema import SESSION_ONLY_FIELDS
+    from routes.quests import build_quest_payload
+    extractions = {
+        "selling my road bike for $300": {"want_or_have": "have", "description": "road bike", "price": 300},
+        "Oakland, CA": {"general_location": "Oakland, CA", **OAKLAND},
+    }
+    _, session = converse(
+        monkeypatch, "for_sale", "bikes", "selling my road bike for $300", extractions,
+        button_or({"validate_location": "Oakland, CA"})
+    )
+    row = build_quest_payload(session["quest_state"], {}, "for_sale", "bikes", "test-session")
+    assert not (set(row) & SESSION_ONLY_FIELDS) - {"general_category", "sub_category"}
+    assert row["location"] == f"POINT({OAKLAND['lng']} {OAKLAND['lat']})"
+    assert (row["general_category"], row["sub_category"], row["price"]) == ("for_sale", "bikes", 300)
+
+def test_photo_upload_during_a_turn_is_kept(monkeypatch):
+    from quest_tools import LOCAL_SESSIONS, session_writes, save_turn, load_session
+    from routes.photos import add_photo_to_session
+    monkeypatch.setattr(quest_tools, "SUPABASE_API", None)
+    session_id = "photo-race"
+    LOCAL_SESSIONS[session_id] = {
+        "quest_state": {"want_or_have": "have", "description": "road bike", "action": "offer_photos"},
+        "chat_history": [], "general_category": "for_sale", "sub_category": "bikes",
+    }
+    uploading = asyncio.Event()
+
+    async def routed_chat_response(stage, messages, **kwargs):
+        uploading.set()
+        await asyncio.sleep(0.05)  # the upload lands while Gemini is working
+        return json.dumps({"price": 250})
+    monkeypatch.setattr(quest_tools, "routed_chat_response", routed_chat_response)
+
+    async def turn():
+        writes = session_writes(session_id)
+        seen = writes.photo_writes
+        session = await load_session(session_id)
+        session = {**session, "quest_state": dict(session["quest_state"]), "chat_history": list(session["chat_history"])}
+        await main.run_quest_turn(session_id, "it's 250", session, persist=False)
+        await save_turn(session_id, session, writes, seen)
+
+    async def upload():
+        await uploading.wait()
+        await add_photo_to_session(session_id, "/uploads/bike.jpg")
+
+    async def both():
+        await asyncio.gather(turn(), upload())
+
+    asyncio.run(both())
+    stored = LOCAL_SESSIONS.pop(session_id)
+    assert stored["quest_state"]["photos"] == ["/uploads/bike.jpg"]
+    assert stored["quest_state"]["price"] == 250
+    assert [m["content"] for m in stored["chat_history"] if m["role"] == "user"] == ["it's 250"]
+
+@pytest.mark.parametrize("reply, action", [("Yes", "ready"), ("No", "summarize"), ("ok", None), ("sure", None), ("skip", None)])
+def test_only_the_buttons_answer_ready(reply, action):
+    from quick_replies import apply_quick_reply
+    result = apply_quick_reply({"action": "ready", "text": "Your quest is ready. Would you like to post it?"}, reply, "for_sale")
+    assert (result or {}).get("action") == action
@@ -0,0 +1,18 @@
+"""
+Quest state validation: run with `python -m pytest test_quest_schema.py`.
+
+Values come straight from LLM output, so a value of the wrong shape drops
+that field instead of failing the turn.
+"""
+import pytest
+from quest_schema import compact_state
+
+@pytest.mark.parametrize("value", [[1, 2], {"a": 1}, float("inf")])
+@pytest.mark.parametrize("category", ["community", None])
+def test_non_scalar_integer_is_dropped(value, category):
+    state = compact_state({"activity": "hike", "group_size": value}, category)
+    assert state == {"activity": "hike"}
+
+@pytest.mark.parametrize("value, expected", [("5 people", 5), ("about 12", 12), (7.0, 7), ("2k", 2000)])
+def test_integer_reads_loose_numbers(value, expected):
+    assert compact_state({"group_size": value}, "community")["group_size"] == expected
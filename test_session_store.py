@@ -0,0 +1,138 @@
+"""
+Session store degradation: run with `python -m pytest test_session_store.py`.
+
+Supabase is replaced by a fake `supabase_request`; nothing goes over the network.
+"""
+import asyncio
+import pytest
+import requests
+from types import SimpleNamespace
+from google import genai
+
+class _OfflineClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+# vertex_client builds its clients at import; nothing here calls them
+genai.Client = _OfflineClient
+
+import quest_tools
+import supabase_client
+from supabase_client import CircuitBreaker, CircuitOpenError, HALF_OPEN
+
+class FakeSupabase:
+    def __init__(self, get_status=200, rows=(), post_status=201):
+        self.get_status, self.rows, self.post_status = get_status, list(rows), post_status
+        self.posts = []
+
+    def __call__(self, method, path, prefer=None, **kwargs):
+        if self.get_status is None:
+            raise CircuitOpenError("Supabase circuit is open")
+        if method == "GET":
+            return SimpleNamespace(status_code=self.get_status, content=supabase_client.serialization.dumps_bytes(self.rows), text="")
+        self.posts.append((prefer, kwargs["json"]))
+        return SimpleNamespace(status_code=self.post_status, text="")
+
+@pytest.fixture
+def supabase(monkeypatch):
+    monkeypatch.setattr(quest_tools, "SUPABASE_API", "https://supabase.invalid")
+    monkeypatch.setattr(quest_tools, "SUPABASE_KEY", "key")
+    monkeypatch.setattr(quest_tools, "LOCAL_SESSIONS", {})
+    monkeypatch.setattr(quest_tools, "PENDING_SESSION_WRITES", {})
+    def install(fake):
+        monkeypatch.setattr(quest_tools, "supabase_request", fake)
+        return fake
+    return install
+
+def save(session_id, session):
+    return quest_tools.save_session(
+        session_id, session["quest_state"], session["chat_history"], unloaded=session.get("unloaded", False)
+    )
+
+@pytest.mark.parametrize("get_status", [503, None])
+def test_unreadable_session_is_never_queued_for_replay(supabase, get_status):
+    supabase(FakeSupabase(get_status=get_status, post_status=503))
+    session = asyncio.run(quest_tools.load_session("s1"))
+    assert session["unloaded"] is True
+    session["quest_state"]["description"] = "road bike"
+    asyncio.run(save("s1", session))
+    assert "s1" not in quest_tools.PENDING_SESSION_WRITES
+    # The next turn keeps going from the local copy while Supabase is down
+    assert asyncio.run(quest_tools.load_session("s1"))["quest_state"] == {"description": "road bike"}
+
+def test_unreadable_session_is_only_inserted(supabase):
+    fake = supabase(FakeSupabase(get_status=503))
+    session = asyncio.run(quest_tools.load_session("s1"))
+    asyncio.run(save("s1", session))
+    assert fake.posts[0][0] == "resolution=ignore-duplicates"
+
+def test_loaded_session_is_upserted_and_replayed(supabase):
+    row = {"quest_id": "s1", "quest_state": {"price": 5}, "chat_history": []}
+    fake = supabase(FakeSupabase(rows=[row], post_status=503))
+    session = asyncio.run(quest_tools.load_session("s1"))
+    assert "unloaded" not in session
+    asyncio.run(save("s1", session))
+    assert fake.posts[0][0] == "resolution=merge-duplicates"
+    assert "s1" in quest_tools.PENDING_SESSION_WRITES
+
+def test_batch_load_marks_unreadable_sessions(supabase):
+    supabase(FakeSupabase(get_status=500))
+    sessions = asyncio.run(quest_tools.load_sessions(["s1", "s2"]))
+    assert all(session.get("unloaded") for session in sessions.values())
+
+def test_unexpected_error_releases_the_probe(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=0)
+    breaker.record_failure()
+    monkeypatch.setattr(supabase_client, "supabase_breaker", breaker)
+    monkeypatch.setattr(supabase_client, "SUPABASE_API", "https://supabase.invalid")
+    monkeypatch.setattr(supabase_client, "SUPABASE_KEY", "key")
+    def explode(*args, **kwargs):
+        raise ValueError("not a request error")
+    monkeypatch.setattr(requests, "request", explode)
+    with pytest.raises(ValueError):
+        supabase_client.supabase_request("GET", "quest_sessions")
+    assert breaker.state == HALF_OPEN and not breaker.probe_in_flight
+
+def test_unserializable_body_takes_no_probe(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=0)
+    breaker.record_failure()
+    monkeypatch.setattr(supabase_client, "supabase_breaker", breaker)
+    monkeypatch.setattr(supabase_client, "SUPABASE_API", "https://supabase.invalid")
+    monkeypatch.setattr(supabase_client, "SUPABASE_KEY", "key")
+    with pytest.raises(Exception):
+        supabase_client.supabase_request("POST", "quest_sessions", json={"bad": object()})
+    assert not breaker.probe_in_flight
+
+class FakeQuestsTable:
+    """`quests` over PostgREST: honours on_conflict, and the first multi-row write lands but times out."""
+    def __init__(self):
+        self.rows = []
+        self.timed_out = False
+
+    def __call__(self, method, path, prefer=None, **kwargs):
+        for row in kwargs["json"]:
+            existing = [i for i, r in enumerate(self.rows) if r["quest_id"] == row["quest_id"]]
+            if existing and "on_conflict=quest_id" in path and "merge-duplicates" in (prefer or ""):
+                self.rows[existing[0]] = row
+            else:
+                self.rows.append(row)
+        if len(kwargs["json"]) > 1 and not self.timed_out:
+            self.timed_out = True
+            raise requests.Timeout("read timed out")
+        return SimpleNamespace(status_code=201, content=supabase_client.serialization.dumps_bytes(kwargs["json"]), text="")
+
+def test_retried_bulk_chunk_writes_no_duplicates(monkeypatch):
+    from routes import quests
+    table = FakeQuestsTable()
+    async def load_sessions(session_ids):
+        return {session_id: {"general_category": "for_sale", "sub_category": "bikes", "quest_state": {}} for session_id in session_ids}
+    monkeypatch.setattr(quests, "supabase_request", table)
+    monkeypatch.setattr(quests, "load_sessions", load_sessions)
+    monkeypatch.setattr(quests, "index_quest", lambda quest: None)
+    monkeypatch.setattr(quests, "percolate_quest", lambda quest: None)
+    request = quests.QuestBulkCreateRequest(quests=[{"quest_id": quest_id} for quest_id in ("q1", "q2", "q3", "q1")])
+    result = asyncio.run(quests.create_quests_bulk(request))
+    assert table.timed_out
+    assert result["success"] and not result["failed"]
+    assert sorted(row["quest_id"] for row in table.rows) == ["q1", "q2", "q3"]
+    assert sorted(quest["quest_id"] for quest in result["saved"]) == ["q1", "q2", "q3"]
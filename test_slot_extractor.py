@@ -0,0 +1,51 @@
+"""
+Rule-based slot extraction: run with `python -m pytest test_slot_extractor.py`.
+
+A pre-filled field is never asked for again, so a false positive costs more
+than a miss (the extraction turn still sees the message).
+"""
+import pytest
+from slot_extractor import extract_price, extract_slots
+
+@pytest.mark.parametrize("text, price", [
+    ("selling my 2015 civic for $9k in oakland, ca", 9000),
+    ("selling a fender strat, excellent condition, $650", 650),
+    ("ps5 for sale 350 dollars", 350),
+    ("need a plumber for around 200 bucks", 200),
+    ("have a brand new kayak, asking 800", 800),
+    ("asking price: 1,200", 1200),
+    ("2br apartment, budget of 3,200", 3200),
+    ("need help moving a couch, paying 60", 60),
+    ("price is 45", 45),
+])
+def test_explicit_prices(text, price):
+    assert extract_price(text) == price
+
+@pytest.mark.parametrize("text", [
+    "looking for 2 chairs",
+    "need a sitter for 3 kids",
+    "want a table for 6",
+    "looking for a room for 2 months",
+    "need a ride for 4 people",
+    "selling a bike, about 3 years old",
+    "need a tutor for around 10 students",
+    "looking for a desk under 5 feet wide",
+    "budget 2 hours a day",
+])
+def test_counts_are_not_prices(text):
+    assert extract_price(text) is None
+
+def test_count_does_not_fill_a_category_price_field():
+    assert "price" not in extract_slots("looking for 2 chairs", "for_sale")
+    assert "budget" not in extract_slots("need a sitter for 3 kids", "services")
+
+@pytest.mark.parametrize("text, side", [
+    ("I want to sell my bike", "have"),
+    ("want to rent out my room", "have"),
+    ("looking to sell a couch", "have"),
+    ("I have a question, looking for a desk", "want"),
+    ("need a plumber this weekend", "want"),
+    ("I have a bike", None),
+])
+def test_want_or_have(text, side):
+    assert extract_slots(text, "for_sale").get("want_or_have") == side
@@ -0,0 +1,45 @@
+"""
+Taxonomy normalization: run with `python -m pytest test_taxonomy_index.py`.
+
+A classification that comes back without a sub_category is re-classified on
+every turn and can't be saved, so every category has to resolve to something.
+"""
+import json
+import pytest
+from taxonomy_index import FALLBACK_SUB_CATEGORIES, TaxonomyIndex, taxonomy_index
+
+CATEGORIES = sorted(taxonomy_index.taxonomy)
+
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_every_category_has_a_fallback_in_the_taxonomy(category):
+    assert FALLBACK_SUB_CATEGORIES.get(category) in taxonomy_index.taxonomy[category]
+
+@pytest.mark.parametrize("category", CATEGORIES)
+@pytest.mark.parametrize("sub_category", ["qwxz vvjk", "", None])
+def test_unmatched_sub_category_is_never_none(category, sub_category):
+    result = taxonomy_index.normalize({"general_category": category, "sub_category": sub_category})
+    assert result["general_category"] == category
+    assert result["sub_category"] == FALLBACK_SUB_CATEGORIES[category]
+
+@pytest.mark.parametrize("category, sub_category", [("services", "handyman"), ("gigs", "dog walking")])
+def test_reported_misses_resolve(category, sub_category):
+    result = taxonomy_index.normalize({"general_category": category, "sub_category": sub_category})
+    assert result["sub_category"] in taxonomy_index.taxonomy[category]
+
+@pytest.mark.parametrize("category, raw, expected", [
+    ("for_sale", "cars & trucks", "cars+trucks"),
+    ("for_sale", "Bicycles", "bikes"),
+    ("for_sale", "furnture", "furniture"),
+    ("jobs", "software engineer", "software / qa / dba"),
+    ("gigs", "labour", "labor"),
+])
+def test_near_misses_snap(category, raw, expected):
+    assert taxonomy_index.normalize({"general_category": category, "sub_category": raw})["sub_category"] == expected
+
+def test_category_without_fallback_keeps_raw_value(tmp_path):
+    path = tmp_path / "taxonomy.json"
+    path.write_text(json.dumps({**taxonomy_index.taxonomy, "pets": ["dogs", "cats"]}))
+    index = TaxonomyIndex(path=str(path), aliases_path="")
+    assert index.sub_category("pets", "Dogs") == ("dogs", "normalized")
+    assert index.sub_category("pets", "parrots ") == ("parrots", "raw")
+    assert index.sub_category("pets", "parrots", fallback=False) == (None, "none")
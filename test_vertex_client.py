@@ -0,0 +1,75 @@
+"""
+Gemini call plumbing: run with `python -m pytest test_vertex_client.py`.
+
+Requests are replaced by coroutines that sleep, so nothing calls Vertex.
+"""
+import asyncio
+import pytest
+from google import genai
+
+class _OfflineClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+# vertex_client builds its clients at import; nothing here calls them
+genai.Client = _OfflineClient
+
+import vertex_client
+
+@pytest.fixture
+def attempts(monkeypatch):
+    running = []
+    async def attempt(messages, temperature, max_tokens, model_id, region, timeout_s):
+        running.append(region)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            running.remove(region)
+        return "never"
+    monkeypatch.setattr(vertex_client, "_attempt_async", attempt)
+    monkeypatch.setattr(vertex_client, "_hedge_target", lambda model_id: ("hedge-region", model_id))
+    monkeypatch.setattr(vertex_client, "_hedge_delay", lambda: 0.05)
+    return running
+
+@pytest.mark.parametrize("cancel_after", [0.01, 0.1])
+def test_cancelled_caller_stops_primary_and_hedge(attempts, cancel_after):
+    async def run():
+        call = asyncio.create_task(vertex_client._hedged_call([], 0.2, 10, "model", timeout_s=5))
+        await asyncio.sleep(cancel_after)  # before / after the hedge fires
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        return list(attempts)
+    assert asyncio.run(run()) == []
+
+def test_call_paced_for_quota_does_not_hold_a_slot(monkeypatch):
+    import quota_governor
+    from llm_scheduler import LLMScheduler
+    governor = quota_governor.QuotaGovernor()
+    monkeypatch.setattr(quota_governor, "VERTEX_QUOTAS", {"paced-model": {"rpm": 1}})
+    monkeypatch.setattr(quota_governor, "QUOTA_TARGET_UTILIZATION", 1.0)
+    monkeypatch.setattr(quota_governor, "QUOTA_WINDOW_S", 0.5)
+    monkeypatch.setattr(vertex_client, "quota_governor", governor)
+    monkeypatch.setattr(vertex_client, "llm_scheduler", LLMScheduler(concurrency=1))
+    monkeypatch.setattr(vertex_client, "_settle_quota", lambda *args: None)
+    monkeypatch.setattr(vertex_client, "_clean_response", lambda response: response)
+    finished = []
+
+    class Models:
+        async def generate_content(self, model, contents, config):
+            finished.append(model)
+            return model
+    client = type("Client", (), {"aio": type("Aio", (), {"models": Models()})()})()
+    monkeypatch.setattr(vertex_client, "region_client", lambda region: client)
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def run():
+        governor.reserve("paced-model", vertex_client.REGION, 1)  # uses up the window
+        paced = asyncio.create_task(vertex_client._attempt_async(messages, 0.2, 10, "paced-model", vertex_client.REGION, 5))
+        await asyncio.sleep(0.05)
+        # The only slot is free while the paced call waits out its window
+        await asyncio.wait_for(vertex_client._attempt_async(messages, 0.2, 10, "other-model", vertex_client.REGION, 5), 0.2)
+        assert finished == ["other-model"]
+        await paced
+    asyncio.run(run())
+    assert finished == ["other-model", "paced-model"]
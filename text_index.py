@@ -0,0 +1,250 @@
+import os
+import re
+import zlib
+import heapq
+import math
+import pickle
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# === FULL-TEXT QUEST SEARCH ===
+# In-process BM25 inverted index over the text fields of a quest. Each field
+# contributes its term counts scaled by a field weight (a title hit counts more
+# than a description hit). Postings are updated in place on every save/update
+# and the whole index can be snapshotted to disk so restarts skip re-tokenizing.
+
+TEXT_INDEX_PATH = os.getenv("TEXT_INDEX_PATH", "data/text_index.pkl")
+TEXT_INDEX_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Searchable fields from QuestCreateRequest and their weights
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "description": 1.0,
+    "sub_category": 2.0,
+    "condition": 1.0,
+    "property_type": 2.0,
+    "job_role": 2.0,
+    "employment_type": 1.0,
+    "industry": 1.5,
+    "experience_level": 1.0,
+    "work_location": 1.0,
+    "service_type": 2.0,
+    "timeframe": 0.5,
+    "qualifications": 1.0,
+    "activity": 2.0,
+    "meetup_location": 1.0,
+    "gig_type": 2.0,
+    "duration": 0.5,
+    "general_location": 1.0,
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "i", "in", "is",
+    "it", "looking", "my", "need", "of", "on", "or", "the", "to", "want", "with", "would", "like",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _stem(token: str) -> str:
+    # Plural folding only; enough for "desks" ~ "desk" without mangling nouns
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+def _field_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+def quest_terms(record: Dict[str, Any]) -> set:
+    """Distinct search terms across a quest's searchable fields."""
+    return {term for field in FIELD_WEIGHTS if record.get(field) for term in tokenize(_field_text(record[field]))}
+
+class TextIndex:
+    """BM25 inverted index keyed by quest key, with optional category filters."""
+
+    def __init__(self, path: Optional[str] = TEXT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset()
+        if path and os.path.exists(path):
+            self.load()
+
+    def _reset(self) -> None:
+        self.postings: Dict[str, Dict[int, float]] = {}  # term -> {doc: weighted tf}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}  # doc -> its distinct terms
+        self.doc_len: Dict[int, float] = {}
+        self.doc_category: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self.doc_hash: Dict[int, int] = {}
+        self.rows: Dict[str, int] = {}
+        self.keys: Dict[int, str] = {}
+        self.next_row = 0
+        self.total_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _weighted_terms(self, record: Dict[str, Any]) -> Dict[str, float]:
+        tf: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = record.get(field)
+            if not value:
+                continue
+            for term in tokenize(_field_text(value)):
+                tf[term] = tf.get(term, 0.0) + weight
+        return tf
+
+    def upsert(self, key: str, record: Dict[str, Any]) -> None:
+        """Index or re-index a quest; records whose text and categories are unchanged are skipped."""
+        tf = self._weighted_terms(record)
+        category = (record.get("general_category"), record.get("sub_category"))
+        signature = zlib.crc32(repr((sorted(tf.items()), category)).encode("utf-8"))
+        with self.lock:
+            row = self.rows.get(key)
+            if row is not None:
+                if self.doc_hash.get(row) == signature:
+                    return
+                self._remove_row(row)
+            else:
+                row = self.next_row
+                self.next_row += 1
+                self.rows[key] = row
+                self.keys[row] = key
+            for term, weight in tf.items():
+                self.postings.setdefault(term, {})[row] = weight
+            length = sum(tf.values())
+            self.doc_terms[row] = tuple(tf)
+            self.doc_len[row] = length
+            self.doc_category[row] = category
+            self.doc_hash[row] = signature
+            self.total_len += length
+
+    def remove(self, key: str) -> None:
+        with self.lock:
+            row = self.rows.pop(key, None)
+            if row is not None:
+                self._remove_row(row)
+                del self.keys[row]
+
+    def _remove_row(self, row: int) -> None:
+        for term in self.doc_terms.pop(row, ()):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(row, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(row, 0.0)
+        self.doc_category.pop(row, None)
+        self.doc_hash.pop(row, None)
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """Drop every indexed quest not in `keys` (e.g. deleted while the snapshot was on disk)."""
+        keep = set(keys)
+        stale = [key for key in self.rows if key not in keep]
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        general_category: Optional[str] = None,
+        sub_category: Optional[str] = None,
+        candidates: Optional[set] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k quests for `query` by BM25 score. `candidates` (quest keys, e.g.
+        from a geo query) restricts the search to those quests.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self.lock:
+            n_docs = len(self.rows)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs or 1.0
+            allowed = None
+            if candidates is not None:
+                allowed = {self.rows[key] for key in candidates if key in self.rows}
+            scores: Dict[int, float] = {}
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                # Walk whichever side is smaller: the posting list or the candidate set
+                if allowed is not None and len(allowed) < len(docs):
+                    pairs = ((row, docs[row]) for row in allowed if row in docs)
+                else:
+                    pairs = docs.items()
+                for row, tf in pairs:
+                    if allowed is not None and row not in allowed:
+                        continue
+                    if general_category or sub_category:
+                        gc, sc = self.doc_category[row]
+                        if (general_category and gc != general_category) or (sub_category and sc != sub_category):
+                            continue
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[row] / avg_len)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self.keys[row], score) for row, score in top]
+
+    # --- snapshots ---
+    def save(self, path: Optional[str] = None) -> None:
+        """Write a snapshot atomically (temp file + rename)."""
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            state = {
+                "version": TEXT_INDEX_VERSION,
+                "postings": self.postings,
+                "doc_terms": self.doc_terms,
+                "doc_len": self.doc_len,
+                "doc_category": self.doc_category,
+                "doc_hash": self.doc_hash,
+                "rows": self.rows,
+                "next_row": self.next_row,
+                "total_len": self.total_len,
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logging.info(f"[TextIndex] Saved {len(self.rows)} quests to {path}")
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.path
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != TEXT_INDEX_VERSION:
+                logging.info(f"[TextIndex] Ignoring snapshot {path} with version {state.get('version')}")
+                return False
+        except Exception as e:
+            logging.error(f"[TextIndex] Failed to load snapshot {path}: {e}")
+            return False
+        with self.lock:
+            self.postings = state["postings"]
+            self.doc_terms = state["doc_terms"]
+            self.doc_len = state["doc_len"]
+            self.doc_category = state["doc_category"]
+            self.doc_hash = state["doc_hash"]
+            self.rows = state["rows"]
+            self.keys = {row: key for key, row in self.rows.items()}
+            self.next_row = state["next_row"]
+            self.total_len = state["total_len"]
+        logging.info(f"[TextIndex] Loaded {len(self.rows)} quests from {path}")
+        return True
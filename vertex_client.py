@@ -1,32 +1,120 @@
 import os
 import logging
 import re
-import json
-from typing import List, Dict, Any, Optional
+import time
+import random
+import asyncio
+import httpx
+from typing import List, Dict, Any, Optional, Tuple
 from google import genai
+from google.genai import errors as genai_errors
+import metrics
+import serialization
+from llm_cache import llm_cache, cache_key, cache_ttl
+from llm_scheduler import llm_scheduler
+from quota_governor import quota_governor, estimate_tokens, CHARS_PER_TOKEN, QUOTA_OUTPUT_ESTIMATE
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
-REGION = os.getenv("GOOGLE_CLOUD_REGION", "us-central1")
+# Comma-separated; the first region serves traffic, the others take hedged requests
+REGIONS = [r.strip() for r in os.getenv("GOOGLE_CLOUD_REGION", "us-central1").split(",") if r.strip()]
+REGION = REGIONS[0]
 CHAT_MODEL_ID = os.getenv("VERTEX_CHAT_MODEL_ID", "gemini-2.5-pro-preview-05-06")
+# Hedge target when only one region is configured
+FALLBACK_MODEL_ID = os.getenv("VERTEX_FALLBACK_MODEL_ID", "")
+
+# === DEADLINES, RETRIES, HEDGING ===
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))          # per attempt
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "60"))        # per call, across retries
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+# Hedge once the primary is slower than this latency percentile (0 disables)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "50"))
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+class LLMUnavailableError(Exception):
+    """Gemini did not answer within the deadline/retry budget."""
+
+def _new_client(region: str) -> genai.Client:
+    return genai.Client(
+        vertexai=True,
+        project=PROJECT_ID,
+        location=region,
+        http_options=genai.types.HttpOptions(timeout=int(LLM_TIMEOUT_S * 1000)),
+    )
 
 # Initialize the genai client
-client = genai.Client(
-    vertexai=True,
-    project=PROJECT_ID,
-    location=REGION,
-)
+client = _new_client(REGION)
+_region_clients: Dict[str, genai.Client] = {REGION: client}
+
+def region_client(region: str) -> genai.Client:
+    if region not in _region_clients:
+        _region_clients[region] = _new_client(region)
+    return _region_clients[region]
+
+def reset_clients() -> None:
+    """Recreate the Gemini clients; forked workers must not share the parent's connections."""
+    global client
+    _region_clients.clear()
+    client = _region_clients[REGION] = _new_client(REGION)
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(error, genai_errors.APIError) and error.code in RETRYABLE_STATUS
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt)))
 
 def get_vertex_chat_response(
     messages: List[Dict[str, str]],
     temperature: float = 0.2,
     max_tokens: int = 1024,
-    model_id: str = CHAT_MODEL_ID
+    model_id: str = CHAT_MODEL_ID,
+    call_site: Optional[str] = None
 ) -> str:
     """
     Get chat completion from Vertex AI Gemini model using google-genai SDK.
     messages: List of {"role": ..., "content": ...}
-    Returns the response text.
+    call_site: names the caller; sites with a TTL in LLM_CACHE_TTLS are served from the response cache.
+    Retryable failures are retried with backoff. Returns the response text.
     """
+    ttl = cache_ttl(call_site)
+    key = cache_key(model_id, temperature, max_tokens, messages) if ttl else None
+    if key:
+        cached = llm_cache.get(key, call_site)
+        if cached is not None:
+            return cached
+    deadline = time.monotonic() + LLM_DEADLINE_S
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            text = _generate_response(messages, temperature, max_tokens, model_id)
+            break
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            if not is_retryable(e):
+                raise
+            if attempt == LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                metrics.incr("llm.exhausted")
+                raise LLMUnavailableError(f"Gemini unavailable after {attempt + 1} attempts: {e!r}") from e
+            metrics.incr("llm.retries")
+            logging.warning(f"[get_vertex_chat_response] Attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+    if key:
+        _store_response(key, text, ttl)
+    return text
+
+def _store_response(key: str, text: str, ttl: float) -> None:
+    # Only well-formed JSON is cached; a garbled reply shouldn't stick around for a day
+    try:
+        serialization.loads(text)
+    except serialization.JSONDecodeError:
+        return
+    llm_cache.set(key, text, ttl)
+
+def _build_request(messages: List[Dict[str, str]], temperature: float, max_tokens: int):
     # Convert messages to genai.types.Content
     contents = [
         genai.types.Content(
@@ -38,31 +126,263 @@ def get_vertex_chat_response(
         temperature=temperature,
         max_output_tokens=max_tokens,
     )
+    return contents, config
+
+def _clean_response(response) -> str:
+    if not response.text:
+        raise ValueError("Empty response from Gemini")
+
+    # Basic cleanup - just remove code fences and tags
+    text = str(response.text)
+    text = re.sub(r'```(?:json)?|###JSON###', '', text, flags=re.IGNORECASE).strip()
+
+    logging.info(f"Raw Gemini response: {text}")
+
+    # Try to parse as JSON
+    try:
+        # Re-dump to normalize the model's formatting
+        return serialization.dumps(serialization.loads(text))
+    except serialization.JSONDecodeError as e:
+        logging.error(f"JSON parse error: {e}")
+        return text  # Return original text if JSON parsing fails
+
+def _record_attempt(region: str, model_id: str, start: float, error: Optional[Exception] = None) -> None:
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.incr("llm.calls")
+    if error is None:
+        metrics.observe("llm.latency_ms", elapsed_ms)
+        metrics.observe(f"llm.latency_ms.{region}.{model_id}", elapsed_ms)
+        return
+    metrics.incr("llm.errors")
+    if isinstance(error, genai_errors.APIError) and error.code == 429:
+        quota_governor.throttled(model_id, region)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        metrics.incr("llm.timeouts")
+    logging.error(f"Error in get_vertex_chat_response ({region}, {model_id}): {error!r}")
+
+def _settle_quota(model_id: str, region: str, ticket: list, tokens: int, max_tokens: int, text: str) -> None:
+    # Swap the reserved output estimate for the real response length
+    reserved_output = min(max_tokens, QUOTA_OUTPUT_ESTIMATE)
+    quota_governor.settle(model_id, region, ticket, tokens - reserved_output + len(text) // CHARS_PER_TOKEN)
+
+def _generate_response(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    model_id: str,
+    region: str = REGION
+) -> str:
+    """One uncached, blocking Gemini call; returns the cleaned response text."""
+    contents, config = _build_request(messages, temperature, max_tokens)
+    tokens = estimate_tokens(messages, max_tokens)
+    region, ticket = quota_governor.acquire_sync(model_id, region, tokens, LLM_TIMEOUT_S, REGIONS)
+    start = time.perf_counter()
     try:
         # Use non-streaming mode
-        response = client.models.generate_content(
+        response = region_client(region).models.generate_content(
             model=model_id,
             contents=contents,
             config=config,
         )
-        
-        if not response.text:
-            raise ValueError("Empty response from Gemini")
-            
-        # Basic cleanup - just remove code fences and tags
-        text = str(response.text)
-        text = re.sub(r'```(?:json)?|###JSON###', '', text, flags=re.IGNORECASE).strip()
-        
-        logging.info(f"Raw Gemini response: {text}")
-        
-        # Try to parse as JSON
+        text = _clean_response(response)
+    except Exception as e:
+        _record_attempt(region, model_id, start, e)
+        raise
+    _record_attempt(region, model_id, start)
+    _settle_quota(model_id, region, ticket, tokens, max_tokens, text)
+    return text
+
+# === ASYNC ACCESS ===
+# Async handlers use the SDK's native async client so deadlines and hedges can
+# cancel in-flight requests. The scheduler caps concurrent Gemini calls in this
+# process (LLM_CONCURRENCY) and decides which waiting call goes next.
+
+# Cache key -> pending Gemini call, so identical concurrent requests share one
+_inflight: Dict[str, asyncio.Future] = {}
+# Gemini calls running in this process (retries included); shutdown waits for them
+_active_calls = 0
+
+async def _attempt_async(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    model_id: str,
+    region: str,
+    timeout_s: float
+) -> str:
+    contents, config = _build_request(messages, temperature, max_tokens)
+    tokens = estimate_tokens(messages, max_tokens)
+    # Pacing for quota and queueing for a slot both come out of this attempt's timeout
+    started = time.monotonic()
+    requested = region
+    while True:
+        # Pace before queueing, so a call waiting on quota doesn't hold a slot other classes could use
+        await quota_governor.pace(model_id, requested, tokens, timeout_s - (time.monotonic() - started), REGIONS)
+        async with llm_scheduler.slot(timeout_s=timeout_s - (time.monotonic() - started)):
+            region, ticket = quota_governor.reserve(model_id, requested, tokens, REGIONS)
+            if ticket is None:
+                continue  # the headroom went to another call while this one queued
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    region_client(region).aio.models.generate_content(model=model_id, contents=contents, config=config),
+                    timeout_s - (time.monotonic() - started)
+                )
+                text = _clean_response(response)
+            except Exception as e:
+                _record_attempt(region, model_id, start, e)
+                raise
+        break
+    _record_attempt(region, model_id, start)
+    _settle_quota(model_id, region, ticket, tokens, max_tokens, text)
+    return text
+
+def _hedge_target(model_id: str) -> Optional[Tuple[str, str]]:
+    """(region, model) for a hedged request: the next region if configured, else the fallback model."""
+    if len(REGIONS) > 1:
+        return REGIONS[1], model_id
+    if FALLBACK_MODEL_ID and FALLBACK_MODEL_ID != model_id:
+        return REGION, FALLBACK_MODEL_ID
+    return None
+
+def _hedge_delay() -> Optional[float]:
+    """Seconds to wait on the primary before hedging, from recent latency; None until there's enough data."""
+    if LLM_HEDGE_PERCENTILE <= 0 or metrics.sample_count("llm.latency_ms") < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return metrics.percentile("llm.latency_ms", LLM_HEDGE_PERCENTILE) / 1000
+
+async def _hedged_call(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    model_id: str,
+    timeout_s: float
+) -> str:
+    """
+    Send the request to the primary region; if it is still running after the
+    hedge delay, send a copy to the hedge target and take the first success.
+    """
+    primary = asyncio.create_task(_attempt_async(messages, temperature, max_tokens, model_id, REGION, timeout_s))
+    tasks = [primary]
+    try:
+        target = _hedge_target(model_id)
+        delay = _hedge_delay() if target else None
+        if delay is None or delay >= timeout_s:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        metrics.incr("llm.hedge.fired")
+        hedge_region, hedge_model = target
+        hedge = asyncio.create_task(
+            _attempt_async(messages, temperature, max_tokens, hedge_model, hedge_region, max(timeout_s - delay, 0.001))
+        )
+        tasks.append(hedge)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        metrics.incr("llm.hedge.won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # The loser, or both when our caller is cancelled; wait for them so
+        # their scheduler slots are released before we return
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+async def _call_with_retries(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    model_id: str,
+    deadline_s: float
+) -> str:
+    global _active_calls
+    _active_calls += 1
+    try:
+        return await _retry_loop(messages, temperature, max_tokens, model_id, deadline_s)
+    finally:
+        _active_calls -= 1
+
+async def _retry_loop(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    model_id: str,
+    deadline_s: float
+) -> str:
+    deadline = time.monotonic() + deadline_s
+    start = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        timeout_s = min(LLM_TIMEOUT_S, deadline - time.monotonic())
         try:
-            parsed = json.loads(text)
-            return json.dumps(parsed)  # Return formatted JSON
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON parse error: {e}")
-            return text  # Return original text if JSON parsing fails
-            
+            text = await _hedged_call(messages, temperature, max_tokens, model_id, timeout_s)
+            metrics.observe("llm.call_latency_ms", (time.perf_counter() - start) * 1000)
+            return text
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            if not is_retryable(e):
+                raise
+            if attempt == LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                metrics.incr("llm.exhausted")
+                raise LLMUnavailableError(f"Gemini unavailable after {attempt + 1} attempts: {e!r}") from e
+            metrics.incr("llm.retries")
+            logging.warning(f"[get_vertex_chat_response_async] Attempt {attempt + 1} failed ({e!r}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def get_vertex_chat_response_async(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    max_tokens: int = 1024,
+    model_id: str = CHAT_MODEL_ID,
+    call_site: Optional[str] = None,
+    deadline_s: float = LLM_DEADLINE_S
+) -> str:
+    """
+    Async Gemini call with a per-call deadline, retries with jittered backoff,
+    optional hedging and the response cache. Cache hits return without taking
+    a semaphore slot. Raises LLMUnavailableError when the budget runs out.
+    """
+    ttl = cache_ttl(call_site)
+    if not ttl:
+        return await _call_with_retries(messages, temperature, max_tokens, model_id, deadline_s)
+    key = cache_key(model_id, temperature, max_tokens, messages)
+    cached = llm_cache.get(key, call_site)
+    if cached is not None:
+        return cached
+    pending = _inflight.get(key)
+    if pending is not None:
+        metrics.incr("llm_cache.coalesced")
+        return await asyncio.shield(pending)
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        text = await _call_with_retries(messages, temperature, max_tokens, model_id, deadline_s)
+        _store_response(key, text, ttl)
+        future.set_result(text)
+        return text
     except Exception as e:
-        logging.error(f"Error in get_vertex_chat_response: {e}")
-        raise
\ No newline at end of file
+        future.set_exception(e)
+        future.exception()  # waiters re-raise it; don't warn when there are none
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+async def drain_llm_calls(timeout_s: float) -> int:
+    """Wait up to `timeout_s` for running Gemini calls to finish; returns how many were still running."""
+    deadline = time.monotonic() + timeout_s
+    if _active_calls:
+        logging.info(f"[drain_llm_calls] Waiting for {_active_calls} Gemini calls")
+    while _active_calls and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if _active_calls:
+        logging.warning(f"[drain_llm_calls] {_active_calls} Gemini calls still running after {timeout_s}s")
+    return _active_calls